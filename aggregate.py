@@ -0,0 +1,184 @@
+"""Aggregate utilization samples one chunk at a time so that a report over
+   a year (or all time) needs memory for the users and weeks only and not
+   for the samples. Utilization is an integer so the running count, sum and
+   sum of squares are kept as exact integers and the mean and standard
+   deviation come out the same as from pandas over all of the rows.
+
+   NumPy and pandas are imported by the methods that take or return
+   DataFrames so that fastpath.py can add samples one at a time without
+   them.
+"""
+
+import math
+
+# usernames that mark an idle GPU and a GPU without data
+idle_user = 'root'
+offline_user = 'OFFLINE'
+seconds_per_day = 86400
+
+def week_of(day):
+    """The week (the day since the epoch of its Sunday) of a day. Weeks run
+       from Monday to Sunday in UTC as with pd.Grouper(freq='W'). Works on
+       integers and NumPy arrays."""
+    return day + 6 - (day + 3) % 7
+
+class Aggregate:
+    """Running totals for checkgpu. For each user the number of samples
+       (size), the number of samples with a utilization (count) and the sum
+       and sum of squares of the utilization. For the user of a -u report
+       the same per week (see week_of)."""
+
+    def __init__(self, thisuser: str=None):
+        self.thisuser = thisuser
+        self.entries = 0
+        self.idle = 0
+        self.offline = 0
+        self.max_timestamp = None
+        self.totals = {}
+        self.weekly = {}
+
+    @property
+    def active(self) -> int:
+        return self.entries - self.idle - self.offline
+
+    def add(self, df: 'pd.DataFrame') -> None:
+        """Add the rows of a DataFrame with timestamp, username and usage."""
+        import numpy as np
+        import pandas as pd
+        usage = df.usage.fillna(0).astype(np.int64).values
+        self.add_totals(pd.DataFrame({'start': df.timestamp.values,
+                                      'username': df.username.values,
+                                      'size': np.ones(df.shape[0], dtype=np.int64),
+                                      'count': df.usage.notna().values.astype(np.int64),
+                                      'sum': usage,
+                                      'sumsq': usage * usage,
+                                      'last': df.timestamp.values}))
+
+    def add_totals(self, rows: 'pd.DataFrame') -> None:
+        """Add rows of totals (see rollup.py) with start, username, size,
+           count, sum, sumsq and last. A sample is a row with size 1."""
+        self.entries += int(rows['size'].sum())
+        is_idle = (rows.username == idle_user).values
+        is_offline = (rows.username == offline_user).values
+        self.idle += int(rows['size'].values[is_idle].sum())
+        self.offline += int(rows['size'].values[is_offline].sum())
+        rows = rows[~is_idle & ~is_offline]
+        if rows.empty:
+            return
+        latest = int(rows['last'].max())
+        self.max_timestamp = latest if self.max_timestamp is None else max(self.max_timestamp, latest)
+        sums = rows.groupby('username', observed=True, sort=False)[['size', 'count', 'sum', 'sumsq']].sum()
+        for username, size, count, total, sumsq in sums.itertuples():
+            running = self.totals.setdefault(str(username), [0, 0, 0, 0])
+            running[0] += int(size)
+            running[1] += int(count)
+            running[2] += int(total)
+            running[3] += int(sumsq)
+        if self.thisuser is not None:
+            mine = rows.loc[(rows.username == self.thisuser).values, ['start', 'size', 'count', 'sum']]
+            # hours and days do not cross weeks
+            mine['start'] = week_of(mine.start.values // seconds_per_day)
+            weeks = mine.groupby('start').sum()
+            for week, size, count, total in weeks.itertuples():
+                running = self.weekly.setdefault(int(week), [0, 0, 0])
+                running[0] += int(size)
+                running[1] += int(count)
+                running[2] += int(total)
+
+    def add_samples(self, samples, exclude: set=frozenset()) -> None:
+        """Add (timestamp, host, username, usage) tuples one at a time where
+           usage is -1 for N/A, leaving out the hosts in exclude. This is
+           add() without NumPy and pandas for the few samples of fastpath.py."""
+        totals, weekly, thisuser = self.totals, self.weekly, self.thisuser
+        for ts, host, user, util in samples:
+            if host in exclude:
+                continue
+            self.entries += 1
+            if user == idle_user:
+                self.idle += 1
+                continue
+            if user == offline_user:
+                self.offline += 1
+                continue
+            if self.max_timestamp is None or ts > self.max_timestamp:
+                self.max_timestamp = ts
+            running = totals.get(user)
+            if running is None:
+                running = totals[user] = [0, 0, 0, 0]
+            running[0] += 1
+            if util >= 0:
+                running[1] += 1
+                running[2] += util
+                running[3] += util * util
+            if user == thisuser:
+                week = week_of(ts // seconds_per_day)
+                running = weekly.get(week)
+                if running is None:
+                    running = weekly[week] = [0, 0, 0]
+                running[0] += 1
+                if util >= 0:
+                    running[1] += 1
+                    running[2] += util
+
+    def merge(self, other: 'Aggregate') -> 'Aggregate':
+        """Add the totals of another Aggregate (e.g., of another cluster).
+           The totals are integers so the result is the same as adding all
+           of the rows to one Aggregate."""
+        self.entries += other.entries
+        self.idle += other.idle
+        self.offline += other.offline
+        if other.max_timestamp is not None:
+            self.max_timestamp = other.max_timestamp if self.max_timestamp is None else \
+                                 max(self.max_timestamp, other.max_timestamp)
+        for username, totals in other.totals.items():
+            running = self.totals.setdefault(username, [0, 0, 0, 0])
+            for i, value in enumerate(totals):
+                running[i] += value
+        for week, totals in other.weekly.items():
+            running = self.weekly.setdefault(week, [0, 0, 0])
+            for i, value in enumerate(totals):
+                running[i] += value
+        return self
+
+    def mean(self) -> float:
+        """Mean utilization of all active samples."""
+        count = sum(running[1] for running in self.totals.values())
+        total = sum(running[2] for running in self.totals.values())
+        return total / count if count else math.nan
+
+    def user(self, username: str) -> tuple:
+        """Return the size, mean and std (ddof=1) of a user (NaN without
+           enough samples with a utilization)."""
+        size, count, total, sumsq = self.totals[username]
+        mean = total / count if count else math.nan
+        # n * sumsq - total**2 is exact so the variance is rounded only once
+        std = math.sqrt((count * sumsq - total * total) / (count * (count - 1))) if count > 1 else math.nan
+        return size, mean, std
+
+    def users(self) -> 'pd.DataFrame':
+        """Return username, size, mean and std (ddof=1) per user sorted by
+           username as groupby(...).agg([np.size, np.mean, np.std])."""
+        import numpy as np
+        import pandas as pd
+        rows = [(username, *self.user(username)) for username in sorted(self.totals)]
+        return pd.DataFrame(rows, columns=['username', 'size', 'mean', 'std']).astype(
+                            {'size': np.int64, 'mean': np.float64, 'std': np.float64})
+
+    def week_totals(self) -> list:
+        """Return (week, size, count, sum) of the user of a -u report with
+           the empty weeks in between (see week_of)."""
+        if not self.weekly:
+            return []
+        return [(week, *self.weekly.get(week, [0, 0, 0]))
+                for week in range(min(self.weekly), max(self.weekly) + 1, 7)]
+
+    def weeks(self) -> 'pd.DataFrame':
+        """Return week, size and mean of the user of a -u report with the
+           empty weeks in between as groupby(pd.Grouper(freq='W'))."""
+        import numpy as np
+        import pandas as pd
+        rows = self.week_totals()
+        return pd.DataFrame({'timestamp': pd.to_datetime([week for week, _, _, _ in rows], unit='D'),
+                             'size': np.array([size for _, size, _, _ in rows], dtype=np.int64),
+                             'mean': np.array([total / count if count else np.nan for _, _, count, total in rows],
+                                              dtype=np.float64)})
@@ -1,33 +1,35 @@
-#!/usr/licensed/anaconda3/2020.7/bin/python
+#!/usr/licensed/anaconda3/2020.11/bin/python
 
 # send an email if there are cases of low utilization
 
-import subprocess
+base = "/home/jdh4/bin/gpus"
 
-def low_utilization():
-  cmd = "/home/jdh4/bin/checkgpu -d 2 -c 10 -g 24"
-  output = subprocess.run(cmd, shell=True, capture_output=True)
-  lines = output.stdout.decode("utf-8").split('\n')
+import sys
+sys.path.append(base)
 
-  if "No results were found" in lines[5]:
+def low_utilization(data=None):
+  # same report as checkgpu -d 2 -c 10 -g 24 (made in this process)
+  import report
+  try:
+    rep = report.make_report(['-d', '2', '-c', '10', '-g', '24'], data)
+  except report.ReportError as e:
+    # no report (e.g., no data file) means no cases but say why in the cron mail
+    print(e, file=sys.stderr)
     return []
-  else:
-    cases = []
-    skip = ['mcmuniz', 'dongdong']
-    lines = lines[8:-3]
-    for line in lines:
-      parts = line.split()
-      user = parts[0]
-      util = parts[1]
-      std = parts[2]
-      hours = parts[3]
-      if int(util) == 0 and int(std) == 0:
-        cases.append([user, util, std, hours])
-      elif user not in skip:
-        cases.append([user, util, std, hours])
-      else:
-        pass
-    return cases
+  cases = []
+  skip = ['mcmuniz', 'dongdong']
+  for row in rep.records():
+    user = row['USER']
+    util = str(round(row['MEAN(%)']))
+    std = str(round(row['STD(%)']))
+    hours = str(round(row['GPU-HOURS']))
+    if int(util) == 0 and int(std) == 0:
+      cases.append([user, util, std, hours])
+    elif user not in skip:
+      cases.append([user, util, std, hours])
+    else:
+      pass
+  return cases
 
 if __name__ == '__main__':
   cases = low_utilization()
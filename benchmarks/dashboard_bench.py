@@ -0,0 +1,128 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+"""Time the dashboard renderer of tigergpu_usage.py against the renderer
+   it replaced (one matplotlib axes per cell over the usage_user dict) on
+   synthetic gpustat data.
+   Each renderer runs in its own process so that its peak RSS is reported.
+   Usage: dashboard_bench.py [number of nodes] (default 80, i.e., 320 GPUs)"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import random
+import tempfile
+import resource
+import subprocess
+from time import perf_counter
+from datetime import datetime
+import tigergpu_usage as tgu
+
+usage_user = {}
+
+def cell_color(username, usage, gpu_proc):
+  if (username == '' or username == 'NO INFO'):
+     fcolor = '#CCCCCC'
+  elif (usage == 0 and gpu_proc):
+     fcolor = "#000000"
+  elif (usage == 0 and not gpu_proc):
+     fcolor = "#000099"
+  elif (usage < 25):
+     fcolor = "#FF0000"
+  elif (usage < 50):
+     fcolor = "#FF8C00"
+  elif (usage < 75):
+     fcolor = "#F9E79F"
+  else:
+     fcolor = "#FFFFFF"
+  return fcolor
+
+def celltext(node, j, username, usage):
+  if (username == ''):
+    ctext = 'IDLE'
+  elif (username == 'NO INFO'):
+    ctext = username
+  else:
+    ctext = username + ":" + str(usage)
+  return ctext
+
+def old_create_image():
+  import matplotlib
+  matplotlib.use('Agg')
+  import matplotlib.pyplot as plt
+  _, _, timestamps = zip(*usage_user.keys())
+  times = sorted(set(timestamps))
+  times = times[-tgu.num_snapshots:]
+  if len(times) == 1: times = 2 * times
+  fig, ax = plt.subplots(nrows=tgu.num_gpus, ncols=len(times), figsize=(10, 80))
+  f = open("dashboard.csv", "w")
+  for i, node in enumerate(tgu.nodes):
+      for gpu_index in range(tgu.gpus_per_node):
+        idx = tgu.gpus_per_node * i + gpu_index
+        for j, t in enumerate(times):
+          mykey = (node, gpu_index, t)
+          if (mykey in usage_user):
+            usage, username, gpu_proc = usage_user[mykey]
+          else:
+            usage, username = (-1, 'NO INFO')
+          ax[idx, j].set_facecolor(cell_color(username, usage, gpu_proc))
+          for side in ['top', 'right', 'bottom', 'left']:
+            ax[idx, j].spines[side].set_visible(False)
+          ax[idx, j].get_xaxis().set_ticks([])
+          ax[idx, j].get_yaxis().set_ticks([])
+          txtclr = 'w' if (usage < 25 or username == '') else 'k'
+          to_write = ','.join([datetime.fromtimestamp(t).strftime('%-I:%M %p'), node, str(gpu_index), username, str(usage)])
+          f.write(to_write + "\n")
+          ax[idx, j].text(0.5, 0.5, celltext(node, j, username, usage), fontsize=10, color=txtclr, \
+                          ha='center', va='center', transform=ax[idx, j].transAxes)
+          if (j == 0): ax[idx, j].set_ylabel(tgu.gpu_labels(gpu_index, node), fontsize=12, \
+                                             rotation=0, ha='right', va='center')
+          dt = datetime.fromtimestamp(t)
+          stamp = dt.strftime('%-I:%M %p')
+          if (idx == 0):
+            ax[idx, j].xaxis.set_label_position('top')
+            ax[idx, j].set_xlabel(stamp, fontsize=12, rotation=0, ha='center', va='bottom')
+  f.close()
+  fig.suptitle('TigerGPU Utilization (' + str(dt.strftime("%a %b %-d")) + ')', \
+               y=0.997, ha='center', fontsize=18)
+  fig.tight_layout(pad=0, w_pad=0, h_pad=0, rect=(0, 0, 1, 0.99))
+  plt.savefig('tigergpu_utilization.png')
+  plt.close(fig)
+
+def synthetic(num_nodes, seed=42):
+    """Fill the globals of tigergpu_usage.py as a run on num_nodes nodes
+       with every GPU reporting in each of the snapshots."""
+    random.seed(seed)
+    tgu.nodes = [f"tiger-i{19 + i // 16}g{i % 16 + 1}" for i in range(num_nodes)]
+    tgu.cryoem = []
+    tgu.debug = False
+    tgu.gpus_per_node = 4
+    tgu.num_gpus = tgu.gpus_per_node * num_nodes
+    tgu.num_snapshots = 7
+    tgu.snapshots = tgu.Snapshots(tgu.nodes, tgu.gpus_per_node)
+    usage_user.clear()
+    users = [''] * 4 + [f"user{k:02d}" for k in range(40)]
+    for snapshot in range(tgu.num_snapshots):
+        t = 1600000000 + 600 * snapshot
+        for node in tgu.nodes:
+            for gpu_index in range(tgu.gpus_per_node):
+                username = random.choice(users)
+                usage = 0 if username == '' else random.randint(0, 100)
+                gpu_proc = random.random() < 0.9
+                usage_user[(node, gpu_index, t)] = (usage, username, gpu_proc)
+                tgu.snapshots.set(node, gpu_index, t, usage, username, gpu_proc)
+
+renderers = {"single image": tgu.create_image, "axes per cell": old_create_image}
+
+if __name__ == "__main__":
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    if len(sys.argv) > 2:
+        synthetic(num_nodes)
+        os.chdir(tempfile.mkdtemp())
+        start = perf_counter()
+        renderers[sys.argv[2]]()
+        seconds = perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{sys.argv[2]:13s} {4 * num_nodes} GPUs x 7 snapshots: "
+              f"{seconds:6.2f} s  peak RSS {peak:6.0f} MB")
+    else:
+        for name in renderers:
+            subprocess.run([sys.executable, os.path.abspath(__file__), str(num_nodes), name])
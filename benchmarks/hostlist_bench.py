@@ -0,0 +1,63 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+"""Time hostlist expansion and compression on large multi-node job strings.
+   The expansion is compared with extract_nodes which tigergpu_usage.py
+   used before hostlist.py (single bracket group only)."""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import random
+from timeit import timeit
+import hostlist
+
+def extract_from_range(hosts):
+    base = hosts[:hosts.index("[")]
+    other = hosts[hosts.index("[") + 1:-1]
+    individs = []
+    for num in other.split(","):
+        if "-" in num:
+            start, end = map(int, num.split("-"))
+            individs.extend(map(lambda x: base + str(x), list(range(start, end + 1))))
+        else:
+            individs.append(base + num)
+    return individs
+
+def extract_nodes(hosts):
+    single_hosts = []
+    for host in hosts:
+        if host.startswith("iger"): host = "t" + host
+        if "[" in host:
+            single_hosts.extend(extract_from_range(host))
+        else:
+            single_hosts.append(host)
+    return single_hosts
+
+def job_strings(num_jobs, seed=42):
+    """Hostlists as squeue prints them for jobs on 2 to 64 nodes."""
+    random.seed(seed)
+    jobs = []
+    for _ in range(num_jobs):
+        rack = random.randint(10, 99)
+        nodes = sorted(random.sample(range(1, 97), random.randint(2, 64)))
+        hosts = [f"tiger-i{rack}g{n}" for n in nodes]
+        jobs.append(hostlist.compress(hosts))
+    return jobs
+
+if __name__ == "__main__":
+    number = 5
+    for num_jobs in [1000, 10000]:
+        jobs = job_strings(num_jobs)
+        hosts = sum(len(hostlist.expand(job)) for job in jobs)
+        hostlist.expand_hostlist.cache_clear()
+        hostlist.expand_host.cache_clear()
+        cold = timeit(lambda: [hostlist.expand(job) for job in jobs], number=1)
+        warm = timeit(lambda: [hostlist.expand(job) for job in jobs], number=number) / number
+        old = timeit(lambda: [extract_nodes(job.split(",t")) for job in jobs], number=number) / number
+        assert all(extract_nodes(job.split(",t")) == hostlist.expand(job) for job in jobs[:100])
+        print(f"{num_jobs:6d} jobs {hosts:7d} hosts: extract_nodes {old:.4f} s  "
+              f"expand cold {cold:.4f} s  warm {warm:.4f} s")
+
+    big = hostlist.expand("della-l[001-100]g[1-8],tiger-i[10-99]g[1-16]")
+    hostlist.compress_hosts.cache_clear()
+    seconds = timeit(lambda: hostlist.compress(big), number=1)
+    print(f"compress {len(big)} hosts into {hostlist.compress(big)}: {seconds:.4f} s")
@@ -0,0 +1,75 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+"""Time checkgpu -s over a long window read by 1, 2, 4, ... worker
+   processes (checkgpu --workers) on synthetic data (see synthetic.py) and
+   report the throughput in samples per second and the speedup over one
+   process.
+
+   The window is read from utilization.json (the default) or with --store
+   from the store and rollups written by make_store.py. The rollups make a
+   long window cheap to read so the store shows mostly the cost of the
+   partial days at the ends and of starting the workers.
+
+   Usage: parallel_bench.py [--workers 1 2 4 8] [--days 365] [--store] [--output results.json]
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import json
+import shutil
+import argparse
+import tempfile
+from time import perf_counter
+
+import synthetic
+from scale_bench import end, make_files
+
+def report_seconds(directory: str, days: int, workers: int, store: bool, repeat: int) -> tuple:
+    """Return the best time of repeat reports and the number of samples."""
+    import report
+    files = make_files(directory)
+    if not store: files.storedir = os.path.join(directory, 'no-store')
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        rep = report.make_report(['-d', str(days), '-s', '--workers', str(workers)], files)
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, rep.active
+
+if __name__ == '__main__':
+    psr = argparse.ArgumentParser(description='Time checkgpu --workers on synthetic data')
+    psr.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Worker counts (default: 1 2 4 8)')
+    psr.add_argument('--days', type=int, default=365, help='Days of samples and of the window (default: 365)')
+    psr.add_argument('--nodes', type=int, default=20, help='Number of nodes with 4 GPUs (default: 20)')
+    psr.add_argument('--store', action='store_true', help='Read the store and rollups instead of utilization.json')
+    psr.add_argument('--repeat', type=int, default=3, help='Report the best of this many runs (default: 3)')
+    psr.add_argument('--workdir', default=None, help='Keep the data here (default: a temporary directory)')
+    psr.add_argument('--output', default=None, help='Write the results to this JSON file')
+    args = psr.parse_args()
+
+    import report
+    directory = args.workdir or tempfile.mkdtemp()
+    try:
+        if not os.path.isfile(os.path.join(directory, 'utilization.json')):
+            start = perf_counter()
+            counts = synthetic.write_all(directory, num_nodes=args.nodes, days=args.days, snapshots=0, end=end)
+            print(f"generated {counts['lines']} lines in {perf_counter() - start:.1f} s")
+        if args.store and not os.path.isdir(os.path.join(directory, 'store')):
+            import utilization
+            import rollup
+            utilization.convert(os.path.join(directory, 'utilization.json'), os.path.join(directory, 'store'))
+            rollup.update(os.path.join(directory, 'store'))
+        print(f"{report.num_cores()} cores, checkgpu -d {args.days} -s from {'the store' if args.store else 'utilization.json'}")
+        print(f"{'workers':>7} {'seconds':>9} {'samples/s':>11} {'speedup':>8}")
+        results = []
+        for workers in args.workers:
+            seconds, samples = report_seconds(directory, args.days, workers, args.store, args.repeat)
+            results.append({'workers': workers, 'seconds': seconds, 'samples': samples})
+            print(f"{workers:>7} {seconds:9.2f} {samples / seconds:11.0f} {results[0]['seconds'] / seconds:8.2f}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(directory)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
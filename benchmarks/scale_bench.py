@@ -0,0 +1,150 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+"""Time the stages of checkgpu, make_cache.py and tigergpu_usage.py on
+   synthetic data (see synthetic.py) at several scales and report the
+   wall time and peak RSS of each stage.
+
+   At 1x the data is a week of samples of 80 nodes with 4 GPUs (about
+   320,000 lines of utilization.json) from 100 users and gpustat files of
+   80 nodes.
+   At a scale of N there are N times as many days and users and N times
+   as many gpustat nodes. Each stage runs in a new process so that its
+   peak RSS is its own. The stages run in order on the same data since
+   the later ones read the store written by the ingest stage.
+
+   Usage: scale_bench.py [--scales 1 10 100] [--output results.json] [--baseline results.json]
+
+   With --baseline the change relative to an earlier --output is shown so
+   that regressions stand out.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import json
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from time import perf_counter
+
+import synthetic
+
+end = 1790000000
+
+def make_files(directory: str):
+    """Files of a report with the accounts of sshare.txt."""
+    import report
+    report.gethostname = lambda: 'della-gpu'
+    report.time = lambda: end
+    return report.Files(directory, os.path.join(directory, 'sshare.txt'))
+
+def ingest_index(directory, scale):
+    import utilization
+    utilization.update_index(os.path.join(directory, 'utilization.json'), write=True)
+
+def ingest_store(directory, scale):
+    # as make_store.py
+    import utilization
+    import rollup
+    utilization.convert(os.path.join(directory, 'utilization.json'), os.path.join(directory, 'store'))
+    rollup.update(os.path.join(directory, 'store'))
+
+def cache_netids(directory, scale):
+    # the part of make_cache.py before the LDAP queries
+    from utilization import iter_chunks
+    netids = set()
+    for chunk in iter_chunks(os.path.join(directory, 'utilization.json')):
+        netids.update(chunk.username.unique())
+
+def window(directory, scale, store=True):
+    files = make_files(directory)
+    if not store: files.storedir = os.path.join(directory, 'no-store')
+    rollups, chunks, _ = files.window(end - 7 * 86400, end)
+    sum(chunk.shape[0] for chunk in chunks)
+
+def report_stage(*argv):
+    def run(directory, scale):
+        import report
+        report.make_report(list(argv) + ['-d', str(7 * scale)], make_files(directory))
+    return run
+
+def dashboard(directory, scale):
+    import tigergpu_usage as tgu
+    from glob import glob
+    tgu.gpustat_dir = directory
+    tgu.nodes = sorted({os.path.basename(path).split('.')[0] for path in glob(f'{directory}/dot_gpustat/*.gpustat')})
+    tgu.gpus_per_node = 4
+    tgu.num_gpus = tgu.gpus_per_node * len(tgu.nodes)
+    tgu.num_snapshots = 7
+    tgu.squeue_jobs = {}
+    tgu.cryoem = []
+    tgu.debug = False
+    tgu.snapshots = tgu.Snapshots(tgu.nodes, tgu.gpus_per_node)
+    tgu.process_all_files()
+    os.chdir(tempfile.mkdtemp())
+    tgu.create_image()
+
+stages = {'ingest: utilization.json.idx': ingest_index,
+          'ingest: store and rollups': ingest_store,
+          'make_cache.py netids': cache_netids,
+          'window: 7 days from json': lambda d, s: window(d, s, store=False),
+          'window: 7 days from store': window,
+          'checkgpu per user (all days)': report_stage(),
+          'checkgpu -p (all days)': report_stage('-p'),
+          'checkgpu -s (all days)': report_stage('-s'),
+          'dashboard: parse and render': dashboard}
+
+def run_stage(name: str, directory: str, scale: int) -> dict:
+    """Run a stage in a new process and return its time and peak RSS."""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--stage', name, directory, str(scale)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().split('\n')[-1])
+
+if __name__ == '__main__':
+    psr = argparse.ArgumentParser(description='Time checkgpu, make_cache.py and the dashboard on synthetic data')
+    psr.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Scales to run (default: 1 10 100)')
+    psr.add_argument('--stages', nargs='+', default=list(stages), help='Stages to run (default: all)')
+    psr.add_argument('--workdir', default=None, help='Keep the data here (default: a temporary directory)')
+    psr.add_argument('--output', default=None, help='Write the results to this JSON file')
+    psr.add_argument('--baseline', default=None, help='Compare with the results in this JSON file')
+    psr.add_argument('--stage', default=None, help=argparse.SUPPRESS)
+    args, rest = psr.parse_known_args()
+
+    if args.stage:
+        directory, scale = rest[0], int(rest[1])
+        start = perf_counter()
+        stages[args.stage](directory, scale)
+        seconds = perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps({'seconds': seconds, 'peak_mb': peak}))
+        sys.exit(0)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r['scale'], r['stage']): r for r in json.load(f)}
+    results = []
+    print(f"{'scale':>5} {'stage':32} {'seconds':>9} {'peak MB':>8} {'vs baseline':>12}")
+    for scale in args.scales:
+        directory = os.path.join(args.workdir, f'{scale}x') if args.workdir else tempfile.mkdtemp()
+        try:
+            if not os.path.isfile(os.path.join(directory, 'utilization.json')):
+                start = perf_counter()
+                counts = synthetic.write_all(directory, num_nodes=80, days=7 * scale, num_users=100 * scale,
+                                             gpustat_nodes=80 * scale, end=end)
+                print(f"{scale:>4}x generated {counts['lines']} lines and {counts['gpustat files']} "
+                      f"gpustat files in {perf_counter() - start:.1f} s")
+            for name in args.stages:
+                result = run_stage(name, directory, scale)
+                result.update({'scale': scale, 'stage': name})
+                results.append(result)
+                before = baseline.get((scale, name))
+                change = f"{100 * (result['seconds'] / before['seconds'] - 1):+11.0f}%" if before else ''
+                print(f"{scale:>4}x {name:32} {result['seconds']:9.2f} {result['peak_mb']:8.0f} {change:>12}")
+        finally:
+            if not args.workdir:
+                shutil.rmtree(directory)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
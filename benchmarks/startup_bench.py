@@ -0,0 +1,59 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+"""Time the start of checkgpu: the imports of report.py (python -X importtime),
+   checkgpu -h and a single-user report over one day made by fastpath.py and
+   by the full report with NumPy and pandas. Every case runs in a new
+   interpreter as checkgpu does. Run it after changing the imports of
+   report.py, checkgpud.py or fastpath.py."""
+
+import sys
+import os
+import tempfile
+import subprocess
+from time import perf_counter
+
+import synthetic
+
+repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def write_data(base, num_nodes=80, days=10, end=1790000000):
+    """Samples of 4 GPUs per node every 10 minutes (TigerGPU has 80 nodes)."""
+    synthetic.write_all(base, num_nodes=num_nodes, days=days, num_users=100, snapshots=0, end=end)
+
+def run(code, number=5):
+    """Return the best wall time of running code in a new interpreter."""
+    best = float("inf")
+    for _ in range(number):
+        start = perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=repo, stdout=subprocess.DEVNULL, check=True)
+        best = min(best, perf_counter() - start)
+    return best
+
+def import_times(module):
+    """Return the cumulative import time in seconds of the top-level
+       modules imported by module from python -X importtime."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=repo, capture_output=True, text=True)
+    times = {}
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [field.strip() for field in line[len("import time:"):].split("|")]
+        if cumulative.isdigit() and not name.startswith(" ") and "." not in name:
+            times[name] = int(cumulative) / 1e6
+    return times
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as base:
+        write_data(base)
+        subprocess.run([sys.executable, "-c", f"import utilization; utilization.update_index('{base}/utilization.json', write=True)"],
+                       cwd=repo, check=True)
+        times = import_times("report")
+        print("imports of report.py (s): " + ", ".join(f"{name} {t:.3f}" for name, t in sorted(times.items(), key=lambda x: -x[1])[:5]))
+        print(f"import numpy, pandas (s): {run('import numpy, pandas'):.3f}")
+        setup = f"import report; report.gethostname = lambda: 'tigergpu'; files = report.Files('{base}'); "
+        cases = [("checkgpu -h", "import report; report.main(['-h'])"),
+                 ("-u u00001 -e (fast path)", setup + "report.main(['-u', 'u00001', '-e', '09/20/2026'], files)"),
+                 ("-u u00001 -e (full report)", setup + "report.fastpath_seconds = 0; report.main(['-u', 'u00001', '-e', '09/20/2026'], files)"),
+                 ("-e (all users)", setup + "report.main(['-e', '09/20/2026'], files)")]
+        for name, code in cases:
+            print(f"{name:>26}: {run(code):.3f} s")
@@ -0,0 +1,186 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+"""Synthetic GPU data for the benchmarks: utilization.json as written by
+   extract.py, cached_users.csv as written by make_cache.py, the output of
+   sshare and gpustat files as written by tigergpu_usage.py.
+
+   Every GPU runs a sequence of jobs. A job belongs to a user (a few users
+   run most of the jobs), lasts a few hours on average and has its own
+   mean utilization around which the samples vary. Between jobs a GPU is
+   idle (user root). Nodes go OFFLINE now and then and the GPUs of MIG
+   nodes report a utilization of N/A as on Della. Samples are taken every
+   10 minutes.
+
+   Usage: synthetic.py <directory> [--nodes 80] [--days 7] [--users 100] ...
+"""
+
+import os
+import sys
+import random
+import itertools
+import argparse
+from datetime import datetime
+
+sampling_seconds = 600
+gpu_models = ["Tesla P100-PCIE-16GB", "NVIDIA Tesla P100-PCIE-16GB"]
+
+def hostnames(num_nodes: int, num_mig: int=0) -> list:
+    """Return num_nodes names like della-i14g1 of which the last num_mig
+       are MIG nodes like della-l01g1."""
+    regular = [f"della-i{14 + i // 20}g{i % 20 + 1}" for i in range(num_nodes - num_mig)]
+    return regular + [f"della-l{1 + i // 16:02d}g{i % 16 + 1}" for i in range(num_mig)]
+
+def usernames(num_users: int) -> list:
+    return [f"u{i:05d}" for i in range(num_users)]
+
+class Gpu:
+    """The job running on a GPU."""
+
+    def __init__(self):
+        self.user = 'root'
+        self.jobid = '0'
+        self.mean = 0
+        self.remaining = 0
+
+def utilization_lines(hosts: list, begin: int, end: int, gpus_per_node: int=4, num_users: int=100,
+                      idle: float=0.2, offline: float=0.002, mig: set=(), seed: int=42):
+    """Yield the lines of utilization.json from begin to end. idle is the
+       fraction of jobs that are idle periods and offline the probability
+       that a node goes offline (for an hour on average) at a sample."""
+    rng = random.Random(seed)
+    users = usernames(num_users)
+    # heavy users run most of the jobs
+    cum_weights = list(itertools.accumulate(1.0 / (k + 1) for k in range(num_users)))
+    gpus = {host: [Gpu() for _ in range(gpus_per_node)] for host in hosts}
+    down = dict.fromkeys(hosts, 0)
+    jobid = 1000000
+    for t in range(begin - begin % sampling_seconds, end, sampling_seconds):
+        # extract.py writes each column a second or two after the 10 minutes
+        ts = str(t + rng.randint(0, 2))
+        for host in hosts:
+            if down[host] == 0 and rng.random() < offline:
+                down[host] = 1 + int(rng.expovariate(1 / 6))
+            for index, gpu in enumerate(gpus[host]):
+                if down[host]:
+                    # the job keeps running
+                    gpu.remaining = max(gpu.remaining - 1, 0)
+                    user, util, job = 'OFFLINE', 'N/A', '0'
+                else:
+                    if gpu.remaining == 0:
+                        if rng.random() < idle:
+                            gpu.user, gpu.jobid, gpu.mean = 'root', '0', 0
+                            gpu.remaining = 1 + int(rng.expovariate(1 / 12))
+                        else:
+                            gpu.user = rng.choices(users, cum_weights=cum_weights)[0]
+                            jobid += 1
+                            gpu.jobid = str(jobid)
+                            # some jobs hold a GPU without using it
+                            gpu.mean = 0 if rng.random() < 0.05 else rng.uniform(5, 100)
+                            gpu.remaining = 1 + int(rng.expovariate(1 / 36))
+                    gpu.remaining -= 1
+                    user, job = gpu.user, gpu.jobid
+                    if host in mig:
+                        util = 'N/A'
+                    elif user == 'root' or gpu.mean == 0:
+                        util = '0'
+                    else:
+                        util = str(min(100, max(0, int(rng.gauss(gpu.mean, 15)))))
+                yield (f'{{"timestamp": "{ts}", "host": "{host}", "index": "{index}", '
+                       f'"user": "{user}", "util": "{util}", "jobid": "{job}"}}\n')
+            if down[host]:
+                down[host] -= 1
+
+def write_utilization(path: str, hosts: list, begin: int, end: int, **kwargs) -> int:
+    """Write utilization.json (see utilization_lines for the options).
+       Returns the number of lines."""
+    num_lines = 0
+    with open(path, 'w') as f:
+        for line in utilization_lines(hosts, begin, end, **kwargs):
+            f.write(line)
+            num_lines += 1
+    return num_lines
+
+def write_users(path: str, num_users: int, seed: int=42) -> None:
+    """Write cached_users.csv with about 9 in 10 of the users (the others
+       are not found in LDAP)."""
+    rng = random.Random(seed)
+    depts = ['CS', 'PHYSICS', 'ASTRO', 'CHEM', 'CBE', 'MAE', 'PNI', 'ELE']
+    positions = ['G1', 'G2', 'G3', 'G4', 'G5', 'Postdoc', 'Staff', 'Faculty', 'XMural']
+    with open(path, 'w') as f:
+        f.write('NETID,POSITION,DEPT,NAME,SPONSOR\n')
+        for user in usernames(num_users):
+            if rng.random() < 0.9:
+                f.write(f'{user},{rng.choice(positions)},{rng.choice(depts)},'
+                        f'User {user},Sponsor {rng.randint(0, num_users // 10)}\n')
+
+def write_sshare(path: str, num_users: int, seed: int=42) -> None:
+    """Write the output of sshare -a -n -P -o Account,User (see
+       slurm.parse_sshare) with an account for most of the users."""
+    rng = random.Random(seed)
+    accounts = ['cs', 'physics', 'astro', 'chem', 'cbe', 'mae', 'pni', 'ele']
+    with open(path, 'w') as f:
+        for user in usernames(num_users):
+            if rng.random() < 0.95:
+                f.write(f'{rng.choice(accounts)}|{user}\n')
+
+def write_gpustat(outdir: str, nodes: list, timestamps: list, gpus_per_node: int=4,
+                  num_users: int=100, seed: int=42) -> int:
+    """Write one gpustat file per node and timestamp to outdir. Returns the
+       number of files."""
+    rng = random.Random(seed)
+    users = usernames(num_users)
+    os.makedirs(outdir, exist_ok=True)
+    for t in timestamps:
+        stamp = datetime.fromtimestamp(t).strftime('%a %b %e %H:%M:%S %Y')
+        for node in nodes:
+            lines = [f'{node}  {stamp}\n']
+            for index in range(gpus_per_node):
+                model = rng.choice(gpu_models)
+                temperature = rng.randint(30, 80)
+                if rng.random() < 0.2:
+                    lines.append(f"[{index}] {model} | {temperature}'C,   0 % |     0 / 16280 MB |\n")
+                else:
+                    user = rng.choice(users)
+                    memory = rng.randint(200, 16000)
+                    lines.append(f"[{index}] {model} | {temperature}'C, {rng.randint(0, 100):3d} % | "
+                                 f"{memory:5d} / 16280 MB | {user}({memory - 2}M)\n")
+            with open(os.path.join(outdir, f'{node}.{t}.gpustat'), 'w') as f:
+                f.writelines(lines)
+    return len(nodes) * len(timestamps)
+
+def write_all(directory: str, num_nodes: int=80, days: float=7, num_users: int=100, gpus_per_node: int=4,
+              mig_fraction: float=0.05, snapshots: int=7, gpustat_nodes: int=None, end: int=1790000000,
+              seed: int=42) -> dict:
+    """Write utilization.json, cached_users.csv, sshare.txt and
+       dot_gpustat/ to directory. The gpustat files are for gpustat_nodes
+       nodes (default: num_nodes). Returns the number of lines and files
+       written."""
+    os.makedirs(directory, exist_ok=True)
+    num_mig = int(num_nodes * mig_fraction)
+    hosts = hostnames(num_nodes, num_mig)
+    lines = write_utilization(os.path.join(directory, 'utilization.json'), hosts, int(end - days * 86400), end,
+                              gpus_per_node=gpus_per_node, num_users=num_users, mig=set(hosts[len(hosts) - num_mig:]),
+                              seed=seed)
+    write_users(os.path.join(directory, 'cached_users.csv'), num_users, seed)
+    write_sshare(os.path.join(directory, 'sshare.txt'), num_users, seed)
+    timestamps = [end - sampling_seconds * k for k in range(snapshots, 0, -1)]
+    if gpustat_nodes is not None:
+        hosts = hostnames(gpustat_nodes, int(gpustat_nodes * mig_fraction))
+    files = write_gpustat(os.path.join(directory, 'dot_gpustat'), hosts, timestamps, gpus_per_node, num_users, seed)
+    return {'lines': lines, 'gpustat files': files}
+
+if __name__ == '__main__':
+    psr = argparse.ArgumentParser(description='Write synthetic utilization.json, cached_users.csv, sshare output and gpustat files')
+    psr.add_argument('directory')
+    psr.add_argument('--nodes', type=int, default=80, help='Number of nodes (default: 80)')
+    psr.add_argument('--gpus-per-node', type=int, default=4, help='GPUs per node (default: 4)')
+    psr.add_argument('--users', type=int, default=100, help='Number of users (default: 100)')
+    psr.add_argument('--days', type=float, default=7, help='Days of samples (default: 7)')
+    psr.add_argument('--mig', type=float, default=0.05, help='Fraction of MIG nodes (default: 0.05)')
+    psr.add_argument('--snapshots', type=int, default=7, help='gpustat snapshots per node (default: 7)')
+    psr.add_argument('--gpustat-nodes', type=int, default=None, help='Nodes of the gpustat files (default: --nodes)')
+    psr.add_argument('--end', type=int, default=1790000000, help='Timestamp of the end of the data')
+    psr.add_argument('--seed', type=int, default=42)
+    args = psr.parse_args()
+    counts = write_all(args.directory, args.nodes, args.days, args.users, args.gpus_per_node, args.mig,
+                       args.snapshots, args.gpustat_nodes, args.end, args.seed)
+    print(', '.join(f'{value} {name}' for name, value in counts.items()), file=sys.stderr)
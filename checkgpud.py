@@ -0,0 +1,201 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+
+"""A daemon that answers checkgpu from data kept in memory (see warm.py).
+
+   The daemon listens on a Unix socket on the login node. checkgpu sends its
+   command-line arguments as one JSON line and the daemon replies with one
+   JSON line holding the exit status and the output of the report. If no
+   daemon is running (or it cannot answer) checkgpu makes the report
+   itself, so the daemon is optional. Start it with
+
+   $ nohup /home/jdh4/bin/gpus/checkgpud.py > /dev/null 2>&1 &
+
+   It exits at once (and quietly) if a daemon is already running so it can
+   be started from cron. Only the standard library is imported at the top of this
+   file so that the checkgpu client starts quickly.
+"""
+
+import os
+import io
+import sys
+import json
+import fcntl
+import signal
+import socket
+import argparse
+import traceback
+import threading
+import socketserver
+from time import monotonic
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+
+base = "/home/jdh4/bin/gpus"
+socket_path = os.environ.get('CHECKGPUD_SOCKET', '/tmp/checkgpud.sock')
+# seconds that checkgpu waits for the daemon before making the report itself
+query_timeout = 120
+
+def query(argv: list, path: str=socket_path, timeout: float=query_timeout):
+    """Return (status, stdout, stderr) of the report for argv from the
+       daemon or None if no daemon answers. The socket must belong to the
+       owner of this file so that another user cannot pose as the daemon."""
+    try:
+        if os.stat(path).st_uid != os.stat(__file__).st_uid:
+            return None
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(json.dumps({'argv': list(argv)}).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as f:
+                reply = json.loads(f.readline())
+        if reply['status'] is None:
+            return None
+        return reply['status'], reply['stdout'], reply['stderr']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+class Output(io.TextIOBase):
+    """Stands in for sys.stdout or sys.stderr while the daemon runs. What a
+       thread answering a report prints goes to the buffer of that thread
+       (see capture) and everything else to the stream it replaced."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+@contextmanager
+def capture(out: io.StringIO, err: io.StringIO):
+    """Send what this thread prints to out and err. Without the Output
+       streams of the daemon (a single thread) sys.stdout and sys.stderr
+       are simply replaced."""
+    if not (isinstance(sys.stdout, Output) and isinstance(sys.stderr, Output)):
+        with redirect_stdout(out), redirect_stderr(err):
+            yield
+        return
+    sys.stdout.local.buffer, sys.stderr.local.buffer = out, err
+    try:
+        yield
+    finally:
+        sys.stdout.local.buffer = sys.stderr.local.buffer = None
+
+def answer(argv: list, data) -> dict:
+    """Run the report for argv and return the reply. The status is None if
+       checkgpu should make the report itself."""
+    import report
+    out, err = io.StringIO(), io.StringIO()
+    with capture(out, err):
+        try:
+            args = report.parser().parse_args(argv)
+            if args.l or args.format == 'parquet' or args.profile or args.clusters:
+                # the LaTeX file goes to the working directory of the user,
+                # parquet is binary, a profile is of the user's process and
+                # the daemon holds the data of its own cluster only
+                return {'status': None}
+            # the data is in memory and is not read by worker processes
+            status = report.main(argv + ['--workers', '1'], data)
+        except SystemExit as e:
+            # -h and invalid arguments
+            status = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+        except Exception:
+            traceback.print_exc(file=sys.__stderr__)
+            return {'status': None}
+    return {'status': status, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+class Handler(socketserver.StreamRequestHandler):
+
+    # a client that connects and sends nothing ends its thread
+    timeout = 10
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline(1 << 16))
+            argv = [str(arg) for arg in request['argv']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        reply = answer(argv, self.server.data)
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Answers each report in its own thread so that a long report (e.g.,
+       -d 28 of a cluster without rollups) does not hold up the others and
+       refreshes the data every refresh seconds. The data (see warm.Warm)
+       holds a lock while its caches change. The output of each report is
+       kept apart by replacing sys.stdout and sys.stderr with Output."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, data, refresh: float=60):
+        super().__init__(path, Handler)
+        os.chmod(path, 0o666)
+        self.data = data
+        self.refresh = refresh
+        self.refreshed = monotonic()
+        self.streams = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = Output(sys.stdout), Output(sys.stderr)
+
+    def server_close(self):
+        super().server_close()
+        if isinstance(sys.stdout, Output) and isinstance(sys.stderr, Output):
+            sys.stdout, sys.stderr = self.streams
+
+    def service_actions(self):
+        if monotonic() - self.refreshed > self.refresh:
+            try:
+                self.data.refresh()
+            except Exception:
+                traceback.print_exc()
+            self.refreshed = monotonic()
+
+def live(path: str) -> bool:
+    """True if a daemon accepts connections on the socket."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+def serve(path: str=socket_path, base: str=base, refresh: float=60) -> int:
+    # started by cron every 10 minutes so exit quietly if a daemon is running
+    if live(path):
+        return 0
+    # the lock is held for the life of the daemon
+    lock = open(path + '.lock', 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return 0
+    from warm import Warm
+    data = Warm(base)
+    data.refresh()
+    if os.path.exists(path):
+        os.unlink(path)
+    server = Server(path, data, refresh)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever(poll_interval=1)
+    finally:
+        server.server_close()
+        os.unlink(path)
+    return 0
+
+if __name__ == '__main__':
+    sys.path = list(filter(lambda p: p.startswith("/usr"), sys.path))
+    sys.path.append(base)
+    os.environ['OMP_NUM_THREADS'] = "1"
+    psr = argparse.ArgumentParser(description='Answer checkgpu from data kept in memory')
+    psr.add_argument('--socket', default=socket_path, help=f'Unix socket (default: {socket_path})')
+    psr.add_argument('--refresh', type=float, default=60, help='Seconds between refreshes of the data (default: 60)')
+    args = psr.parse_args()
+    sys.exit(serve(args.socket, base, args.refresh))
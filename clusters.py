@@ -0,0 +1,65 @@
+"""The clusters that checkgpu reports on.
+
+   Each cluster has a key (as given to checkgpu --clusters), the name shown
+   in the header of a report, the text that the hostnames of its login
+   nodes contain, the number of GPUs and the hosts whose samples are left
+   out of its reports (e.g., the cryoem nodes of TigerGPU).
+
+   The data of the cluster checkgpu runs on is in base. The data of the
+   other clusters is a copy made by cron (see crontab) in
+   base/clusters/<key>: the store and cached_users.csv of the cluster and
+   the output of sshare in sshare.txt since sshare only knows the users
+   of the cluster it runs on.
+"""
+
+import os
+
+import hostlist
+
+class Cluster:
+
+    def __init__(self, key: str, name: str, host: str, num_gpus: int, exclude: str=''):
+        self.key = key
+        self.name = name
+        self.host = host
+        self.num_gpus = num_gpus
+        # a hostlist expression (see hostlist.expand)
+        self.exclude = exclude
+
+    def __repr__(self) -> str:
+        return f'Cluster({self.key!r})'
+
+    def matches(self, host: str) -> bool:
+        """True if host (lowercase) is a login node of the cluster."""
+        return self.host in host
+
+    def excluded(self) -> list:
+        return hostlist.expand(self.exclude) if self.exclude else []
+
+    def datadir(self, base: str, host: str) -> str:
+        """The directory with the data of the cluster on host."""
+        return base if self.matches(host) else os.path.join(base, 'clusters', self.key)
+
+# in the order in which a hostname is matched
+registry = [Cluster('della', 'Della GPU', 'della-gpu', 40),
+            Cluster('tiger', 'TigerGPU', 'tiger', 320, exclude='tiger-h[19-21,23-26]g[1-2],tiger-i26g[1-2]'),
+            Cluster('traverse', 'Traverse', 'traverse', 184)]
+
+def lookup(host: str):
+    """Return the cluster of a login node or None."""
+    host = host.lower()
+    for cluster in registry:
+        if cluster.matches(host):
+            return cluster
+    return None
+
+def select(keys: str) -> list:
+    """Return the clusters of a comma-separated list of keys (or all) in
+       the order of the registry. Raises ValueError for an unknown key."""
+    chosen = [key.strip().lower() for key in keys.split(',') if key.strip()]
+    if chosen == ['all']:
+        return list(registry)
+    known = [cluster.key for cluster in registry]
+    if not chosen or any(key not in known for key in chosen):
+        raise ValueError(f"Choose clusters from {','.join(known)} or all (not {keys}).")
+    return [cluster for cluster in registry if cluster.key in chosen]
@@ -1,6 +1,38 @@
+import os
+import re
+import json
+import time
+import queue
 import subprocess
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from types import SimpleNamespace
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from collections import defaultdict
 from base64 import b64decode
+try:
+    from profiling import stage
+except ImportError:
+    # dossier.py is also copied and used on its own (without timing)
+    @contextmanager
+    def stage(name: str, rows: int=None):
+        yield SimpleNamespace(rows=rows, fields={})
+try:
+    import ldap
+except ImportError:
+    # python-ldap is optional (ldapsearch is used without it)
+    ldap = None
+
+pu_url = "ldaps://ldap.princeton.edu"
+pu_base = "o=Princeton University,c=US"
+scope_subtree = 2  # ldap.SCOPE_SUBTREE
+
+# seconds that a cached ldap record (RecordCache) is trusted; a netid that
+# was not found is looked up again at the next weekly run of make_cache.py
+record_ttl = 30 * 24 * 3600
+negative_ttl = 24 * 3600
 
 depts = {'Admission':'ADMISSION',
 'Administrative Applications, Office of Information Technology':'OIT',
@@ -189,35 +221,71 @@ depts = {'Admission':'ADMISSION',
 'Vice President, Plasma Physics Lab':'PPPL',
 'Woodrow Wilson School':'WWS'}
 
+def decode_value(value: str, encoded: bool) -> str:
+    """Return the value of an LDIF line where encoded means base64 (attr:: value)."""
+    if encoded:
+        return b64decode(value).decode("utf-8", "replace")
+    return value.strip()
+
+def parse_ldif(lines: list):
+    """Parse ldapsearch output (LDIF) in one pass and yield one record per
+       entry where entries are separated by blank lines. A line starting with
+       a space continues the previous value and values of attributes given
+       as "attr:: value" are base64 decoded. The values for a given key are
+       stored in a list since an attribute may have several values. As in
+       the output of ldapsearch, comments with a colon such as
+       "# numResponses: 2" are stored as fields and lines without a colon
+       are ignored."""
+    record = defaultdict(list)
+    field = None
+    for line in chain(lines, [""]):
+        line = line.rstrip("\r\n")
+        if field is not None and line.startswith(" "):
+            value += line[1:]
+            continue
+        if field is not None:
+            record[field].append(decode_value(value, encoded))
+            field = None
+        if line == "":
+            if record:
+                yield record
+                record = defaultdict(list)
+            continue
+        idx = line.find(":")
+        if idx == -1:
+            continue
+        field = line[:idx].replace('#', '').strip()
+        encoded = line.startswith("::", idx)
+        value = line[idx + 1 + encoded:].lstrip()
+
+def ldif_entries(lines: list):
+    """Yield the lines of each entry of a multi-entry LDIF stream (e.g., the
+       output of one ldapsearch with an OR filter). The lines are not copied
+       or re-split and blocks without a dn line (comments and the search
+       result) are skipped."""
+    start = 0
+    for i, line in enumerate(chain(lines, [""])):
+        if line == "" or line == "\r":
+            if any(entry_line.startswith("dn:") for entry_line in lines[start:i]):
+                yield lines[start:i]
+            start = i + 1
+
 def get_full_title(lines: list) -> str:
     """Extract full title which may span multiple lines."""
-    title = ""
-    found_title = False
-    for line in lines:
-        if "title:" in line:
-            title = line.split("title:")[-1].lstrip()
-            found_title = True
-        if found_title and (":" not in line):
-            title += line[1:]
-        if found_title and (((":" in line) and (not "title:" in line)) or line == ""):
-            return title
-    return title
+    return make_dict(lines)["title"][0]
 
 def make_dict(lines: list) -> defaultdict:
     """Make dictionary from a list of strings where a string may contain
        a key-value pair. The values for a given key are stored in a list
        so that multiple values associated with the same key can be stored.
+       Every entry of the LDIF is merged into one record (see parse_ldif)
+       and title holds only the first title.
     """
     record = defaultdict(list)
-    for line in lines:
-        if (":" in line):
-            idx = line.find(":")
-            field = line[:idx].replace('#', '').strip()
-            value = line[idx + 1:].strip()
-            if field == "cn" and value.startswith(": "):
-               value = b64decode(value).decode("utf-8")
-            record[field].append(value)
-    record["title"] = [get_full_title(lines)]
+    for entry in parse_ldif(lines):
+        for field, values in entry.items():
+            record[field].extend(values)
+    record["title"] = record["title"][:1] if record["title"] else [""]
     return record
 
 def get_position(netid: str) -> str:
@@ -234,77 +302,119 @@ def get_position(netid: str) -> str:
     if lines != [] and lines[-1] == "": lines = lines[:-1]
     return get_position_from_lines(lines)
 
-def get_position_from_lines(lines: list) -> str:
-    """For the given netid, return the position of the individual."""
-    dean = False
-    faculty = False
-    faculty_edu = False
-    xfaculty = False
-    emeritus = False
-    staff = False
-    postdoc_in_title = False
-    prof_in_title = False
-    lecturer = False
-    scholar = False
-    collaborator = False
-    fellow = False
-    graduate = False
-    xgraduate = False
+# get_position_from_lines: (attribute, start of value) -> flag where the
+# value includes the space after the colon (e.g., "pustatus: fac")
+attribute_rules = {
+    "pustatus": ((" fac", "faculty"),
+                 (" xfac", "xfaculty"),
+                 (" eme", "emeritus"),
+                 (" stf", "staff"),
+                 (" graduate", "graduate"),
+                 (" xgraduate", "xgraduate"),
+                 (" gradaccept", "gradaccept"),
+                 (" undergraduate", "undergraduate"),
+                 (" rcu", "rcu"),
+                 (" dcu", "dcu"),
+                 (" researchuser", "ru"),
+                 (" exceptiondcu", "xdcu"),
+                 (" sps", "sps"),
+                 (" xstf", "xstf"),
+                 (" xmiscaffil", "xmiscaffil"),
+                 (" alumg", "alumg"),
+                 (" cas", "cas"),
+                 (" ret", "retired"),
+                 (" stp", "stp"),
+                 (" shorttermaffiliate", "sta")),
+    "puaffiliation": ((" fac", "faculty"),
+                      (" xfac", "xfaculty"),
+                      (" stf", "staff"),
+                      (" xgraduate", "xgraduate"),
+                      (" rcu", "rcu"),
+                      (" dcu", "dcu"),
+                      (" researchuser", "ru")),
+    "edupersonaffiliation": ((" faculty", "faculty_edu"),)}
+
+# words searched for in the value of attributes ending in "title"
+title_rules = (("professor", "prof_in_title"),
+               ("lecturer", "lecturer"),
+               ("research scholar", "scholar"),
+               ("collaborator", "collaborator"),
+               ("fellow", "fellow"),
+               ("postdoc", "postdoc_in_title"),
+               ("visit", "visitor"))
+
+academic_level = re.compile(r" g[1-9]")
+
+# lines of the lowercased record that any of the rules above can apply to
+relevant_line = re.compile(r"^(%s|[\w;-]*title):(.*)$" % "|".join(list(attribute_rules) + ["puacademiclevel"]),
+                           re.MULTILINE)
+
+@lru_cache(maxsize=4096)
+def line_flags(attribute: str, value: str) -> tuple:
+    """Return the flags set by one lowercased attribute and value. The same
+       few values of pustatus and puaffiliation appear in almost every
+       record so the result is cached."""
+    flags = [flag for start, flag in attribute_rules.get(attribute, ()) if value.startswith(start)]
+    if attribute.endswith("title"):
+        flags.extend(flag for word, flag in title_rules if word in value)
+        if "dean" in value.replace("of the dean for", ""): flags.append("dean")
+    return tuple(flags)
+
+def position_flags(lines: list) -> tuple:
+    """Collect the flags used by get_position_from_lines along with the
+       academic level (Gx) and class year (Ux). The record is lowercased once
+       and a single regex picks out the attribute and value of the lines that
+       a rule can apply to. The two rules that apply to any line are single
+       searches of the whole text."""
+    text = "\n".join(line for line in lines if not line.startswith("#")).lower()
+    flags = set()
     Gx = ""
-    gradaccept = False
-    undergraduate = False
     Ux = ""
-    xmiscaffil = False
-    rcu = False
-    dcu = False
-    ru = False
-    xdcu = False
-    sps = False
-    xstf = False
-    cas = False
-    stp = False
-    retired = False
-    intern_or_assist = False
-    alumg = False
-    visitor = False
-    sta = False
-    instructor = False
-    for line in lines:
-        if line.startswith("#"): continue
-        line = line.lower()
-        if "dean" in line.replace("of the dean for", "") and "title:" in line: dean = True
-        if "professor" in line and "title:" in line: prof_in_title = True
-        if "pustatus: fac" in line or "puaffiliation: fac" in line: faculty = True
-        if "edupersonaffiliation: faculty" in line: faculty_edu = True
-        if "pustatus: xfac" in line or "puaffiliation: xfac" in line: xfaculty = True
-        if "pustatus: eme" in line: emeritus = True
-        if "lecturer" in line and "title:" in line: lecturer = True
-        if "research scholar" in line and "title:" in line: scholar = True
-        if "collaborator" in line and "title:" in line: collaborator = True
-        if "fellow" in line and "title:" in line: fellow = True
-        if "pustatus: stf" in line or "puaffiliation: stf" in line: staff = True
-        if "postdoc" in line and "title:" in line: postdoc_in_title = True
-        if "visit" in line and "title:" in line: visitor = True
-        if "pustatus: graduate" in line: graduate = True
-        if "puaffiliation: xgraduate" in line or "pustatus: xgraduate" in line: xgraduate = True
-        if "puacademiclevel" in line and any([f" g{yr}" in line for yr in range(1, 10)]): Gx = line.split()[-1]
-        if "pustatus: gradaccept" in line: gradaccept = True
-        if "pustatus: undergraduate" in line: undergraduate = True
-        if "undergraduate class of" in line: Ux = line.split()[-1]  # or use puclassyear
-        if "pustatus: rcu" in line or "puaffiliation: rcu" in line: rcu = True
-        if "pustatus: dcu" in line or "puaffiliation: dcu" in line: dcu = True
-        if "pustatus: researchuser" in line or "puaffiliation: researchuser" in line: ru = True
-        if "pustatus: exceptiondcu" in line: xdcu = True
-        if "pustatus: sps" in line: sps = True
-        if "pustatus: xstf" in line: xstf = True
-        if "pustatus: xmiscaffil" in line: xmiscaffil = True
-        if "pustatus: alumg" in line: alumg = True
-        if "pustatus: cas" in line: cas = True
-        if "pustatus: ret" in line: retired = True
-        if "pustatus: stp" in line: stp = True
-        if "pustatus: shorttermaffiliate" in line: sta = True
-        if ("intern" in line or "assist" in line) and "title" in line: intern_or_assist = True
-        if "instructor" in line: instructor = True
+    for attribute, value in relevant_line.findall(text):
+        if attribute == "puacademiclevel":
+            if academic_level.search(value): Gx = value.split()[-1]
+        else:
+            flags.update(line_flags(attribute, value))
+    if "instructor" in text: flags.add("instructor")
+    last = text.rfind("undergraduate class of")
+    if last != -1:
+        # or use puclassyear
+        Ux = text[text.rfind("\n", 0, last) + 1:].split("\n", 1)[0].split()[-1]
+    return flags, Gx, Ux
+
+def get_position_from_lines(lines: list) -> str:
+    """For the given netid, return the position of the individual."""
+    flags, Gx, Ux = position_flags(lines)
+    dean = "dean" in flags
+    faculty = "faculty" in flags
+    faculty_edu = "faculty_edu" in flags
+    xfaculty = "xfaculty" in flags
+    emeritus = "emeritus" in flags
+    staff = "staff" in flags
+    postdoc_in_title = "postdoc_in_title" in flags
+    prof_in_title = "prof_in_title" in flags
+    lecturer = "lecturer" in flags
+    scholar = "scholar" in flags
+    collaborator = "collaborator" in flags
+    fellow = "fellow" in flags
+    graduate = "graduate" in flags
+    xgraduate = "xgraduate" in flags
+    gradaccept = "gradaccept" in flags
+    undergraduate = "undergraduate" in flags
+    xmiscaffil = "xmiscaffil" in flags
+    rcu = "rcu" in flags
+    dcu = "dcu" in flags
+    ru = "ru" in flags
+    xdcu = "xdcu" in flags
+    sps = "sps" in flags
+    xstf = "xstf" in flags
+    cas = "cas" in flags
+    stp = "stp" in flags
+    retired = "retired" in flags
+    alumg = "alumg" in flags
+    visitor = "visitor" in flags
+    sta = "sta" in flags
+    instructor = "instructor" in flags
 
     # cleaning
     if faculty and (postdoc_in_title or lecturer or scholar) and not prof_in_title:
@@ -389,6 +499,11 @@ def get_position_from_lines(lines: list) -> str:
     else:
         return "UNKNOWN"
 
+def get_positions(records: list) -> list:
+    """Return the position for each record where a record is the list of
+       ldapsearch lines of one individual."""
+    return [get_position_from_lines(lines) for lines in records]
+
 def clean_position(position: str, level: int=0) -> str:
     """Level 0: No modifications
        Level 1: Remove parenthetical labels such as (visiting)
@@ -438,15 +553,283 @@ def get_dept_code(dept: str, resdept: str, user: str) -> str:
         print(f"No entry for {dept} or {resdept} in dossier.py for {user}")
         return "NOT_FOUND_IN_DOSSIER_DEPTS"
 
-def ldap_plus(netids: list, level=0) -> list:
+columns = ['NAME',
+           'DEPT',
+           'POSITION',
+           'TITLE',
+           'STATUS',
+           'AFFIL',
+           'ACAD_LEVEL',
+           'NETID',
+           'NETID_TRUE']
+
+def person_from_lines(netid: str, lines: list, level: int=0) -> list:
+    """Make the ldap_plus row from the ldapsearch output for one individual."""
+    record = make_dict(lines)
+    # netid_true is the true netid while netid may be an alias
+    netid_true = record['uid'][0]
+    name = record['cn'][0] if record['cn'] != [] else ""
+    dept = record['ou'][-1] if record['ou'] else ""
+    resdept = record['puresidentdepartment'][0] if record['puresidentdepartment'] != [] else ""
+    dept_code = get_dept_code(dept, resdept, netid_true)
+    title = record['title'][0] if record['title'] != [] else ""
+    pustatus = ", ".join(record["pustatus"])
+    puaffiliation = ", ".join(record["puaffiliation"])
+    puacademiclevel = ", ".join(record["puacademiclevel"])
+    position = get_position_from_lines(lines)
+    position = clean_position(position, level)
+    return [name,
+            dept_code,
+            position,
+            title,
+            pustatus,
+            puaffiliation,
+            puacademiclevel,
+            netid,
+            netid_true]
+
+def ldapsearch_lines(netid: str) -> tuple:
+    """Return the ldapsearch output for the username or None if it was not
+       found, and whether one of the ldapsearch commands failed (e.g., timed
+       out) so that a missing entry cannot be trusted."""
+    failed = False
+    # if the netid is not found then assume it was an alias and search by mail (R. Knight)
+    # could also look for multiple occurrences of campusid
+    for query in (f"uid={netid}", f"mail={netid}@princeton.edu"):
+        try:
+            cmd = f"ldapsearch -x {query}"
+            output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
+        except:
+            failed = True
+            continue
+        if output.returncode != 0:
+            # e.g., 255 for Can't contact LDAP server (no match exits with 0)
+            failed = True
+            continue
+        lines = output.stdout.decode("utf-8").split('\n')
+        if make_dict(lines)['numResponses'] == [str(2)]:
+            return lines, failed
+    return None, failed
+
+def not_found_row(netid: str) -> list:
+    return [None] * (len(columns) - 2) + [netid, None]
+
+def escape_filter(value: str) -> str:
+    """Escape the special characters of an LDAP filter value (RFC 4515)."""
+    for char, code in (('\\', r'\5c'), ('*', r'\2a'), ('(', r'\28'), (')', r'\29'), ('\0', r'\00')):
+        value = value.replace(char, code)
+    return value
+
+class BatchBackend(ABC):
+    """Look up many netids per search with OR filters such as
+       (|(uid=a)(uid=b)) running up to size searches at a time. Subclasses
+       implement query which returns the ldapsearch-style lines of each entry
+       matching a filter so that every entry is processed exactly like the
+       output of ldapsearch for a single netid."""
+
+    def __init__(self, size: int=4, batch: int=50):
+        self.size = size
+        self.batch = batch
+
+    @abstractmethod
+    def query(self, ldap_filter: str) -> list:
+        """Return the lines of each entry matching the filter. Raises if the
+           search fails (e.g., times out)."""
+
+    def close(self):
+        pass
+
+    def search_batch(self, attribute: str, values: list) -> tuple:
+        """Return the lines of the entry matching each value (values that
+           match zero or several entries are left out), whether the search
+           failed and the time of the search."""
+        start = time.perf_counter()
+        ldap_filter = "(|" + "".join(f"({attribute}={escape_filter(value)})" for value in values) + ")"
+        wanted = {value.lower(): value for value in values}
+        matches = defaultdict(list)
+        try:
+            entries = self.query(ldap_filter)
+        except Exception:
+            # e.g., ldapsearch timed out, failed or is missing or ldap.LDAPError
+            return {}, True, time.perf_counter() - start
+        for lines in entries:
+            for record in parse_ldif(lines):
+                fields = {field.lower(): values for field, values in record.items()}
+                for value in fields.get(attribute.lower(), []):
+                    if value.lower() in wanted:
+                        matches[wanted[value.lower()]].append(lines)
+        found = {value: entries[0] for value, entries in matches.items() if len(entries) == 1}
+        return found, False, time.perf_counter() - start
+
+    def search(self, attribute: str, values: list) -> tuple:
+        """Search for all values in batches. Returns the lines of the entry for
+           each value found, the values of the batches that failed and the
+           time of the search that covered each value."""
+        batches = [values[i:i + self.batch] for i in range(0, len(values), self.batch)]
+        found, failed, seconds = {}, set(), {}
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            for batch, (entries, error, elapsed) in zip(batches, pool.map(lambda b: self.search_batch(attribute, b), batches)):
+                found.update(entries)
+                if error: failed.update(batch)
+                seconds.update({value: elapsed for value in batch})
+        return found, failed, seconds
+
+class LdapsearchBackend(BatchBackend):
+    """Run one ldapsearch per batch of netids and split its multi-entry
+       output into entries (see ldif_entries)."""
+
+    def __init__(self, size: int=4, batch: int=50, timeout: float=30):
+        super().__init__(size, batch)
+        self.timeout = timeout
+
+    def query(self, ldap_filter: str) -> list:
+        # a search that fails (e.g., no server) raises CalledProcessError
+        # so that search_batch does not take it for no matches
+        output = subprocess.run(["ldapsearch", "-x", ldap_filter], capture_output=True, timeout=self.timeout, check=True)
+        return list(ldif_entries(output.stdout.decode("utf-8").split('\n')))
+
+class LdapBackend(BatchBackend):
+    """Search ldap with python-ldap instead of running ldapsearch. A pool of
+       persistent connections is kept. The connect argument is a function
+       returning a new bound connection (used by the tests)."""
+
+    def __init__(self, url: str=pu_url, base: str=pu_base, size: int=4, batch: int=50, connect=None):
+        super().__init__(size, batch)
+        self.url = url
+        self.base = base
+        self.connect = connect if connect else self.bind
+        self.pool = queue.LifoQueue()
+
+    def bind(self):
+        conn = ldap.initialize(self.url)
+        conn.protocol_version = ldap.VERSION3
+        conn.set_option(ldap.OPT_NETWORK_TIMEOUT, 3)
+        conn.simple_bind_s()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection from the pool. A connection that raised is
+           dropped instead of being returned to the pool."""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.unbind_s()
+            except Exception:
+                pass
+            raise
+        self.pool.put(conn)
+
+    def close(self):
+        while not self.pool.empty():
+            self.pool.get_nowait().unbind_s()
+
+    def query(self, ldap_filter: str) -> list:
+        with self.connection() as conn:
+            entries = conn.search_s(self.base, scope_subtree, ldap_filter)
+        # dn is None for search references
+        return [[f"dn: {dn}"] + [f"{field}: {value.decode('utf-8', 'replace')}"
+                                 for field, values in attrs.items() for value in values]
+                for dn, attrs in entries if dn is not None]
+
+def get_backend(size: int=4, batch: int=50) -> BatchBackend:
+    """Return an LdapBackend if python-ldap is installed and the server can
+       be reached. Otherwise return an LdapsearchBackend."""
+    if ldap is not None:
+        backend = LdapBackend(size=size, batch=batch)
+        try:
+            with backend.connection():
+                pass
+            return backend
+        except ldap.LDAPError:
+            pass
+    return LdapsearchBackend(size=size, batch=batch)
+
+def backend_lines(netids: list, backend: BatchBackend) -> dict:
+    """Look up all netids with batched uid searches and then batched mail
+       searches for the netids that were not found (aliases). The netids of
+       a batch that failed are looked up one at a time with ldapsearch and
+       are marked failed if that fails too so that they are not cached as
+       not found. Returns netid -> (lines or None, failed, seconds)."""
+    by_uid, uid_failed, uid_seconds = backend.search("uid", netids)
+    aliases = [netid for netid in netids if netid not in by_uid and netid not in uid_failed]
+    by_mail, mail_failed, mail_seconds = backend.search("mail", [f"{netid}@princeton.edu" for netid in aliases])
+    retry = [netid for netid in netids if netid in uid_failed or f"{netid}@princeton.edu" in mail_failed]
+    def fetch(netid):
+        start = time.perf_counter()
+        lines, failed = ldapsearch_lines(netid)
+        return lines, failed, time.perf_counter() - start
+    with ThreadPoolExecutor(max_workers=backend.size) as pool:
+        retried = dict(zip(retry, pool.map(fetch, retry)))
+    fetched = {}
+    for netid in netids:
+        mail = f"{netid}@princeton.edu"
+        seconds = uid_seconds[netid] + mail_seconds.get(mail, 0)
+        if netid in retried:
+            lines, failed, elapsed = retried[netid]
+            fetched[netid] = (lines, failed, seconds + elapsed)
+        else:
+            fetched[netid] = (by_uid.get(netid, by_mail.get(mail)), False, seconds)
+    return fetched
+
+class RecordCache:
+    """Persistent cache of the raw ldap output of each netid stored as JSON
+       (netid -> lines and fetch time). Entries expire after ttl seconds.
+       Netids that were not found are cached as well (negative caching) but
+       expire after negative_ttl seconds. Call save to write the cache."""
+
+    def __init__(self, path: str, ttl: float=record_ttl, negative_ttl: float=negative_ttl):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def fresh(self, netid: str) -> bool:
+        entry = self.entries.get(netid)
+        if entry is None:
+            return False
+        ttl = self.ttl if entry["lines"] is not None else self.negative_ttl
+        return time.time() - entry["fetched"] < ttl
+
+    def get(self, netid: str):
+        """Return the cached lines of the netid (None if not found)."""
+        return self.entries[netid]["lines"]
+
+    def put(self, netid: str, lines) -> None:
+        self.entries[netid] = {"lines": lines, "fetched": time.time()}
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+def ldap_plus(netids: list, level=0, workers: int=1, latency: bool=False, backend: BatchBackend=None,
+              cache: RecordCache=None) -> list:
     """Take a list of usernames (which may be aliases) and return information about
-       each individual from ldap. Here is an example:
+       each individual from ldap. Up to workers lookups run at the same time and
+       the rows are returned in the order of netids. If latency is True then a
+       LATENCY column is added with the seconds spent on each lookup. If a backend
+       is given (see get_backend) then the netids are looked up in batches with OR
+       filters instead of one ldapsearch per netid (workers is ignored and the
+       latency is that of the batch). If a cache is given (see RecordCache)
+       then only the netids that are new or expired are looked up (latency 0 for
+       the others) and the cache is saved. Here is an example:
 
            import pandas as pd
            import dossier
 
            netids = ["aturing", "bill", "sg6615", "halverson"]
-           df = pd.DataFrame(dossier.ldap_plus(netids))
+           df = pd.DataFrame(dossier.ldap_plus(netids, workers=4))
            headers = df.iloc[0]
            df = pd.DataFrame(df.values[1:], columns=headers)
 
@@ -460,75 +843,34 @@ def ldap_plus(netids: list, level=0) -> list:
            dept.index += 1
            print(dept.rename(columns={"index":"Dept", "DEPT":"Count"}))
     """
-    columns = ['NAME',
-               'DEPT',
-               'POSITION',
-               'TITLE',
-               'STATUS',
-               'AFFIL',
-               'ACAD_LEVEL',
-               'NETID',
-               'NETID_TRUE']
-    people = [columns]
-    not_found = 0
-    for netid in netids:
-        uid_except = False
-        try:
-            cmd = f"ldapsearch -x uid={netid}"
-            output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
-        except:
-            uid_except = True
-            uid_success = False
-        else:
-            lines = output.stdout.decode("utf-8").split('\n')
-            record = make_dict(lines)
-            uid_success = (record['numResponses'] == [str(2)])
-
-        mail_except = False
-        mail_success = False
-        if (not uid_success):
-            # netid not found so assume it was an alias and search by mail (R. Knight)
-            # could also look for multiple occurrences of campusid
-            try:
-                cmd = f"ldapsearch -x mail={netid}@princeton.edu"
-                output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
-            except:
-                mail_except = True
-                mail_success = False
-            else:
-                lines = output.stdout.decode("utf-8").split('\n')
-                record = make_dict(lines)
-                mail_success = (record['numResponses'] == [str(2)])
-
-        if ((not uid_success) and (not mail_success)):
-            # both attempts failed
-            people.append([None] * (len(columns) - 2) + [netid, None])
-            not_found += 1
-        elif (uid_except and mail_except):
-            # both commands failed
-            people.append([None] * (len(columns) - 2) + [netid, None])
+    people = [columns + ['LATENCY'] if latency else list(columns)]
+    todo = list(dict.fromkeys(netid for netid in netids if cache is None or not cache.fresh(netid)))
+    def fetch(netid):
+        start = time.perf_counter()
+        lines, failed = ldapsearch_lines(netid)
+        return lines, failed, time.perf_counter() - start
+    with stage("ldap search", len(todo)) as timed:
+        timed.fields["backend"] = type(backend).__name__ if backend is not None else f"ldapsearch x{workers}"
+        if backend is not None:
+            fetched = backend_lines(todo, backend)
+        elif workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = dict(zip(todo, pool.map(fetch, todo)))
         else:
-            # netid_true is the true netid while netid may be an alias
-            netid_true = record['uid'][0]
-            name = record['cn'][0] if record['cn'] != [] else ""
-            dept = record['ou'][-1] if record['ou'] else ""
-            resdept = record['puresidentdepartment'][0] if record['puresidentdepartment'] != [] else ""
-            dept_code = get_dept_code(dept, resdept, netid_true)
-            title = record['title'][0] if record['title'] != [] else ""
-            pustatus = ", ".join(record["pustatus"])
-            puaffiliation = ", ".join(record["puaffiliation"])
-            puacademiclevel = ", ".join(record["puacademiclevel"])
-            position = get_position_from_lines(lines)
-            position = clean_position(position, level)
-            people.append([name,
-                           dept_code,
-                           position,
-                           title,
-                           pustatus,
-                           puaffiliation,
-                           puacademiclevel,
-                           netid,
-                           netid_true])
+            fetched = dict(zip(todo, map(fetch, todo)))
+    if cache is not None:
+        with stage("ldap cache save", len(cache.entries)):
+            for netid, (lines, failed, _) in fetched.items():
+                if lines is not None or not failed:
+                    cache.put(netid, lines)
+            cache.save()
+    not_found = 0
+    with stage("ldap parse", len(netids)):
+        for netid in netids:
+            lines, _, seconds = fetched[netid] if netid in fetched else (cache.get(netid), False, 0.0)
+            person = not_found_row(netid) if lines is None else person_from_lines(netid, lines, level)
+            people.append(person + [round(seconds, 3)] if latency else person)
+            not_found += (lines is None)
     if (not_found):
         print(f'Number of netids not found: {not_found}')
     return people
@@ -0,0 +1,189 @@
+"""Read the samples of a checkgpu report for a single user over a few days
+   without NumPy or pandas (importing them takes longer than the report
+   itself on the login nodes).
+
+   The samples are read from the store (the .npy members of each day
+   partition are decoded with the array module) followed by the lines of
+   utilization.json that are not in the store yet, or from utilization.json
+   alone, starting at the offset given by utilization.json.idx. They are added up
+   by aggregate.Aggregate.add_samples and printed by report.user_lines.
+   report() returns None whenever the report is not one of the simple
+   cases handled there (e.g., a week without a utilization or duplicate
+   users in cached_users.csv) and report.main then makes it with pandas.
+"""
+
+import os
+import ast
+import csv
+import sys
+import json
+import struct
+import zipfile
+from array import array
+from itertools import chain
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from aggregate import Aggregate, seconds_per_day
+from report import range_start, user_lines
+
+# strings that pandas.read_csv reads as NaN
+na_values = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+             '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+typecodes = {'i1': 'b', 'i2': 'h', 'i4': 'i', 'i8': 'q'}
+
+def read_npy(data: bytes):
+    """Return a one-dimensional array of integers (as an array) or strings
+       (as a list) from the bytes of a .npy file."""
+    if data[6] == 1:
+        (length,), start = struct.unpack('<H', data[8:10]), 10
+    else:
+        (length,), start = struct.unpack('<I', data[8:12]), 12
+    header = ast.literal_eval(data[start:start + length].decode('latin1'))
+    descr, body = header['descr'], data[start + length:]
+    if descr[1:2] == 'U':
+        width = int(descr[2:])
+        text = body.decode('utf-32-be' if descr[0] == '>' else 'utf-32-le')
+        return [text[i:i + width].rstrip('\x00') for i in range(0, len(text), width)]
+    values = array(typecodes[descr[1:]])
+    values.frombytes(body)
+    if descr[0] in '<>' and (descr[0] == '<') != (sys.byteorder == 'little'):
+        values.byteswap()
+    return values
+
+def date_of(day: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(days=day)
+
+def partition_path(storedir: str, day: int) -> str:
+    return os.path.join(storedir, date_of(day).strftime('%Y%m%d') + '.npz')
+
+def partition_days(storedir: str) -> list:
+    """Return the days (since the epoch) of the partitions in the store as
+       utilization.partition_days."""
+    days = []
+    try:
+        names = os.listdir(storedir)
+    except OSError:
+        return []
+    for name in names:
+        if not name.endswith('.npz'):
+            continue
+        try:
+            date = datetime.strptime(name[:-len('.npz')], '%Y%m%d')
+        except ValueError:
+            continue
+        days.append((date - date_of(0)).days)
+    return sorted(days)
+
+def store_samples(storedir: str, days: list, begin: float, end: float):
+    """Yield (timestamp, host, user, util) of the samples in the store with
+       begin <= timestamp <= end where util is -1 for N/A."""
+    for day in days:
+        if not int(begin) // seconds_per_day <= day <= int(end) // seconds_per_day:
+            continue
+        with zipfile.ZipFile(partition_path(storedir, day)) as part:
+            columns = {key: read_npy(part.read(key + '.npy'))
+                       for key in ['timestamp', 'hosts', 'host', 'users', 'user', 'util']}
+        hosts, users = columns['hosts'], columns['users']
+        for ts, host, user, util in zip(columns['timestamp'], columns['host'], columns['user'], columns['util']):
+            if begin <= ts <= end:
+                yield ts, hosts[host], users[user], util
+
+def json_offset(datafile: str, begin: float):
+    """Return the offset in utilization.json from which to read the lines
+       with timestamp >= begin using utilization.json.idx or None if the
+       index is missing or does not match the file."""
+    index = array('q')
+    try:
+        with open(datafile + '.idx', 'rb') as f:
+            index.frombytes(f.read())
+    except (OSError, ValueError):
+        return None
+    timestamps = index[0:len(index) - len(index) % 2:2]
+    offsets = index[1:len(index) - len(index) % 2:2]
+    # trust the index up to the first entry that does not increase (see utilization.valid_entries)
+    for i in range(1, len(offsets)):
+        if timestamps[i] <= timestamps[i - 1] or offsets[i] <= offsets[i - 1]:
+            timestamps, offsets = timestamps[:i], offsets[:i]
+            break
+    if not offsets or offsets[-1] > os.path.getsize(datafile):
+        return None
+    # the lines after the last indexed timestamp are scanned
+    return offsets[min(bisect_left(timestamps, begin), len(offsets) - 1)]
+
+def json_samples(datafile: str, offset: int, begin: float, end: float):
+    """Yield (timestamp, host, user, util) of the lines of utilization.json
+       with begin <= timestamp <= end reading from offset."""
+    with open(datafile, 'rb') as fp:
+        fp.seek(offset)
+        for line in fp:
+            if not line.endswith(b'\n'):
+                # line still being written
+                break
+            parts = line.split(b'"')
+            if len(parts) != 25 or parts[21] != b'jobid':
+                x = json.loads(line)
+                parts = [b''] * 25
+                parts[3], parts[7], parts[15], parts[19] = [x[key].encode() for key in ['timestamp', 'host', 'user', 'util']]
+            ts = int(parts[3])
+            if ts < begin:
+                continue
+            if ts > end:
+                break
+            util = parts[19]
+            yield ts, parts[7].decode(), parts[15].decode(), int(util) if util.isdigit() else -1
+
+def user_data(userfile: str, netid: str):
+    """Return the POSITION and SPONSOR of netid from cached_users.csv ('' if
+       missing) or None if the user appears more than once or the file
+       cannot be read."""
+    found = []
+    try:
+        with open(userfile, newline='') as f:
+            for row in csv.DictReader(f):
+                if row['NETID'] == netid:
+                    found.append(row)
+    except (OSError, KeyError, csv.Error):
+        return None
+    if len(found) > 1:
+        return None
+    row = found[0] if found else {}
+    return [row.get(name, '') if row.get(name, '') not in na_values else '' for name in ['POSITION', 'SPONSOR']]
+
+def report(args, cluster: str, begin: float, end: float, seconds_in_window: float, cryoem: list, files):
+    """Return the lines of the report of the user args.netid or None if
+       report.main has to make it."""
+    days = partition_days(files.storedir)
+    if days:
+        samples = store_samples(files.storedir, days, begin, end)
+        with zipfile.ZipFile(partition_path(files.storedir, days[0])) as part:
+            min_timestamp = min(read_npy(part.read('timestamp.npy')))
+        # the lines appended since make_store.py last ran (see utilization.iter_tail)
+        with zipfile.ZipFile(partition_path(files.storedir, days[-1])) as part:
+            after = max(read_npy(part.read('timestamp.npy')))
+        if end > after and os.path.isfile(files.datafile):
+            offset = json_offset(files.datafile, max(begin, after + 1))
+            if offset is None:
+                return None
+            samples = chain(samples, json_samples(files.datafile, offset, max(begin, after + 1), end))
+    elif os.path.isfile(files.datafile):
+        offset = json_offset(files.datafile, begin)
+        if offset is None:
+            return None
+        samples = json_samples(files.datafile, offset, begin, end)
+        with open(files.datafile, 'rb') as f:
+            min_timestamp = int(f.readline().split(b'"', 4)[3])
+    else:
+        return None
+    totals = Aggregate(args.netid)
+    totals.add_samples(samples, set(cryoem))
+
+    def person(netid):
+        data = user_data(files.userfile, netid)
+        if data is None:
+            return None
+        position, sponsor = data
+        return position, files.accounts(cluster).get(netid, ''), sponsor
+
+    start_stamp, warning = range_start(args, end, seconds_in_window, min_timestamp)
+    return user_lines(args, cluster, totals, start_stamp, warning, person)
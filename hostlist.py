@@ -0,0 +1,134 @@
+"""Expand and compress Slurm hostlists such as tiger-i[19-23]g[1-16] or
+   della-l0[1-3]g[1-4] (the same as scontrol show hostnames and
+   nodeset -e/-f). A range keeps the zero padding of its first number so
+   that della-r[08-10] expands to della-r08, della-r09 and della-r10.
+   Expansions are cached since the same job strings are seen repeatedly."""
+
+import re
+from functools import lru_cache
+from itertools import product
+
+# an item is text and bracket groups up to a comma outside brackets
+item_pattern = re.compile(r"(?:[^,\[]|\[[^\]]*\])+")
+group_pattern = re.compile(r"\[([^\]]*)\]")
+
+def split_hostlist(hostlist: str) -> list:
+    """Split a hostlist on the commas that are not inside brackets."""
+    return [item.strip() for item in item_pattern.findall(hostlist) if item.strip()]
+
+def expand_ranges(ranges: str) -> list:
+    """Expand the inside of a bracket group such as 01-03,7 into
+       ['01', '02', '03', '7']."""
+    values = []
+    for term in ranges.split(','):
+        if '-' in term:
+            start, end = term.split('-')
+            numbers = range(int(start), int(end) + 1)
+            if start.startswith('0') and len(start) > 1:
+                width = len(start)
+                values.extend(str(n).zfill(width) for n in numbers)
+            else:
+                values.extend(map(str, numbers))
+        else:
+            values.append(term)
+    return values
+
+@lru_cache(maxsize=4096)
+def expand_host(item: str) -> tuple:
+    """Expand one hostlist item which may hold several bracket groups. The
+       leftmost group varies slowest."""
+    if '[' not in item:
+        return (item,)
+    parts = group_pattern.split(item)
+    if len(parts) == 3:
+        prefix, ranges, suffix = parts
+        return tuple([prefix + value + suffix for value in expand_ranges(ranges)])
+    # parts alternates between literal text and the inside of a bracket group
+    choices = [[part] if i % 2 == 0 else expand_ranges(part) for i, part in enumerate(parts)]
+    return tuple(''.join(host) for host in product(*choices))
+
+@lru_cache(maxsize=4096)
+def expand_hostlist(hostlist: str) -> tuple:
+    if ',' not in hostlist and '[' not in hostlist:
+        return (hostlist.strip(),) if hostlist.strip() else ()
+    hosts = []
+    for item in split_hostlist(hostlist):
+        hosts.extend(expand_host(item))
+    return tuple(hosts)
+
+def expand(hostlist: str) -> list:
+    """Return the host names in a hostlist in order, e.g.
+       tiger-h26c1n7,tiger-i26c1n[18,22] -> tiger-h26c1n7, tiger-i26c1n18,
+       tiger-i26c1n22."""
+    return list(expand_hostlist(hostlist))
+
+def outer_numbers(host: str) -> list:
+    """Return the (start, end) positions of the digit runs of host that
+       are not inside brackets."""
+    spans = []
+    depth = 0
+    for match in re.finditer(r"\[|\]|\d+", host):
+        token = match.group()
+        if token == '[':
+            depth += 1
+        elif token == ']':
+            depth -= 1
+        elif depth == 0:
+            spans.append(match.span())
+    return spans
+
+def fold(values: list) -> str:
+    """Write numbers as ranges where the expansion gives back the same
+       strings, e.g. ['1', '2', '3', '08', '09', '10'] -> 1-3,08-10."""
+    values = sorted(set(values), key=lambda value: (int(value), len(value)))
+    terms = []
+    start = end = values[0]
+    for value in values[1:]:
+        if value == str(int(end) + 1).zfill(len(start)):
+            end = value
+        else:
+            terms.append(start if start == end else f"{start}-{end}")
+            start = end = value
+    terms.append(start if start == end else f"{start}-{end}")
+    return ','.join(terms)
+
+def fold_position(hosts: list, position: int) -> list:
+    """Merge the hosts that differ only in their digit run at position
+       (counted from the right) into one bracket group."""
+    groups = {}
+    for host in hosts:
+        spans = outer_numbers(host)
+        if len(spans) <= position:
+            groups.setdefault((host, None), [])
+            continue
+        start, end = spans[-1 - position]
+        key = (host[:start], host[end:])
+        groups.setdefault(key, []).append(host[start:end])
+    folded = []
+    for (prefix, suffix), values in groups.items():
+        if suffix is None:
+            folded.append(prefix)
+        elif len(set(values)) == 1:
+            folded.append(prefix + values[0] + suffix)
+        else:
+            folded.append(f"{prefix}[{fold(values)}]{suffix}")
+    return folded
+
+@lru_cache(maxsize=256)
+def compress_hosts(hosts: tuple) -> str:
+    folded = list(dict.fromkeys(hosts))
+    position = 0
+    while any(len(outer_numbers(host)) > position for host in folded):
+        merged = fold_position(folded, position)
+        if len(merged) < len(folded):
+            folded = merged
+            position = 0
+        else:
+            position += 1
+    return ','.join(folded)
+
+def compress(hosts) -> str:
+    """Return a hostlist for the host names, e.g. della-l01g1, ...,
+       della-l03g4 -> della-l[01-03]g[1-4]. expand() of the result gives
+       the same set of hosts."""
+    return compress_hosts(tuple(hosts))
@@ -5,21 +5,24 @@ base = "/home/jdh4/bin/gpus"
 import sys
 sys.path = list(filter(lambda p: p.startswith("/usr"), sys.path))
 sys.path.append(base)
-import json
 import subprocess
+from time import perf_counter
 import pandas as pd
-from dossier import ldap_plus
+from dossier import ldap_plus, get_backend, RecordCache
+from utilization import iter_chunks
+import profiling
+
+# time each stage with --profile (to stderr) or $GPUS_PROFILE (to a file)
+profiling.start("make_cache", "-" if "--profile" in sys.argv[1:] else None)
+start = perf_counter()
 
 if 1:
-  rows = []
-  with open(base + "/utilization.json") as fp:
-    for line in fp.readlines():
-      x = json.loads(line)
-      rows.append(list(x.values()))
-  df = pd.DataFrame(rows)
-  del rows
-  df.columns = ['timestamp', 'host', 'index', 'username', 'usage', 'jobid']
-  netids = list(df.username.drop_duplicates().values)
+  read = profiling.Stage("read utilization.json", 0)
+  netids = set()
+  for chunk in read.iterate(iter_chunks(base + "/utilization.json")):
+    netids.update(chunk.username.unique())
+  read.done()
+  netids = list(netids)
   if "root" in netids: netids.remove("root")
   if "OFFLINE" in netids: netids.remove("OFFLINE")
 else:
@@ -29,9 +32,14 @@ else:
   netids.remove('')
   netids.remove('+')
 
-univ_info = ldap_plus(sorted(netids))
+# only new or expired netids are looked up (see RecordCache) with batched
+# searches (4 at a time) using python-ldap if available otherwise ldapsearch
+cache = RecordCache(f"{base}/ldap_records.json")
+univ_info = ldap_plus(sorted(netids), backend=get_backend(size=4), cache=cache)
 df = pd.DataFrame(univ_info[1:], columns=univ_info[0])
 cols = ['NETID', 'POSITION', 'DEPT', 'NAME', 'SPONSOR']
 df = df[cols]
 df = df[pd.notna(df.POSITION) | pd.notna(df.DEPT) | pd.notna(df.SPONSOR)]
-df.to_csv(f"{base}/cached_users.csv", columns=cols, index=False)
+with profiling.stage("write cached_users.csv", df.shape[0]):
+  df.to_csv(f"{base}/cached_users.csv", columns=cols, index=False)
+profiling.write("total", perf_counter() - start, len(netids))
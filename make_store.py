@@ -0,0 +1,17 @@
+#!/usr/licensed/anaconda3/2020.11/bin/python
+
+# index the new lines of utilization.json, convert new rows into the columnar
+# store read by checkgpu and roll up the hours and days completed since the
+# last run
+
+base = "/home/jdh4/bin/gpus"
+
+import sys
+sys.path = list(filter(lambda p: p.startswith("/usr"), sys.path))
+sys.path.append(base)
+from utilization import convert, update_index
+from rollup import update
+
+update_index(f"{base}/utilization.json", write=True)
+convert(f"{base}/utilization.json", f"{base}/store")
+update(f"{base}/store")
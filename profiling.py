@@ -0,0 +1,129 @@
+"""Opt-in timing of the stages of checkgpu, make_cache.py, dossier.ldap_plus
+   and tigergpu_usage.py.
+
+   Profiling is off unless start() is given a path (checkgpu --profile) or
+   the environment variable GPUS_PROFILE is set (for cron jobs). Each
+   stage then writes one JSON line with its wall time, the rows it
+   processed and the memory of the process, e.g.,
+
+   {"program": "checkgpu", "run": "della-gpu-12345-1790000000", "stage": "read", "seconds": 0.412,
+    "rows": 1382400, "rss_mb": 212.5, "peak_mb": 240.1, "time": 1790000000.4}
+
+   The lines are appended to the file (or written to stderr if the path is
+   '-') so that a metrics log can collect the runs of many days. Lines of
+   the same run share the run field. Only the standard library is imported
+   so that checkgpu still starts quickly.
+"""
+
+import os
+import sys
+import json
+import resource
+from contextlib import contextmanager
+from time import time, perf_counter
+from socket import gethostname
+
+env_var = 'GPUS_PROFILE'
+
+# set by start()
+path = None
+program = None
+run = None
+
+def start(name: str, to: str=None) -> bool:
+    """Turn on profiling for the program name if to (a path or '-') is
+       given or GPUS_PROFILE is set. Returns True if profiling is on."""
+    global path, program, run
+    path = to if to else os.environ.get(env_var) or None
+    program = name
+    run = f'{gethostname()}-{os.getpid()}-{int(time())}'
+    return path is not None
+
+def enabled() -> bool:
+    return path is not None
+
+def memory() -> tuple:
+    """Return the resident and the peak resident memory in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        rss = None
+    return rss, peak
+
+def write(stage: str, seconds: float, rows: int=None, **fields) -> None:
+    """Write the record of a stage if profiling is on. A failure to write
+       never stops the program."""
+    if path is None:
+        return
+    rss, peak = memory()
+    record = {'program': program, 'run': run, 'stage': stage, 'seconds': round(seconds, 6), 'rows': rows,
+              'rss_mb': None if rss is None else round(rss, 1), 'peak_mb': round(peak, 1), 'time': round(time(), 3)}
+    record.update(fields)
+    line = json.dumps(record) + '\n'
+    try:
+        if path == '-':
+            sys.stderr.write(line)
+        else:
+            with open(path, 'a') as f:
+                f.write(line)
+    except OSError:
+        pass
+
+class Stage:
+    """The wall time and rows of a stage. The time of each with block on
+       the stage is added up so that a stage can time the body of a loop
+       (call done() after the loop) while stage() times a single block:
+
+       read = Stage('read')
+       for chunk in read.iterate(chunks):
+           ...
+       read.done()
+    """
+
+    def __init__(self, name: str, rows: int=None):
+        self.name = name
+        self.rows = rows
+        self.seconds = 0.0
+        self.fields = {}
+
+    def __enter__(self):
+        self.begin = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += perf_counter() - self.begin
+        return False
+
+    def add(self, rows: int) -> None:
+        self.rows = (self.rows or 0) + rows
+
+    def iterate(self, items):
+        """Yield the items of an iterable (e.g., chunks read lazily) adding
+           the time spent producing them and their lengths to the stage."""
+        items = iter(items)
+        while True:
+            with self:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                self.add(len(item))
+            yield item
+
+    def done(self) -> None:
+        write(self.name, self.seconds, self.rows, **self.fields)
+
+@contextmanager
+def stage(name: str, rows: int=None):
+    """Time a single with block as a stage and write it at the end.
+
+       with profiling.stage('merge') as s:
+           df = pd.merge(...)
+           s.rows = df.shape[0]
+    """
+    timed = Stage(name, rows)
+    with timed:
+        yield timed
+    timed.done()
@@ -0,0 +1,708 @@
+"""The checkgpu report. main() parses the checkgpu options, gathers the
+   samples of the window and prints the report. make_report() returns the
+   numbers of the report (a Report) for other programs such as
+   alert_checkgpu.py and --format writes them as json, csv or parquet
+   instead of text. The samples and user data
+   come from a Files object which reads them from disk for every report
+   (direct mode) or from the daemon (checkgpud.py) which keeps them in
+   memory between reports.
+
+   NumPy and pandas are imported only once a report needs them so that
+   checkgpu -h, a rejected host and the reports made by fastpath.py do not
+   pay for them. Keep the imports at the top of this file light.
+"""
+
+import os
+import argparse
+import textwrap
+from time import time, perf_counter
+from datetime import datetime, timedelta
+from socket import gethostname
+from pathlib import Path
+from functools import reduce
+
+import slurm
+import clusters
+import profiling
+
+base = "/home/jdh4/bin/gpus"
+days_default = 1
+# longest window of a single-user report made by fastpath.py
+fastpath_seconds = 7 * 24 * 60 * 60
+
+def parser() -> argparse.ArgumentParser:
+    psr = argparse.ArgumentParser(prog='checkgpu', add_help=False,
+      description='Examine GPU utilization and usage of TigerGPU',
+      formatter_class=argparse.RawDescriptionHelpFormatter,
+      epilog=textwrap.dedent('''
+      Utilization is the fraction of time that a kernel is running on the GPU.
+      For instance, a code with a main loop that runs a GPU kernel for 3 seconds
+      and then does CPU work for 2 seconds has a utilization of 60%. Usage is a
+      measure of the allocated GPU resources (it is independent of utilization).
+      A code that runs for 12 hours using 4 GPUs has a usage of 48 GPU-hours.
+
+      Examples:
+
+        Create report for all users over the last week:
+           $ checkgpu -d 7
+
+        Show GPU usage by department over the last 36 hours:
+           $ checkgpu -p -t 36
+
+        Show users with a mean GPU utilization of less than 15% over the last 12 hours:
+           $ checkgpu -c 15 -t 12
+
+        Create report only for the user aturing over last 30 minutes:
+           $ checkgpu -u aturing -t 0.5
+
+        Create report for all users from June 1, 2020 to June 15, 2020:
+           $ checkgpu -e 06/15/2020 -d 15
+    '''))
+
+    grp = psr.add_mutually_exclusive_group(required=False)
+    grp.add_argument('-t', type=float, action='store', dest='hours',
+        default=24, help='Create report over this many previous hours from now \
+        (default: 24). Cannot be used with -d.')
+    grp.add_argument('-d', type=float, action='store', dest='days', default=days_default,
+        help='Create report over this many previous days from now \
+        (default: 1). Cannot be used with -t.')
+    psr.add_argument('-c', type=float, action='store', dest='util_cutoff',
+        default=100, help='Only show users with less than this utilization(%%) \
+        (default: 100)')
+    psr.add_argument('-g', type=float, action='store', dest='gpu_hours_cutoff',
+        default=0, help='Ignore users with less than this many gpu-hours in the \
+        specified window (default: 0)')
+    psr.add_argument('-e', type=str, action='store', dest='end_date',
+        default=None, help='Create report ending on this date and going back in time \
+        from this date by -t <hours> or -d <days> (format MM/DD/YYYY)')
+
+    # may conflict with -d
+    psr.add_argument('-b', type=str, action='store', dest='begin_date',
+        default=None, help='Create report beginning on this date (format MM/DD/YYYY)')
+
+    psr.add_argument('-l', action='store_true',
+        help='Write the table to latex file')
+    psr.add_argument('-i', action='store_false',
+        help='Ignore header (i.e., only show data)')
+    psr.add_argument('--format', choices=['text', 'json', 'csv', 'parquet'], default='text',
+        help='Write the table as text (default), json (a list of records), csv \
+        or parquet (needs pyarrow or fastparquet) with unrounded numbers')
+    ext = psr.add_mutually_exclusive_group(required=False)
+    ext.add_argument('-u', type=str, action='store', dest='netid',
+        default='-1', help='Create report for a single user')
+    ext.add_argument('-r', action='store_true', help='Flag to sort by utilization \
+        instead of GPU-hours (cannot be used with -p or -s)')
+    ext.add_argument('-p', action='store_true', help='Flag to show usage grouped \
+        by department (only -t or -d allowed, e.g., checkgpu -d 28 -p)')
+    ext.add_argument('-s', action='store_true', help='Flag to show usage grouped \
+        by sponsor (only -t or -d allowed, e.g., checkgpu -d 7 -s)')
+    psr.add_argument('--clusters', type=str, action='store', default=None, metavar='LIST',
+        help='Create one report for the clusters in LIST (e.g., della,traverse \
+        or all) from the copies of their data that cron makes on tigergpu \
+        (run it there)')
+    psr.add_argument('--workers', type=int, action='store', default=1, metavar='N',
+        help='Read the window in N processes, each a part of the window \
+        (default: 1, 0 for one per core). Each cluster of --clusters is read \
+        in its own process.')
+    psr.add_argument('--profile', nargs='?', const='-', default=None, metavar='PATH',
+        help='Append the time, rows and memory of each stage as JSON lines to \
+        PATH (stderr if no PATH is given). Also set by $GPUS_PROFILE.')
+    psr.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS,
+                    help='Show this help message and exit.')
+    return psr
+
+class Files:
+    """The samples and user data of a report read from disk."""
+
+    def __init__(self, base: str=base, sshare_file: str=None):
+        self.base = base
+        self.datafile = f'{base}/utilization.json'
+        self.storedir = f'{base}/store'
+        self.userfile = f'{base}/cached_users.csv'
+        # the output of sshare saved for a cluster other than this one
+        self.sshare_file = sshare_file
+
+    def window(self, begin: float, end: float):
+        """Return the rollup rows (or None) and an iterable of chunks that
+           together hold the samples with begin <= timestamp <= end and the
+           earliest timestamp of the data. Returns None if there is no data."""
+        import utilization
+        import rollup
+        from itertools import chain
+        if utilization.has_store(self.storedir):
+            # whole days and hours of the window come from the rollups (if
+            # made) and only the rest is read from the store
+            planned = rollup.plan(self.storedir, begin, end)
+            rollups, ranges = planned if planned else (None, [(begin, end)])
+            chunks = (chunk for a, b in ranges for chunk in utilization.iter_store(self.storedir, a, b))
+            # followed by the samples that are not in the store yet
+            tail = utilization.iter_tail(self.datafile, utilization.store_max_timestamp(self.storedir), begin, end)
+            return rollups, chain(chunks, tail), utilization.store_min_timestamp(self.storedir)
+        if Path(self.datafile).is_file():
+            return None, utilization.iter_chunks(self.datafile, begin, end), \
+                   utilization.json_min_timestamp(self.datafile)
+        return None
+
+    def users(self) -> 'pd.DataFrame':
+        """Return the cached user data (NETID, POSITION, DEPT, SPONSOR)."""
+        import pandas as pd
+        return pd.read_csv(self.userfile, header=0) if Path(self.userfile) else pd.DataFrame()
+
+    def accounts(self, cluster: str) -> dict:
+        if self.sshare_file is not None:
+            try:
+                with open(self.sshare_file) as f:
+                    return slurm.parse_sshare(f.read())
+            except OSError:
+                return {}
+        return slurm.sshare_accounts(cluster)
+
+    def cluster(self, cluster: 'clusters.Cluster', host: str) -> 'Files':
+        """The files of a cluster of a --clusters report (see clusters.py)."""
+        datadir = cluster.datadir(self.base, host)
+        return Files(datadir, self.sshare_file if datadir == self.base else f'{datadir}/sshare.txt')
+
+def multi_depts(x):
+    return ','.join(set(x))
+
+def center(text, n):
+    spaces = ''.join([' '] * max(0, int(0.5 * (n - len(text)))))
+    return spaces + text
+
+def range_start(args, end_stamp: float, seconds_in_window: float, min_timestamp: int) -> tuple:
+    """Return the start of the range shown above the table and a warning
+       (or None) if the data begins after the start of the window."""
+    if (args.begin_date):
+        twelve_hours = 12 * 60 * 60
+        start_stamp = datetime.strptime(args.begin_date, '%m/%d/%Y').timestamp() + twelve_hours
+    else:
+        start_stamp = end_stamp - seconds_in_window
+    if (min_timestamp > start_stamp):
+        min_date = datetime.fromtimestamp(min_timestamp).strftime('%m/%d/%Y')
+        return min_timestamp, ("\n*** WARNING: Earliest data was recorded on {0}. Overriding start\n"
+                               "date of window. ***").format(min_date)
+    # round to nearest 10 minutes
+    start_stamp_hours = int(start_stamp / 3600)
+    minutes = round((start_stamp - 3600 * start_stamp_hours) / 60, -1)
+    return 3600 * start_stamp_hours + minutes * 60, None
+
+class ReportError(Exception):
+    """A report that cannot be made. checkgpu prints the message and exits
+       with status."""
+
+    def __init__(self, message: str, status: int=0):
+        super().__init__(message)
+        self.status = status
+
+# spacing in minutes between samples (set by how data is collected)
+sampling_freq = 10
+minutes_per_hour = 60.0
+seconds_per_minute = 60.0
+
+def read_window(data: Files, begin: float, end: float, thisuser: str, exclude: list):
+    """Return the Aggregate of the samples with begin <= timestamp <= end
+       except those of the hosts in exclude and the earliest timestamp of
+       the data or None if there is no data."""
+    import aggregate
+    # read in data (the store written by make_store.py if present) one
+    # chunk at a time and keep only running totals so that memory does
+    # not grow with the length of the window
+    with profiling.stage('window'):
+        window = data.window(begin, end)
+    if window is None:
+        return None
+    rollups, chunks, min_timestamp = window
+
+    # chunks hold only records in the window (idle nodes are counted)
+    totals = aggregate.Aggregate(thisuser if thisuser != '-1' else None)
+    if rollups is not None:
+        with profiling.stage('rollups', rollups.shape[0]):
+            if exclude: rollups = rollups[~rollups.host.isin(exclude)]
+            totals.add_totals(rollups)
+    # chunks are read (parsed or decoded) as they are needed
+    read, add = profiling.Stage('read', 0), profiling.Stage('aggregate', 0)
+    for chunk in read.iterate(chunks):
+        with add:
+            if exclude: chunk = chunk[~chunk.host.isin(exclude)]
+            totals.add(chunk[['timestamp', 'username', 'usage']])
+            add.add(chunk.shape[0])
+    read.done()
+    add.done()
+    return totals, min_timestamp
+
+def partitions(begin: float, end: float, num: int) -> list:
+    """Split the window begin <= timestamp <= end into at most num inclusive
+       ranges of about the same length. The ranges are whole days (whole
+       hours for a window of less than num days) so that the rollups of
+       the window are used as they are without splitting it."""
+    from rollup import seconds_per_day, seconds_per_hour
+    unit = seconds_per_day if end - begin >= num * seconds_per_day else seconds_per_hour
+    cuts = sorted({int(begin + k * (end - begin) / num) // unit * unit for k in range(1, num)})
+    cuts = [cut for cut in cuts if begin < cut <= end]
+    starts = [begin] + cuts
+    # timestamps are integers so a range ends a second before the next
+    return [(a, b - 1) for a, b in zip(starts, cuts)] + [(starts[-1], end)]
+
+def num_cores() -> int:
+    """The number of cores that checkgpu may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def read_partitioned(data: Files, begin: float, end: float, thisuser: str, exclude: list, workers: int):
+    """Return what read_window returns with the window read in parts by
+       workers processes. The totals of the parts are integers so merging
+       them gives exactly the totals of reading the window at once. There
+       are a few parts per worker since the samples are not spread evenly
+       over the window (e.g., a window that begins before the data)."""
+    from concurrent.futures import ProcessPoolExecutor
+    ranges = partitions(begin, end, 4 * workers)
+    with profiling.stage('partitions') as timed:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            parts = list(pool.map(read_window, *zip(*[(data, a, b, thisuser, exclude) for a, b in ranges])))
+        if any(part is None for part in parts):
+            return None
+        totals = parts[0][0]
+        for part, _ in parts[1:]:
+            totals.merge(part)
+        timed.rows = totals.entries
+        timed.fields.update({'workers': workers, 'partitions': len(ranges)})
+    return totals, parts[0][1]
+
+def read_cluster(name: str, data: Files, begin: float, end: float, thisuser: str, exclude: list) -> tuple:
+    """Read the data of one cluster of a --clusters report (in a worker
+       process). Returns what read_window returns, the cached user data,
+       the accounts and the seconds taken."""
+    start = perf_counter()
+    read = read_window(data, begin, end, thisuser, exclude)
+    if read is None:
+        return None, None, {}, perf_counter() - start
+    return read, data.users(), data.accounts(name), perf_counter() - start
+
+class Merged:
+    """The user data of the clusters of a --clusters report as Files gives
+       it for one cluster."""
+
+    def __init__(self, userdata: 'pd.DataFrame', accounts: dict):
+        self.userdata = userdata
+        self.accounts_of = accounts
+
+    def users(self) -> 'pd.DataFrame':
+        return self.userdata
+
+    def accounts(self, cluster: str) -> dict:
+        return self.accounts_of
+
+class Report:
+    """The numbers of a checkgpu report. table has one row per user (or per
+       department with -p and per sponsor with -s) and weeks the weekly
+       usage of the user of -u. The numbers are kept as numbers; checkgpu
+       formats them when it prints the report."""
+
+    def __init__(self, args):
+        """Work out the cluster and the window from the options. Raises
+           ReportError if there cannot be a report."""
+        self.args = args
+        self.host = gethostname().lower()
+        self.clusters = None
+        if args.clusters:
+            try:
+                self.clusters = clusters.select(args.clusters)
+            except ValueError as e:
+                raise ReportError(f'{e} Exiting ...', 1)
+            self.cluster = ' + '.join(cluster.name for cluster in self.clusters)
+            self.num_gpus = sum(cluster.num_gpus for cluster in self.clusters)
+        else:
+            cluster = clusters.lookup(self.host)
+            if cluster is None:
+                raise ReportError("Run checkgpu from della-gpu, tigercpu, tigergpu or traverse. Exiting ...")
+            self.cluster = cluster.name
+            self.num_gpus = cluster.num_gpus
+
+        ratio = sampling_freq / minutes_per_hour
+
+        hours = args.hours
+        if (args.days != days_default): hours = 24 * args.days
+
+        if (hours < ratio):
+            raise ReportError('The -t option must be greater than %.3f. Similar for -d. Exiting ...' % ratio)
+        if (args.workers < 0):
+            raise ReportError('The --workers option must be 0 or more. Exiting ...', 1)
+        self.gpu_hours_cutoff = args.gpu_hours_cutoff
+        self.util_cutoff = args.util_cutoff
+        self.thisuser = args.netid
+
+        if args.p or args.s:
+            self.thisuser = '-1'
+            self.gpu_hours_cutoff = 0
+            self.util_cutoff = 100
+
+        twelve_hours = 12 * minutes_per_hour * seconds_per_minute
+        if (args.end_date):
+            try:
+                self.end_stamp = datetime.strptime(args.end_date, '%m/%d/%Y').timestamp() + twelve_hours
+            except:
+                raise ReportError('Make sure date has format MM/DD/YYYY. Exiting ...', 1)
+        else:
+            self.end_stamp = int(time())
+
+        if (args.begin_date):
+            try:
+                begin_stamp = datetime.strptime(args.begin_date, '%m/%d/%Y').timestamp() + twelve_hours
+            except:
+                raise ReportError('Make sure date has format MM/DD/YYYY. Exiting ...', 1)
+
+        self.seconds_in_window = hours * minutes_per_hour * seconds_per_minute
+        self.window_begin = begin_stamp if args.begin_date else self.end_stamp - self.seconds_in_window
+
+        # remove cryoem (each cluster of --clusters removes its own hosts)
+        self.cryoem = cluster.excluded() if self.clusters is None else []
+
+    def make(self, data: Files) -> 'Report':
+        """Read the samples of the window and fill in the numbers."""
+        with profiling.stage('import'):
+            import pandas as pd
+
+        args, thisuser = self.args, self.thisuser
+        if self.clusters:
+            totals, min_timestamp, data = self.read_clusters(data)
+        else:
+            workers = num_cores() if args.workers == 0 else args.workers
+            if workers > 1:
+                read = read_partitioned(data, self.window_begin, self.end_stamp, thisuser, self.cryoem, workers)
+            else:
+                read = read_window(data, self.window_begin, self.end_stamp, thisuser, self.cryoem)
+            if read is None:
+                raise ReportError('Data file not found: %s. Are you on the right cluster?' % data.datafile)
+            totals, min_timestamp = read
+
+        num_entries = totals.entries
+        self.active = num_entries - totals.idle - totals.offline
+        self.pct_idle = 100.0 * totals.idle / num_entries if num_entries != 0 else -1
+        self.pct_offline = 100.0 * totals.offline / num_entries if num_entries != 0 else -1
+        self.weeks = None
+        if self.active == 0:
+            self.table = pd.DataFrame(columns=['USER', 'MEAN(%)', 'STD(%)', 'GPU-HOURS', 'PROPORTION(%)', 'POSITION', 'DEPT', 'SPONSOR'])
+            return self
+
+        if thisuser != '-1':
+            # group by week
+            wk = totals.weeks()
+            wk.columns = ["Week", "GPU-Hours", "Util.(%)"]
+            wk['GPU-Hours'] = wk['GPU-Hours'] / (minutes_per_hour / sampling_freq)
+            self.weeks = wk[["Week", "Util.(%)", "GPU-Hours"]]
+
+        self.start_stamp, self.warning = range_start(args, self.end_stamp, self.seconds_in_window, min_timestamp)
+        self.max_timestamp = totals.max_timestamp
+        dt_hours = (datetime.fromtimestamp(totals.max_timestamp) - datetime.fromtimestamp(self.start_stamp))/timedelta(hours=1)
+
+        # utilization mean and std for each username then filter
+        with profiling.stage('users') as timed:
+            self.utilization = totals.mean()
+            df = totals.users()
+            df.columns = ['username', 'gpu-hours', 'mean', 'std']
+            # from the integer number of samples so that the proportion is exact
+            df['PROPORTION(%)'] = 100 * df['gpu-hours'] / df['gpu-hours'].sum()
+            df['gpu-hours'] = df['gpu-hours'] / (minutes_per_hour / sampling_freq)
+            if thisuser != '-1':
+                df = df[df.username == thisuser]
+            df['std'] = df['std'].fillna(0)
+            df = df[(df['gpu-hours'] > self.gpu_hours_cutoff) & (df['mean'] <= self.util_cutoff)]
+
+            # check 1 ignores downtime and takes into account total number of gpus explicitly
+            self.check1 = df['gpu-hours'].sum() / (self.num_gpus * ((100 - self.pct_idle - self.pct_offline) / 100.0) * dt_hours)
+            # check 2 is just counting
+            self.check2 = df['gpu-hours'].sum() / (self.active / (minutes_per_hour / sampling_freq))
+            timed.rows = df.shape[0]
+
+        # read cached user data
+        with profiling.stage('cached_users.csv') as timed:
+            ldap = data.users()
+            timed.rows = ldap.shape[0]
+        # join the two dataframes
+        with profiling.stage('merge') as timed:
+            df = pd.merge(df, ldap, how='left', left_on=['username'], right_on=['NETID'])
+            timed.rows = df.shape[0]
+        # perform sorting
+        sortby, isascend = ('mean', True) if args.r else ('gpu-hours', False)
+        df = df.sort_values(by=sortby, ascending=isascend)
+        df = df[['username', 'mean', 'std', 'gpu-hours', 'PROPORTION(%)', 'POSITION', 'DEPT', 'SPONSOR']]
+        df.columns = ['USER', 'MEAN(%)', 'STD(%)', 'GPU-HOURS', 'PROPORTION(%)', 'POSITION', 'DEPT', 'SPONSOR']
+
+        # replace dept info using sshare (one call for all users)
+        with profiling.stage('sshare') as timed:
+            accounts = data.accounts(self.cluster)
+            timed.rows = len(accounts)
+        df['DEPT'] = df.USER.astype(str).map(accounts)
+
+        if args.p or args.s:
+            with profiling.stage('group') as timed:
+                # the hours of each user as printed are added up
+                df['GPU-HOURS'] = rounded(df['GPU-HOURS'])
+                if args.p:
+                    df['DEPT'] = df.DEPT.fillna('<UNKNOWN>')
+                    field = 'DEPT'
+                    df = df[[field, 'GPU-HOURS']].groupby(by=field).agg('sum').reset_index()
+                    df['PROPORTION(%)'] = 100 * df['GPU-HOURS'] / df['GPU-HOURS'].sum()
+                    df.columns = [field, 'GPU-HOURS', 'PROPORTION(%)']
+                    df = df.sort_values(by='GPU-HOURS', ascending=False)
+                elif args.s:
+                    df['SPONSOR'] = df.SPONSOR.fillna('<UNKNOWN>')
+                    df['DEPT'] = df.DEPT.fillna('<UNKNOWN>')
+                    field = 'SPONSOR'
+                    df = df[[field, 'DEPT', 'GPU-HOURS']].groupby(by=field).agg({"DEPT":multi_depts, "GPU-HOURS":'sum'}).reset_index()
+                    df['PROPORTION(%)'] = 100 * df['GPU-HOURS'] / df['GPU-HOURS'].sum()
+                    df.columns = [field, 'DEPT', 'GPU-HOURS', 'PROPORTION(%)']
+                    df = df.sort_values(by='GPU-HOURS', ascending=False)
+                timed.rows = df.shape[0]
+        self.table = df.reset_index(drop=True)
+        return self
+
+    def read_clusters(self, data: Files) -> tuple:
+        """Read the data of the clusters of --clusters at the same time (one
+           process per cluster) and return the merged totals, the earliest
+           timestamp of the data and the user data of all of the clusters.
+           The report takes about as long as the slowest cluster."""
+        import pandas as pd
+        import aggregate
+        from concurrent.futures import ProcessPoolExecutor
+        files = [data.cluster(cluster, self.host) for cluster in self.clusters]
+        jobs = [(cluster.name, f, self.window_begin, self.end_stamp, self.thisuser, cluster.excluded())
+                for cluster, f in zip(self.clusters, files)]
+        with profiling.stage('clusters') as timed:
+            if len(jobs) == 1:
+                results = [read_cluster(*jobs[0])]
+            else:
+                with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+                    results = list(pool.map(read_cluster, *zip(*jobs)))
+            totals = aggregate.Aggregate(self.thisuser if self.thisuser != '-1' else None)
+            for cluster, f, (read, _, _, _) in zip(self.clusters, files, results):
+                if read is None and cluster.matches(self.host.lower()):
+                    raise ReportError('Data file not found: %s. Are you on the right cluster?' % f.datafile)
+                if read is None:
+                    raise ReportError('No data of %s in %s. Run checkgpu --clusters on tigergpu where cron '
+                                      'copies the data of the other clusters.' % (cluster.name, f.base))
+                totals.merge(read[0])
+            timed.rows = totals.entries
+            timed.fields.update({cluster.key: round(seconds, 6) for cluster, (_, _, _, seconds) in zip(self.clusters, results)})
+        # a user with data on more than one cluster is taken from the first
+        accounts = {}
+        for _, _, more, _ in reversed(results):
+            accounts.update(more)
+        users = pd.concat([users for _, users, _, _ in results], ignore_index=True).drop_duplicates(subset='NETID')
+        return totals, min(read[1] for read, _, _, _ in results), Merged(users, accounts)
+
+    def records(self) -> list:
+        """Return the rows of the table as dicts with None for missing values."""
+        table = self.table.astype(object)
+        return table.where(table.notna(), None).to_dict('records')
+
+def make_report(argv: list=None, data: Files=None) -> Report:
+    """Return the report for the checkgpu command-line arguments (e.g.,
+       ['-d', '2', '-c', '10']). Raises ReportError if there cannot be a
+       report. The data is read from disk if data is None."""
+    return Report(parser().parse_args(argv)).make(Files() if data is None else data)
+
+# columns printed as integers followed by two spaces
+padded = ['MEAN(%)', 'STD(%)', 'GPU-HOURS', 'PROPORTION(%)']
+
+def rounded(values: 'pd.Series') -> 'pd.Series':
+    """Round to integers (half to even as round() does). A column with a
+       missing value stays float."""
+    values = values.round()
+    return values.astype('int64') if values.notna().all() else values
+
+def format_table(table: 'pd.DataFrame', grouped: bool=False) -> 'pd.DataFrame':
+    """Return the table with the numbers as checkgpu prints them using one
+       vectorized operation per column. The text table, the lines of -i
+       and the LaTeX table are all made from it. The GPU-HOURS of a grouped
+       table (-p or -s) are already integers and stay a number."""
+    df = table.copy()
+    for name in padded:
+        if name in df and not (grouped and name == 'GPU-HOURS'):
+            df[name] = rounded(df[name]).astype(str) + '  '
+    return df
+
+def pipe_lines(df: 'pd.DataFrame') -> list:
+    """Return the header and rows of a formatted table with the fields
+       separated by | (checkgpu -i). Missing values are -- and the spaces
+       in POSITION and SPONSOR are _."""
+    fields = []
+    for name in df.columns:
+        values = df[name].fillna('--').astype(str)
+        if name in ['POSITION', 'SPONSOR']:
+            values = values.str.replace(' ', '_')
+        fields.append(values.str.split().str.join('|'))
+    return ['|'.join(df.columns)] + reduce(lambda a, b: a + '|' + b, fields).tolist()
+
+def text_table(columns: list, rows: list) -> list:
+    """Return the lines of DataFrame.to_string(index=False) for columns of
+       strings."""
+    widths = [max([len(column)] + [len(row[j]) for row in rows]) for j, column in enumerate(columns)]
+    return [' '.join(value.rjust(width) for value, width in zip(line, widths)) for line in [columns] + rows]
+
+def user_lines(args, cluster: str, totals: 'aggregate.Aggregate', start_stamp: float, warning: str, person) -> list:
+    """Return the lines that print_text prints for the -u report of totals
+       without NumPy and pandas (see fastpath.py) or None if print_text has
+       to make them (a week without a utilization or a number wider than its
+       column). person(netid) returns the POSITION, DEPT and SPONSOR of the
+       user as shown ('' if missing) or None."""
+    thisuser = args.netid
+    if totals.active == 0:
+        return ['', 'No results found.', '']
+
+    # the weeks as report.weeks and rounded
+    weeks = []
+    for week, size, count, total in totals.week_totals():
+        if count == 0:
+            return None
+        date = (datetime(1970, 1, 1) + timedelta(days=week)).strftime('%Y-%m-%d')
+        weeks.append([date, str(round(total / count)), str(round(size / (minutes_per_hour / sampling_freq)))])
+    # numeric columns are one wider than their header
+    if not weeks or any(len(util) >= 9 or len(hours) >= 10 for _, util, hours in weeks):
+        return None
+    lines = [''] + [' ' + line if i == 0 else line for i, line in
+                    enumerate(' '.join([date.rjust(10), util.rjust(9), hours.rjust(10)])
+                              for date, util, hours in [['Week', 'Util.(%)', 'GPU-Hours']] + weeks)]
+    if warning: lines.extend(warning.split('\n'))
+    range_begin = datetime.fromtimestamp(start_stamp).strftime('%-I:%M %p %a (%-m/%-d)')
+    range_end = datetime.fromtimestamp(totals.max_timestamp).strftime('%-I:%M %p %a (%-m/%-d)')
+
+    # the row of the user as in Report.make and format_table
+    rows = []
+    if thisuser in totals.totals:
+        size, mean, std = totals.user(thisuser)
+        gpu_hours = size / (minutes_per_hour / sampling_freq)
+        if gpu_hours > args.gpu_hours_cutoff and mean <= args.util_cutoff:
+            data = person(thisuser)
+            if data is None:
+                return None
+            position, dept, sponsor = data
+            proportion = 100 * size / sum(running[0] for running in totals.totals.values())
+            rows.append([thisuser] + [str(round(x)) + '  ' for x in [mean, 0 if std != std else std, gpu_hours, proportion]] +
+                        [position, dept, sponsor])
+
+    columns = ['USER', 'MEAN(%)', 'STD(%)', 'GPU-HOURS', 'PROPORTION(%)', 'POSITION', 'DEPT', 'SPONSOR']
+    df_str = text_table(columns, rows) if rows else ['Empty DataFrame']
+    num_chars = len(df_str[0])
+    if args.i:
+        lines.append('')
+        lines.append(center(cluster + ' Utilization and Usage', num_chars))
+        lines.append(center(range_begin + ' - ' + range_end, num_chars))
+    if not rows:
+        lines.append('No results were found.')
+    elif args.i:
+        lines.extend(['', df_str[0], '=' * num_chars] + df_str[1:] + ['=' * num_chars])
+    else:
+        # as pipe_lines
+        for row in rows:
+            row[5] = row[5].replace(' ', '_') if row[5] else '--'
+            row[7] = row[7].replace(' ', '_') if row[7] else '--'
+            row[6] = row[6] if row[6] else '--'
+        lines.extend('|'.join(' '.join(line).split()) for line in [columns] + rows)
+    if args.i: lines.append('')
+    return lines
+
+def print_text(report: Report) -> None:
+    args, thisuser = report.args, report.thisuser
+    if report.active == 0:
+        print('\nNo results found.\n')
+        return
+
+    if report.weeks is not None:
+        wk = report.weeks.copy()
+        wk['GPU-Hours'] = rounded(wk['GPU-Hours'])
+        wk['Util.(%)'] = rounded(wk['Util.(%)'])
+        print("\n", wk.fillna('N/A').to_string(index=False))
+    if report.warning: print(report.warning)
+
+    range_begin = datetime.fromtimestamp(report.start_stamp).strftime('%-I:%M %p %a (%-m/%-d)')
+    range_end   = datetime.fromtimestamp(report.max_timestamp).strftime('%-I:%M %p %a (%-m/%-d)')
+    df = format_table(report.table, args.p or args.s)
+
+    # write latex
+    if args.l:
+        ef = df.copy()
+        ef = ef.reset_index(drop=True)
+        ef.index += 1
+        ef.fillna('').to_latex('table.tex', longtable=True)
+        del ef
+
+    # print results
+    df_str = df.fillna('').to_string(index=False).split('\n')
+    num_chars = len(df_str[0])
+
+    if args.i:
+        print('')
+        if (args.p or args.s):
+            print(center(report.cluster + ' Usage', num_chars))
+        else:
+            print(center(report.cluster + ' Utilization and Usage', num_chars))
+        print(center(range_begin + ' - ' + range_end, num_chars))
+        if (not args.p and not args.s and thisuser == '-1'):
+            print(center('Allocated GPUs/Idle GPUs/No Info = %.1f%%/%.1f%%/%.1f%%' % \
+                  (100 - report.pct_idle - report.pct_offline, report.pct_idle, report.pct_offline), num_chars))
+            print(center('Mean GPU utilization of allocated GPUs = %.1f%%' % report.utilization, num_chars))
+    if df.empty:
+        print('No results were found.')
+    else:
+        if args.i: print('')
+        if args.i: print(df_str[0])
+        if args.i: print(''.join(['='] * num_chars))
+        if args.i:
+            print('\n'.join(df_str[1:]))
+        else:
+            # header not printed
+            print('\n'.join(pipe_lines(df)))
+        if args.i: print(''.join(['='] * num_chars))
+    if args.i: print('')
+
+    if (abs(report.check1 - 1.0) > 0.04 or abs(report.check2 - 1.0) > 0.04) and thisuser == '-1' and \
+       report.gpu_hours_cutoff == 0 and report.util_cutoff == 100:
+        if args.i: print(f"  *** check1={report.check1:.2f}, check2={report.check2:.2f} ***")
+
+def write_table(report: Report, fmt: str) -> int:
+    """Write the table of the report to stdout as json (a list of records),
+       csv or parquet. Returns the exit status."""
+    import sys
+    if fmt == 'json':
+        print(report.table.to_json(orient='records'))
+    elif fmt == 'csv':
+        report.table.to_csv(sys.stdout, index=False)
+    elif fmt == 'parquet':
+        try:
+            report.table.to_parquet(sys.stdout.buffer, index=False)
+        except ImportError:
+            print('Parquet output needs pyarrow or fastparquet. Exiting ...', file=sys.stderr)
+            return 1
+    return 0
+
+def main(argv: list=None, data: Files=None) -> int:
+    """Print the report for the command-line arguments and return the exit
+       status. The data is read from disk if data is None."""
+    args = parser().parse_args(argv)
+    data = Files() if data is None else data
+    profiling.start('checkgpu', args.profile)
+    with profiling.stage('total'):
+        try:
+            report = Report(args)
+            # a single user over a few days is answered without NumPy and pandas
+            if report.thisuser != '-1' and not args.l and args.format == 'text' and type(data) is Files and \
+               not args.clusters and report.end_stamp - report.window_begin <= fastpath_seconds:
+                import fastpath
+                with profiling.stage('fastpath') as timed:
+                    lines = fastpath.report(args, report.cluster, report.window_begin, report.end_stamp,
+                                            report.seconds_in_window, report.cryoem, data)
+                    timed.fields['answered'] = lines is not None
+                if lines is not None:
+                    print('\n'.join(lines))
+                    return 0
+            report.make(data)
+        except ReportError as e:
+            print(e)
+            return e.status
+        with profiling.stage('output', report.table.shape[0]):
+            if args.format == 'text':
+                print_text(report)
+                return 0
+            return write_table(report, args.format)
@@ -0,0 +1,178 @@
+"""Hourly and daily rollups of the store for checkgpu.
+
+   A rollup row holds the totals of the samples of one host and user in one
+   hour (or day): the number of samples (size), the number with a
+   utilization (count), the sum and sum of squares of the utilization and
+   the last timestamp. Idle and offline samples are the rows of the users
+   root and OFFLINE. The totals are integers so that a report made from
+   rollups plus raw samples for the ends of its window gives exactly the
+   numbers of a report made from the raw samples alone.
+
+   The rollups are kept in the store under rollup/hourly (one file per
+   day) and rollup/daily (one file per month). An hour or day is only
+   rolled up once the store has a sample at or after its end since the
+   samples are appended in timestamp order. rollup/state.json holds the
+   time through which each rollup is complete.
+"""
+
+import os
+import json
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utilization import encode, decode, partition_days, partition_path, read_store, seconds_per_day
+
+seconds_per_hour = 3600
+totals = ['size', 'count', 'sum', 'sumsq']
+
+def rollup_path(storedir: str, kind: str, timestamp: int) -> str:
+    date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    name = date.strftime('%Y%m%d') if kind == 'hourly' else date.strftime('%Y%m')
+    return os.path.join(storedir, 'rollup', kind, name + '.npz')
+
+def month_start(timestamp: int) -> int:
+    date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return int(date.replace(day=1, hour=0, minute=0, second=0).timestamp())
+
+def next_month(timestamp: int) -> int:
+    return month_start(month_start(timestamp) + 32 * seconds_per_day)
+
+def summarize(df: pd.DataFrame, seconds: int) -> pd.DataFrame:
+    """Return the totals per bucket of the given length, host and user of
+       rows with timestamp, host, username and usage."""
+    usage = df.usage.fillna(0).astype(np.int64).values
+    parts = pd.DataFrame({'start': df.timestamp.values // seconds * seconds,
+                          'host': df.host.values,
+                          'username': df.username.values,
+                          'size': np.ones(df.shape[0], dtype=np.int64),
+                          'count': df.usage.notna().values.astype(np.int64),
+                          'sum': usage,
+                          'sumsq': usage * usage,
+                          'last': df.timestamp.values})
+    return combine(parts, seconds)
+
+def combine(rows: pd.DataFrame, seconds: int) -> pd.DataFrame:
+    """Merge rollup rows into buckets of the given length."""
+    rows = rows.assign(start=rows.start.values // seconds * seconds)
+    agg = dict({name: 'sum' for name in totals}, last='max')
+    return rows.groupby(['start', 'host', 'username'], observed=True, sort=True).agg(agg).reset_index()
+
+def write_rollup(path: str, rows: pd.DataFrame) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hosts, host = encode(np.asarray(rows.host.astype(str).values, dtype=str))
+    users, user = encode(np.asarray(rows.username.astype(str).values, dtype=str))
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f, start=rows.start.values.astype(np.int64), hosts=hosts, host=host,
+                            users=users, user=user, last=rows['last'].values.astype(np.int64),
+                            **{name: rows[name].values.astype(np.int64) for name in totals})
+    os.replace(path + '.tmp', path)
+
+def read_rollup(path: str, begin: int, stop: int) -> pd.DataFrame:
+    """Return the rows of a rollup file with begin <= start < stop."""
+    with np.load(path) as part:
+        keep = (part['start'] >= begin) & (part['start'] < stop)
+        rows = {name: part[name][keep] for name in ['start', 'last'] + totals}
+        rows['host'] = decode([part['hosts']], [part['host'][keep]])
+        rows['username'] = decode([part['users']], [part['user'][keep]])
+    return pd.DataFrame(rows)[['start', 'host', 'username'] + totals + ['last']]
+
+def state_path(storedir: str) -> str:
+    return os.path.join(storedir, 'rollup', 'state.json')
+
+def load_state(storedir: str) -> dict:
+    try:
+        with open(state_path(storedir)) as f:
+            state = json.load(f)
+        return {'hourly': int(state['hourly']), 'daily': int(state['daily'])}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {'hourly': 0, 'daily': 0}
+
+def update(storedir: str) -> dict:
+    """Roll up the hours and days completed since the last update. Returns
+       the new state."""
+    days = partition_days(storedir)
+    if not days:
+        return load_state(storedir)
+    with np.load(partition_path(storedir, days[-1])) as part:
+        last_timestamp = int(part['timestamp'].max())
+    state = load_state(storedir)
+    hourly = last_timestamp // seconds_per_hour * seconds_per_hour
+    daily = last_timestamp // seconds_per_day * seconds_per_day
+    # the day holding the end of the last update may have gained hours
+    first_day = max(days[0], state['hourly'] // seconds_per_day)
+    for day in days:
+        if day < first_day:
+            continue
+        begin = day * seconds_per_day
+        stop = min(begin + seconds_per_day, hourly)
+        if stop <= begin:
+            break
+        rows = summarize(read_store(storedir, begin, stop - 1), seconds_per_hour)
+        write_rollup(rollup_path(storedir, 'hourly', begin), rows)
+    # months with newly completed days are made from the hourly rollups
+    month = month_start(state['daily'] if state['daily'] else days[0] * seconds_per_day)
+    while month < daily and daily > state['daily']:
+        stop = min(next_month(month), daily)
+        frames = [read_rollup(rollup_path(storedir, 'hourly', day * seconds_per_day), month, stop)
+                  for day in days if month <= day * seconds_per_day < stop]
+        rows = combine(concat(frames), seconds_per_day)
+        write_rollup(rollup_path(storedir, 'daily', month), rows)
+        month = next_month(month)
+    state = {'hourly': max(hourly, state['hourly']), 'daily': max(daily, state['daily'])}
+    with open(state_path(storedir) + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_path(storedir) + '.tmp', state_path(storedir))
+    return state
+
+def concat(frames: list) -> pd.DataFrame:
+    """Concatenate rollup rows with the names as plain strings."""
+    frames = [f.astype({'host': str, 'username': str}) for f in frames if f.shape[0]]
+    if not frames:
+        return pd.DataFrame({name: np.array([], dtype=np.int64 if name not in ('host', 'username') else object)
+                             for name in ['start', 'host', 'username'] + totals + ['last']})
+    return pd.concat(frames, ignore_index=True)
+
+def aligned(begin: int, stop: int, seconds: int, complete: int) -> tuple:
+    """Return the largest [a, b) inside [begin, stop) made of whole buckets
+       that are rolled up or None."""
+    a = -(-begin // seconds) * seconds
+    b = min(stop // seconds * seconds, complete // seconds * seconds)
+    return (a, b) if a < b else None
+
+def plan(storedir: str, begin: float, end: float, read=read_rollup):
+    """Split the window begin <= timestamp <= end into daily rollups, hourly
+       rollups and raw samples. Returns the rollup rows and the list of
+       inclusive (begin, end) ranges that must be read from the store, or
+       None if there are no rollups. The rollup files are read with
+       read(path, begin, stop) (checkgpud.py keeps them in memory)."""
+    state = load_state(storedir)
+    if not state['hourly']:
+        return None
+    # integer timestamps in [lo, hi) are the ones in the window
+    lo, hi = math.ceil(begin), math.floor(end) + 1
+    frames = []
+    raw = []
+    days = aligned(lo, hi, seconds_per_day, state['daily'])
+    edges = [(lo, days[0]), (days[1], hi)] if days else [(lo, hi)]
+    if days:
+        month = month_start(days[0])
+        while month < days[1]:
+            path = rollup_path(storedir, 'daily', month)
+            if os.path.isfile(path):
+                frames.append(read(path, days[0], days[1]))
+            month = next_month(month)
+    for a, b in edges:
+        hours = aligned(a, b, seconds_per_hour, state['hourly'])
+        if hours is None:
+            if a < b: raw.append((a, b - 1))
+            continue
+        for day in range(hours[0] // seconds_per_day, (hours[1] - 1) // seconds_per_day + 1):
+            path = rollup_path(storedir, 'hourly', day * seconds_per_day)
+            if os.path.isfile(path):
+                frames.append(read(path, hours[0], hours[1]))
+        if a < hours[0]: raw.append((a, hours[0] - 1))
+        if hours[1] < b: raw.append((hours[1], b - 1))
+    return concat(frames), raw
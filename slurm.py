@@ -0,0 +1,56 @@
+"""Query Slurm once per invocation instead of once per user. The result of
+   sshare is cached on disk for a few minutes so that repeated runs of
+   checkgpu do not call Slurm at all."""
+
+import os
+import json
+import time
+import tempfile
+import subprocess
+
+sshare_ttl = 300
+
+def parse_sshare(text: str) -> dict:
+    """Make a user to account map from the output of
+       sshare -a -n -P -o Account,User. The first account listed for a user
+       is used (as with sshare -u <netid> | grep <netid>)."""
+    accounts = {}
+    for line in text.split('\n'):
+        if '|' not in line:
+            continue
+        account, user = [field.strip() for field in line.split('|')[:2]]
+        if account and user and user not in accounts:
+            accounts[user] = account.upper()
+    return accounts
+
+def sshare_cache_path(cluster: str) -> str:
+    cachedir = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    name = cluster.lower().replace(' ', '-')
+    return os.path.join(cachedir, 'checkgpu', f'sshare.{name}.json')
+
+def sshare_accounts(cluster: str, ttl: int=sshare_ttl) -> dict:
+    """Return the user to account map for all users on the cluster from a
+       single call to sshare. A cached map younger than ttl seconds is used
+       if present. An empty map is returned if sshare fails."""
+    path = sshare_cache_path(cluster)
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    cmd = ['sshare', '-a', '-n', '-P', '-o', 'Account,User']
+    try:
+        output = subprocess.run(cmd, capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    accounts = parse_sshare(output.stdout.decode('utf-8'))
+    if accounts:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), delete=False) as f:
+                json.dump(accounts, f)
+            os.replace(f.name, path)
+        except OSError:
+            pass
+    return accounts
@@ -0,0 +1,23 @@
+import json
+import random
+
+
+def write_samples(path, begin, end, hosts=("della-i14g1", "della-i14g2", "della-l01g1"), gpus=2,
+                  users=("root", "OFFLINE", "u1", "u2", "u3"), seed=None, na=0.0, offset=0, override=None):
+    """Append random utilization.json lines, every 10 minutes one per GPU.
+
+       The stream is seeded with seed (begin by default) so that a test
+       can rebuild the same samples. OFFLINE GPUs and a fraction na of
+       the others report N/A. override(host, index, user, util) may
+       replace the user and util of a line after they are drawn."""
+    random.seed(begin if seed is None else seed)
+    with open(path, "a") as f:
+        for ts in range(begin, end, 600):
+            for host in hosts:
+                for index in range(gpus):
+                    user = random.choice(users)
+                    util = "N/A" if user == "OFFLINE" or (na and random.random() < na) else str(random.randint(0, 100))
+                    if override:
+                        user, util = override(host, index, user, util)
+                    f.write(json.dumps({"timestamp": str(ts + offset), "host": host, "index": str(index),
+                                        "user": user, "util": util, "jobid": "1"}) + "\n")
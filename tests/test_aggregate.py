@@ -0,0 +1,77 @@
+import sys
+sys.path.append("../")
+import unittest
+import numpy as np
+import pandas as pd
+from aggregate import Aggregate
+
+
+def samples(num_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    users = np.array(['u1', 'u2', 'u3', 'root', 'OFFLINE'])
+    usage = pd.Series(rng.integers(0, 101, num_rows), dtype='Int16')
+    return pd.DataFrame({'timestamp': np.sort(rng.integers(1600000000, 1610000000, num_rows)),
+                         'username': pd.Categorical(users[rng.integers(0, 5, num_rows)]),
+                         'usage': usage.mask(rng.random(num_rows) < 0.05)})
+
+
+class TestAggregate(unittest.TestCase):
+    """Totals added one chunk at a time must give the numbers that pandas
+       gives over all of the rows at once."""
+
+    def test_users(self):
+        df = samples(20000)
+        totals = Aggregate('u2')
+        for chunk in np.array_split(np.arange(df.shape[0]), 7):
+            totals.add(df.iloc[chunk])
+        assert totals.entries == df.shape[0]
+        assert totals.idle == (df.username == 'root').sum()
+        assert totals.offline == (df.username == 'OFFLINE').sum()
+
+        active = df[(df.username != 'root') & (df.username != 'OFFLINE')]
+        assert totals.max_timestamp == active.timestamp.max()
+        assert totals.mean() == active.usage.mean()
+        expected = active.groupby('username', observed=True).usage.agg(['size', 'mean', 'std']).reset_index()
+        users = totals.users()
+        assert list(users.username) == list(expected.username.astype(str))
+        assert list(users['size']) == list(expected['size'])
+        assert np.allclose(users['mean'], expected['mean'].astype(float), rtol=0, atol=1e-12)
+        assert np.allclose(users['std'], expected['std'].astype(float), rtol=0, atol=1e-9)
+
+    def test_weeks(self):
+        df = samples(5000)
+        totals = Aggregate('u1')
+        for chunk in np.array_split(np.arange(df.shape[0]), 3):
+            totals.add(df.iloc[chunk])
+        mine = df[df.username == 'u1'].drop(columns=['username']).copy()
+        mine['timestamp'] = pd.to_datetime(mine.timestamp, unit='s')
+        expected = mine.groupby(pd.Grouper(key='timestamp', freq='W')).usage.agg(['size', 'mean']).reset_index()
+        weeks = totals.weeks()
+        assert list(weeks.timestamp) == list(expected.timestamp)
+        assert list(weeks['size']) == list(expected['size'])
+        assert np.allclose(weeks['mean'], expected['mean'].astype(float), rtol=0, atol=1e-12, equal_nan=True)
+
+    def test_merge(self):
+        df = samples(6000)
+        whole, merged = Aggregate('u3'), Aggregate('u3')
+        whole.add(df)
+        for chunk in np.array_split(np.arange(df.shape[0]), 4):
+            part = Aggregate('u3')
+            part.add(df.iloc[chunk])
+            merged.merge(part)
+        merged.merge(Aggregate('u3'))
+        assert (merged.entries, merged.idle, merged.offline) == (whole.entries, whole.idle, whole.offline)
+        assert merged.max_timestamp == whole.max_timestamp
+        assert merged.totals == whole.totals and merged.weekly == whole.weekly
+        assert merged.users().equals(whole.users())
+
+    def test_empty(self):
+        totals = Aggregate('u1')
+        totals.add(samples(100).iloc[:0])
+        assert totals.active == 0
+        assert totals.users().empty
+        assert totals.weeks().empty
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import sys
+sys.path.append("../")
+import io
+import os
+import time
+import unittest
+import tempfile
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+import report
+import checkgpud
+from checkgpud import query
+from checkgpud import Server
+from warm import Warm
+from utilization import convert
+from rollup import update
+from samples import write_samples
+
+
+class TestCheckgpud(unittest.TestCase):
+    """Reports from the daemon must be the same as reports made from the
+       files, also after new samples are appended."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        self.datafile = f"{self.base}/utilization.json"
+        self.socket = f"{self.base}/checkgpud.sock"
+        with open(f"{self.base}/cached_users.csv", "w") as f:
+            f.write("NETID,POSITION,DEPT,SPONSOR\nu1,Staff,CHEM,Sponsor 1\nu2,G1,CS,Sponsor 2\n")
+        # samples fall midway between the window edges of the reports
+        self.now = int(time.time()) // 600 * 600
+        write_samples(self.datafile, self.now - 40 * 86400 + 300, self.now - 3000)
+        report.gethostname = lambda: "della-gpu"
+        report.time = lambda: self.now
+        self.server = None
+
+    def tearDown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        self.tmp.cleanup()
+
+    def start(self):
+        self.server = Server(self.socket, Warm(self.base, tail_days=10))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def direct(self, argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = report.main(argv, report.Files(self.base))
+        return status, out.getvalue(), ""
+
+    def check(self, cases):
+        for argv in cases:
+            answer = query(argv, self.socket)
+            assert answer == self.direct(argv), argv
+            assert answer[1]
+
+    cases = [[], ["-d", "2", "-p"], ["-t", "5", "-u", "u1"], ["-d", "7", "-r"], ["-d", "2", "-i"],
+             ["-d", "20", "-s"], ["-e", time.strftime("%m/%d/%Y", time.localtime(time.time() - 25 * 86400)), "-d", "3"]]
+
+    def test_json(self):
+        self.start()
+        self.check(self.cases)
+        # the daemon reads the lines appended since the last report
+        write_samples(self.datafile, self.now - 2700, self.now)
+        self.check(self.cases)
+        assert self.server.data.tail.timestamp.max() == self.now - 300
+
+    def test_store(self):
+        convert(self.datafile, f"{self.base}/store")
+        update(f"{self.base}/store")
+        self.start()
+        self.check(self.cases)
+        # the lines that are not in the store yet are part of the reports
+        write_samples(self.datafile, self.now - 2700, self.now)
+        self.check(self.cases)
+        assert report.make_report(["-t", "0.5"], self.server.data).max_timestamp == self.now - 300
+        convert(self.datafile, f"{self.base}/store")
+        update(f"{self.base}/store")
+        self.check(self.cases)
+
+    def test_fallback(self):
+        # no daemon
+        assert query([], self.socket) is None
+        self.start()
+        # LaTeX files are written by checkgpu itself
+        assert query(["-l"], self.socket) is None
+        status, stdout, stderr = query(["-x"], self.socket)
+        assert status == 2 and stdout == "" and "unrecognized arguments: -x" in stderr
+        status, stdout, stderr = query(["-h"], self.socket)
+        assert status == 0 and stdout.startswith("usage: checkgpu")
+
+    def test_running(self):
+        assert not checkgpud.live(self.socket)
+        self.start()
+        assert checkgpud.live(self.socket)
+        # a second daemon (started by cron) exits at once without output
+        out = io.StringIO()
+        with redirect_stdout(out):
+            assert checkgpud.serve(self.socket, self.base) == 0
+        assert out.getvalue() == "" and query([], self.socket) == self.direct([])
+
+    def test_threads(self):
+        self.start()
+        # a client that connects and sends nothing does not hold up a report
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            idle.connect(self.socket)
+            start = time.monotonic()
+            assert query([], self.socket, timeout=5) == self.direct([])
+            assert time.monotonic() - start < checkgpud.Handler.timeout
+        # reports answered at the same time keep their output apart
+        expected = [self.direct(argv) for argv in self.cases]
+        with ThreadPoolExecutor(4) as pool:
+            answers = list(pool.map(lambda argv: query(argv, self.socket), 3 * self.cases))
+        assert answers == 3 * expected
+
+
+if __name__ == '__main__':
+    unittest.main()
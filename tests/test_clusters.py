@@ -0,0 +1,119 @@
+import sys
+sys.path.append("../")
+import io
+import os
+import math
+import time
+import unittest
+import tempfile
+from contextlib import redirect_stdout
+import clusters
+import report
+from test_report import write_samples
+
+
+hosts = {"della": ("della-i14g1", "della-i14g2", "della-l01g1"),
+         # u4 is on a cryoem node which is left out
+         "tiger": ("tiger-i19g1", "tiger-h19g1", "tiger-i20g1"),
+         "traverse": ("traverse-k01g1", "traverse-k01g2", "traverse-k02g1")}
+logins = {"della": "della-gpu", "tiger": "tigergpu", "traverse": "traverse"}
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_lookup(self):
+        assert clusters.lookup("della-gpu.princeton.edu").name == "Della GPU"
+        assert clusters.lookup("TIGERCPU").num_gpus == 320
+        assert clusters.lookup("adroit4") is None
+        assert "tiger-h19g1" in clusters.lookup("tigergpu").excluded()
+        assert clusters.lookup("traverse").excluded() == []
+
+    def test_select(self):
+        assert [c.key for c in clusters.select("traverse,della")] == ["della", "traverse"]
+        assert clusters.select("all") == clusters.registry
+        for keys in ["della,adroit", ""]:
+            with self.assertRaises(ValueError):
+                clusters.select(keys)
+
+
+class TestClusters(unittest.TestCase):
+    """A --clusters report holds the numbers of the reports of the clusters
+       added up per user."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        self.now = int(time.time()) // 600 * 600
+        for i, key in enumerate(["della", "tiger", "traverse"]):
+            datadir = self.datadir(key)
+            os.makedirs(datadir, exist_ok=True)
+            with open(f"{datadir}/cached_users.csv", "w") as f:
+                f.write(f"NETID,POSITION,DEPT,SPONSOR\nu1,Staff,CHEM,Sponsor 1\nu{2 + i},G1,CS,Sponsor {key}\n")
+            with open(f"{datadir}/sshare.txt", "w") as f:
+                f.write(f"{key}|u1\n{key}|u{2 + i}\n")
+            write_samples(f"{datadir}/utilization.json", self.now - (3 + i) * 86400 + 300, self.now - 3000, hosts[key])
+        report.gethostname = lambda: "della-gpu"
+        report.time = lambda: self.now
+
+    def tearDown(self):
+        report.gethostname = lambda: "della-gpu"
+        self.tmp.cleanup()
+
+    def datadir(self, key):
+        return self.base if key == "della" else f"{self.base}/clusters/{key}"
+
+    def files(self):
+        # sshare of della (this cluster) is not called
+        return report.Files(self.base, f"{self.base}/sshare.txt")
+
+    def single(self, key, argv):
+        report.gethostname = lambda: logins[key]
+        rep = report.make_report(argv, report.Files(self.datadir(key), f"{self.datadir(key)}/sshare.txt"))
+        report.gethostname = lambda: "della-gpu"
+        return {r["USER"]: r for r in rep.records()}
+
+    def test_combined(self):
+        argv = ["-d", "5"]
+        rep = report.make_report(argv + ["--clusters", "all"], self.files())
+        assert rep.cluster == "Della GPU + TigerGPU + Traverse" and rep.num_gpus == 544
+        singles = [self.single(key, argv) for key in ["della", "tiger", "traverse"]]
+        assert "u4" in singles[0] and "u4" not in singles[1]
+        combined = {r["USER"]: r for r in rep.records()}
+        assert set(combined) == set().union(*singles)
+        for user, record in combined.items():
+            parts = [single[user] for single in singles if user in single]
+            # every sample of these users has a utilization
+            n = [6 * part["GPU-HOURS"] for part in parts]
+            total = sum(part["MEAN(%)"] * k for part, k in zip(parts, n))
+            sumsq = sum((k - 1) * part["STD(%)"]**2 + k * part["MEAN(%)"]**2 for part, k in zip(parts, n))
+            assert math.isclose(record["GPU-HOURS"], sum(n) / 6, abs_tol=1e-9)
+            assert math.isclose(record["MEAN(%)"], total / sum(n), abs_tol=1e-9)
+            assert math.isclose(record["STD(%)"], math.sqrt((sumsq - total**2 / sum(n)) / (sum(n) - 1)), abs_tol=1e-6)
+        # the user data and account of the first cluster that knows a user
+        assert [combined[user]["DEPT"] for user in ["u1", "u2", "u3", "u4"]] == ["DELLA", "DELLA", "TIGER", "TRAVERSE"]
+        assert combined["u1"]["SPONSOR"] == "Sponsor 1" and combined["u3"]["SPONSOR"] == "Sponsor tiger"
+
+    def test_user(self):
+        rep = report.make_report(["-d", "5", "-u", "u1", "--clusters", "della,tiger"], self.files())
+        assert math.isclose(rep.weeks["GPU-Hours"].sum(), rep.table["GPU-HOURS"].iloc[0], abs_tol=1e-9)
+
+    def test_text(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = report.main(["-d", "2", "-p", "--clusters", "traverse,tiger"], self.files())
+        assert status == 0
+        assert "TigerGPU + Traverse Usage" in out.getvalue() and "TRAVERSE" in out.getvalue()
+
+    def test_errors(self):
+        with self.assertRaises(report.ReportError):
+            report.make_report(["--clusters", "adroit"], self.files())
+        os.remove(f"{self.datadir('traverse')}/utilization.json")
+        with self.assertRaisesRegex(report.ReportError, "No data of Traverse in .*/clusters/traverse"):
+            report.make_report(["--clusters", "all"], self.files())
+        os.remove(f"{self.datadir('della')}/utilization.json")
+        with self.assertRaisesRegex(report.ReportError, "Data file not found"):
+            report.make_report(["--clusters", "della"], self.files())
+
+
+if __name__ == '__main__':
+    unittest.main()
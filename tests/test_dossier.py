@@ -1,6 +1,12 @@
 import sys
 sys.path.append("../")
+import os
+import re
+import time
 import unittest
+import tempfile
+import subprocess
+from glob import glob
 from dossier import get_full_title
 from dossier import make_dict
 from dossier import get_position
@@ -8,6 +14,14 @@ from dossier import get_position_from_lines
 from dossier import clean_position
 from dossier import get_dept_code
 from dossier import ldap_plus
+from dossier import LdapBackend
+from dossier import RecordCache
+from dossier import LdapsearchBackend
+from dossier import parse_ldif
+from dossier import ldif_entries
+import dossier
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ldif")
 
 
 class TestMakeDict(unittest.TestCase):
@@ -35,6 +49,32 @@ class TestMakeDict(unittest.TestCase):
         assert d == dict(make_dict(lines))
 
 
+class TestParseLdif(unittest.TestCase):
+
+    def test_parse_ldif(self):
+        lines = ["# aturing, people", "dn: uid=aturing,o=Princeton University,c=US",
+                 "cn:: Q2F0aGVyaW5lIEouIFBl", " w7Fh", "title: Professor of Computer Science and Machi",
+                 " ne Learning", "ou: Chemistry", "ou: Computer Science", "",
+                 "# search result", "search: 2", "", "# numResponses: 2"]
+        records = list(parse_ldif(lines))
+        assert len(records) == 3
+        assert records[0]["cn"] == ["Catherine J. Peña"]
+        assert records[0]["title"] == ["Professor of Computer Science and Machine Learning"]
+        assert records[0]["ou"] == ["Chemistry", "Computer Science"]
+        assert records[2]["numResponses"] == ["2"]
+        record = make_dict(lines)
+        assert record["cn"] == ["Catherine J. Peña"]
+        assert record["numResponses"] == ["2"]
+
+    def test_ldif_entries(self):
+        with open(os.path.join(fixtures, "aturing.ldif")) as f:
+            one = f.read().split("\n")
+        with open(os.path.join(fixtures, "rcar.ldif")) as f:
+            two = f.read().split("\n")
+        entries = list(ldif_entries(one[:-6] + two[8:]))
+        assert [make_dict(lines)["uid"] for lines in entries] == [["aturing"], ["rcar"]]
+
+
 class TestGetPosition(unittest.TestCase):
 
     def test_get_position(self):
@@ -131,3 +171,163 @@ class TestLdapPlus(unittest.TestCase):
     def test_ldap_plus(self):
         assert ldap_plus(["cpena"])[1][0] == "Catherine J. Peña"
         assert ldap_plus(["cpena"])[1][2] == "Faculty"
+
+
+class FakeConnection:
+    """Stand-in for a python-ldap connection that answers OR filters of uid
+       or mail from the recorded LDIF files in tests/fixtures/ldif."""
+
+    def __init__(self):
+        self.entries = []
+        self.searches = 0
+        for path in sorted(glob(os.path.join(fixtures, "*.ldif"))):
+            with open(path) as f:
+                lines = [line for line in f.read().split("\n") if not line.startswith("#")]
+            record = make_dict(lines)
+            dn = record.pop("dn")[0]
+            for field in ("search", "result"):
+                record.pop(field)
+            attrs = {field: [value.encode("utf-8") for value in values] for field, values in record.items()}
+            self.entries.append((dn, attrs))
+
+    def search_s(self, base, scope, ldap_filter):
+        self.searches += 1
+        terms = re.findall(r"\((uid|mail)=([^()]+)\)", ldap_filter)
+        return [(dn, attrs) for dn, attrs in self.entries
+                if any(value.encode("utf-8") in attrs.get(field, []) for field, value in terms)]
+
+    def unbind_s(self):
+        pass
+
+
+class FailingBackend(LdapsearchBackend):
+    """Fails the batches whose filter holds one of the given values."""
+
+    def __init__(self, fail, size=2, batch=2):
+        super().__init__(size, batch)
+        self.fail = fail
+
+    def query(self, ldap_filter):
+        if any(value in ldap_filter for value in self.fail):
+            raise subprocess.TimeoutExpired("ldapsearch", self.timeout)
+        return super().query(ldap_filter)
+
+
+class TestLdapPlusFixtures(unittest.TestCase):
+    """Run ldap_plus against tests/bin/ldapsearch which answers from the
+       recorded LDIF files in tests/fixtures/ldif."""
+
+    def setUp(self):
+        self.path = os.environ["PATH"]
+        bindir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin")
+        os.environ["PATH"] = bindir + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        os.environ.pop("FAKE_LDAP_DELAY", None)
+        os.environ.pop("FAKE_LDAP_DOWN", None)
+
+    def test_ldap_plus_alias(self):
+        people = ldap_plus(["roberto", "bigfoot"])
+        assert ldap_plus(["roberto", "bigfoot"], backend=LdapsearchBackend(size=2, batch=2)) == people
+        person, missing = people[1:]
+        assert person[0] == "Roberto Car"
+        assert person[1] == "CHEM"
+        assert person[2] == "Faculty (emeritus)"
+        assert person[-2:] == ["roberto", "rcar"]
+        assert missing[-2:] == ["bigfoot", None]
+
+    def test_ldap_plus_order(self):
+        netids = ["gstudent", "bigfoot", "cpena", "turing", "pdoc", "aturing"]
+        serial = ldap_plus(netids)
+        assert [row[-2] for row in serial[1:]] == netids
+        assert serial[3][0] == "Catherine J. Peña"
+        assert serial[5][1] == "ASTRO"
+        assert ldap_plus(netids, workers=4) == serial
+
+    def test_ldap_plus_concurrent(self):
+        os.environ["FAKE_LDAP_DELAY"] = "0.2"
+        start = time.time()
+        people = ldap_plus(["aturing", "cpena", "rcar", "pdoc"], workers=4, latency=True)
+        assert time.time() - start < 0.6
+        assert people[0][-1] == "LATENCY"
+        assert all(row[-1] >= 0.2 for row in people[1:])
+
+    def test_ldap_plus_backend(self):
+        netids = ["gstudent", "bigfoot", "cpena", "turing", "pdoc", "aturing", "roberto"]
+        conns = []
+        def connect():
+            conns.append(FakeConnection())
+            return conns[-1]
+        backend = LdapBackend(size=2, batch=2, connect=connect)
+        assert ldap_plus(netids, backend=backend) == ldap_plus(netids)
+        # 4 batches of uids and 2 batches of aliases over at most 2 connections
+        assert len(conns) <= 2
+        assert sum(conn.searches for conn in conns) == 6
+        people = ldap_plus(netids, latency=True, backend=backend)
+        assert people[0][-1] == "LATENCY"
+
+    def test_ldap_plus_cache(self):
+        netids = ["aturing", "bigfoot", "turing"]
+        expected = ldap_plus(netids)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.json")
+            assert ldap_plus(netids, cache=RecordCache(path)) == expected
+            cache = RecordCache(path)
+            assert all(cache.fresh(netid) for netid in netids)
+            assert cache.get("bigfoot") is None
+            # no ldapsearch is needed for cached netids
+            os.environ["PATH"] = ""
+            assert ldap_plus(netids, cache=cache) == expected
+            # expired entries are looked up again
+            os.environ["PATH"] = self.path
+            cache = RecordCache(path, ttl=0, negative_ttl=3600)
+            assert not cache.fresh("aturing") and cache.fresh("bigfoot")
+            people = ldap_plus(netids, latency=True, cache=cache)
+            assert people[2][-1] == 0.0
+
+    def test_ldap_down(self):
+        netids = ["aturing", "bigfoot"]
+        os.environ["FAKE_LDAP_DOWN"] = "1"
+        assert dossier.ldapsearch_lines("aturing") == (None, True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.json")
+            people = ldap_plus(netids, cache=RecordCache(path))
+            assert all(row[0] is None for row in people[1:])
+            # an outage is not cached as not found
+            assert not RecordCache(path).entries
+            os.environ.pop("FAKE_LDAP_DOWN")
+            assert ldap_plus(netids, cache=RecordCache(path)) == ldap_plus(netids)
+            cache = RecordCache(path)
+            assert cache.get("bigfoot") is None and cache.get("aturing") is not None
+
+    def test_ldapsearch_backend(self):
+        netids = ["gstudent", "bigfoot", "cpena", "turing", "pdoc", "aturing", "roberto"]
+        assert ldap_plus(netids, backend=LdapsearchBackend(size=2, batch=3)) == ldap_plus(netids)
+
+    def test_ldapsearch_backend_down(self):
+        backend = LdapsearchBackend(size=2, batch=3)
+        os.environ["FAKE_LDAP_DOWN"] = "1"
+        found, failed, _ = backend.search_batch("uid", ["aturing", "bigfoot"])
+        assert found == {} and failed
+        fetched = dossier.backend_lines(["aturing", "bigfoot"], backend)
+        assert all(lines is None and failed for lines, failed, _ in fetched.values())
+
+    def test_backend_failure(self):
+        netids = ["gstudent", "bigfoot", "cpena", "turing", "pdoc", "aturing", "roberto"]
+        expected = ldap_plus(netids)
+        # the batch of cpena and the mail batch of roberto fail and are looked up one at a time
+        assert ldap_plus(netids, backend=FailingBackend(["cpena", "roberto@"])) == expected
+        fetched = dossier.backend_lines(netids, FailingBackend(["cpena"]))
+        assert fetched["cpena"][0] is not None and not fetched["cpena"][1]
+        # if the lookups fail again the netids are not cached as not found
+        ldapsearch_lines = dossier.ldapsearch_lines
+        dossier.ldapsearch_lines = lambda netid: (None, True)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = RecordCache(os.path.join(tmp, "cache.json"))
+                people = ldap_plus(netids, backend=FailingBackend(["uid="]), cache=cache)
+                assert all(row[-1] is None for row in people[1:])
+                assert not any(cache.fresh(netid) for netid in netids)
+        finally:
+            dossier.ldapsearch_lines = ldapsearch_lines
@@ -0,0 +1,111 @@
+import sys
+sys.path.append("../")
+import io
+import os
+import random
+import unittest
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+import numpy as np
+import report
+import fastpath
+from fastpath import read_npy
+from utilization import convert
+from utilization import update_index
+import samples
+
+
+def write_samples(path, begin, end):
+    # u4 holds its GPUs without using them
+    samples.write_samples(path, begin, end, hosts=["tiger-i19g1", "tiger-i19g2", "tiger-h19g1"], gpus=4,
+                          users=["root", "OFFLINE", "u1", "u2", "u3", "u4"], na=0.02,
+                          override=lambda host, index, user, util: (user, "N/A" if user == "u4" else util))
+
+
+class TestReadNpy(unittest.TestCase):
+
+    def test_read_npy(self):
+        for values in [np.arange(-5, 5, dtype=np.int8), np.arange(3, dtype=np.int16), np.array([], dtype=np.int64),
+                       np.array([1 << 40, -1], dtype=np.int64), np.array(["della-i14g1", "u1", ""])]:
+            f = io.BytesIO()
+            np.save(f, values)
+            assert list(read_npy(f.getvalue())) == values.tolist()
+
+
+class TestFastpath(unittest.TestCase):
+    """The fast path must print exactly what the full report prints."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        self.datafile = f"{self.base}/utilization.json"
+        with open(f"{self.base}/cached_users.csv", "w") as f:
+            f.write("NETID,POSITION,DEPT,SPONSOR\nu1,Staff,CHEM,Sponsor 1\nu2,N/A,CS,\nu3,G1,CS,Sponsor 3\nu3,G2,CS,Sponsor 3\n")
+        self.start = 1790000000
+        write_samples(self.datafile, self.start, self.start + 20 * 86400)
+        report.gethostname = lambda: "tigergpu"
+        self.calls = 0
+        fastpath_report = fastpath.report
+        def counted(*args):
+            lines = fastpath_report(*args)
+            self.calls += lines is not None
+            return lines
+        fastpath.report = counted
+        self.fastpath_report = fastpath_report
+
+    def tearDown(self):
+        fastpath.report = self.fastpath_report
+        report.fastpath_seconds = 7 * 86400
+        self.tmp.cleanup()
+
+    def output(self, argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            report.main(argv, report.Files(self.base))
+        return out.getvalue()
+
+    def compare(self):
+        random.seed(3)
+        for _ in range(40):
+            end = self.start + random.randint(0, 22 * 86400)
+            date = report.datetime.fromtimestamp(end).strftime("%m/%d/%Y")
+            argv = ["-e", date, "-t", str(random.choice([0.5, 5, 24, 100, 168])), "-u", random.choice(["u1", "u2", "u3", "u4", "u5"])]
+            argv += random.choice([[], ["-i"], ["-c", "40"], ["-g", "30"]])
+            report.fastpath_seconds = 7 * 86400
+            fast = self.output(argv)
+            report.fastpath_seconds = 0
+            assert fast == self.output(argv), argv
+
+    def test_json(self):
+        update_index(self.datafile, write=True)
+        # lines appended after the index was made are also read
+        write_samples(self.datafile, self.start + 20 * 86400, self.start + 21 * 86400)
+        self.compare()
+        assert self.calls > 15
+
+    def test_store(self):
+        convert(self.datafile, f"{self.base}/store")
+        # lines appended after the store was made are also read
+        update_index(self.datafile, write=True)
+        write_samples(self.datafile, self.start + 20 * 86400, self.start + 21 * 86400)
+        self.compare()
+        assert self.calls > 15
+
+    def test_no_index(self):
+        assert fastpath.report(report.parser().parse_args(["-u", "u1"]), "TigerGPU", self.start, self.start + 86400,
+                               86400, [], report.Files(self.base)) is None
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_light_imports(self):
+        # the parts of checkgpu that run before a report do not load NumPy or pandas
+        code = ("import sys; sys.path.insert(0, '..'); import checkgpud, report, fastpath; "
+                "print(sorted(set(['numpy', 'pandas']) & set(sys.modules)))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert output.stdout.decode().strip() == "[]"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import sys
+sys.path.append("../")
+import unittest
+from hostlist import expand
+from hostlist import compress
+from hostlist import split_hostlist
+
+
+class TestExpand(unittest.TestCase):
+
+    def test_expand(self):
+        assert expand("tiger-i23g13") == ["tiger-i23g13"]
+        assert expand("tiger-h26c2n[6-7]") == ["tiger-h26c2n6", "tiger-h26c2n7"]
+        assert expand("tiger-h26c1n7,tiger-i26c1n[18,22,24],tiger-i26c2n13") == \
+            ["tiger-h26c1n7", "tiger-i26c1n18", "tiger-i26c1n22", "tiger-i26c1n24", "tiger-i26c2n13"]
+        assert expand("tiger-h25c2n[1,4,6,10-12,15]") == \
+            ["tiger-h25c2n" + n for n in ["1", "4", "6", "10", "11", "12", "15"]]
+        assert expand("") == []
+
+    def test_zero_padding(self):
+        assert expand("della-r[08-10]") == ["della-r08", "della-r09", "della-r10"]
+        assert expand("della-r[8-10]") == ["della-r8", "della-r9", "della-r10"]
+        assert expand("della-r[098-101]") == ["della-r098", "della-r099", "della-r100", "della-r101"]
+
+    def test_multiple_groups(self):
+        hosts = expand("della-l0[1-3]g[1-4]")
+        assert hosts == [f"della-l0{i}g{j}" for i in range(1, 4) for j in range(1, 5)]
+        assert expand("tiger-i[19-23]g[1-16]") == \
+            ['tiger-i' + str(i) + 'g' + str(j+1) for i in range(19, 24) for j in range(16)]
+
+    def test_split_hostlist(self):
+        assert split_hostlist("a[1,3],b,c[2-4,7]") == ["a[1,3]", "b", "c[2-4,7]"]
+
+
+class TestCompress(unittest.TestCase):
+
+    def test_compress(self):
+        assert compress(["tiger-h26c2n6", "tiger-h26c2n7"]) == "tiger-h26c2n[6-7]"
+        assert compress(["della-r08", "della-r09", "della-r10"]) == "della-r[08-10]"
+        assert compress(["della-r9", "della-r10", "della-r8"]) == "della-r[8-10]"
+        assert compress(expand("della-l0[1-3]g[1-4]")) == "della-l[01-03]g[1-4]"
+        assert compress(["adroit-h11g1", "adroit-h11g1"]) == "adroit-h11g1"
+
+    def test_round_trip(self):
+        hostlists = ["tiger-h25c2n[1,4,6,10-12,15]", "tiger-i[19-23]g[1-16],della-r[08-10]n1,login",
+                     "della-l0[1-3]g[1-4],della-l04g[2,4]", "a1b1,a2b1,a3b2", "n[1-2,08-10]"]
+        for hostlist in hostlists:
+            hosts = expand(hostlist)
+            assert sorted(expand(compress(hosts))) == sorted(hosts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import sys
+sys.path.append("../")
+import io
+import os
+import json
+import time
+import unittest
+import tempfile
+from contextlib import redirect_stdout
+import profiling
+import report
+from test_report import write_samples
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        self.log = f"{self.base}/metrics.jsonl"
+        with open(f"{self.base}/cached_users.csv", "w") as f:
+            f.write("NETID,POSITION,DEPT,SPONSOR\nu1,Staff,CHEM,Sponsor 1\nu2,G1,CS,Sponsor 2\n")
+        self.now = int(time.time()) // 600 * 600
+        write_samples(f"{self.base}/utilization.json", self.now - 3 * 86400 + 300, self.now - 3000)
+        report.gethostname = lambda: "della-gpu"
+        report.time = lambda: self.now
+        os.environ.pop(profiling.env_var, None)
+
+    def tearDown(self):
+        os.environ.pop(profiling.env_var, None)
+        profiling.start("test")
+        self.tmp.cleanup()
+
+    def records(self):
+        with open(self.log) as f:
+            return [json.loads(line) for line in f]
+
+    def run_report(self, argv):
+        with redirect_stdout(io.StringIO()):
+            report.main(argv, report.Files(self.base))
+
+    def test_stage(self):
+        profiling.start("test", self.log)
+        read = profiling.Stage("read", 0)
+        for chunk in read.iterate([[1, 2], [3]]):
+            pass
+        read.done()
+        with profiling.stage("merge") as timed:
+            timed.rows = 7
+            timed.fields["backend"] = "x"
+        first, second = self.records()
+        assert (first["stage"], first["rows"]) == ("read", 3)
+        assert (second["stage"], second["rows"], second["backend"]) == ("merge", 7, "x")
+        assert first["run"] == second["run"] and first["program"] == "test"
+        assert first["seconds"] >= 0 and first["peak_mb"] > 0
+
+    def test_report(self):
+        self.run_report(["-d", "2", "-p", "--profile", self.log])
+        stages = [r["stage"] for r in self.records()]
+        assert stages == ["import", "window", "read", "aggregate", "users", "cached_users.csv", "merge",
+                          "sshare", "group", "output", "total"]
+        rows = {r["stage"]: r["rows"] for r in self.records()}
+        assert rows["read"] == rows["aggregate"] > 0
+        assert len({r["run"] for r in self.records()}) == 1
+
+    def test_off(self):
+        self.run_report(["-d", "2"])
+        assert not os.path.exists(self.log)
+        os.environ[profiling.env_var] = self.log
+        self.run_report(["-d", "2", "-u", "u1"])
+        assert self.records()[-1]["stage"] == "total"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import sys
+sys.path.append("../")
+import io
+import os
+import json
+import time
+import random
+import unittest
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+import pandas as pd
+import report
+import rollup
+import utilization
+import alert_checkgpu
+import samples
+
+
+def write_samples(path, begin, end, hosts=("della-i14g1", "della-i14g2", "della-l01g1")):
+    def override(host, index, user, util):
+        # u4 holds a GPU without using it and u5 uses one a little
+        if host != hosts[0] and index == 1:
+            return ("u4", "0") if host == hosts[1] else ("u5", str(random.randint(0, 9)))
+        return user, util
+    samples.write_samples(path, begin, end, hosts=hosts, override=override)
+
+
+class TestMakeReport(unittest.TestCase):
+    """The json and csv output hold the numbers of the text report."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        with open(f"{self.base}/cached_users.csv", "w") as f:
+            f.write("NETID,POSITION,DEPT,SPONSOR\nu1,Staff,CHEM,Sponsor 1\nu2,G1,CS,Sponsor 2\n")
+        self.now = int(time.time()) // 600 * 600
+        write_samples(f"{self.base}/utilization.json", self.now - 5 * 86400 + 300, self.now - 3000)
+        report.gethostname = lambda: "della-gpu"
+        report.time = lambda: self.now
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def output(self, argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = report.main(argv, report.Files(self.base))
+        return status, out.getvalue()
+
+    def test_formats(self):
+        for argv in [["-d", "2"], ["-d", "3", "-r"], ["-d", "2", "-c", "50"], ["-d", "2", "-u", "u1"], ["-d", "2", "-p"]]:
+            _, text = self.output(argv)
+            status, records = self.output(argv + ["--format", "json"])
+            assert status == 0
+            records = json.loads(records)
+            # the rows between the lines of = under the header
+            rows = [line.split() for line in text.split("=\n")[1].split("\n") if line and not line.startswith("=")]
+            assert len(rows) == len(records)
+            for row, record in zip(rows, records):
+                numbers = [record[name] for name in ["MEAN(%)", "STD(%)", "GPU-HOURS", "PROPORTION(%)"] if name in record]
+                assert row[0] == record["USER" if "USER" in record else "DEPT"]
+                assert [int(x) for x in row[1:1 + len(numbers)]] == [round(x) for x in numbers]
+            _, csv = self.output(argv + ["--format", "csv"])
+            df = pd.read_csv(io.StringIO(csv))
+            assert df.shape[0] == len(records)
+            assert df.iloc[:, 0].tolist() == [record[df.columns[0]] for record in records]
+
+    def test_records(self):
+        rep = report.make_report(["-d", "2"], report.Files(self.base))
+        records = rep.records()
+        assert [r["USER"] for r in records] == rep.table.USER.tolist()
+        assert records[0]["GPU-HOURS"] >= records[-1]["GPU-HOURS"]
+        assert all(r["POSITION"] is None for r in records if r["USER"] not in ["u1", "u2"])
+        assert abs(sum(r["PROPORTION(%)"] for r in records) - 100) < 1e-9
+
+    def test_no_results(self):
+        rep = report.make_report(["-e", "01/01/2020"], report.Files(self.base))
+        assert rep.records() == []
+        with self.assertRaises(report.ReportError):
+            report.make_report(["-t", "0.1"], report.Files(self.base))
+
+    def test_alert(self):
+        cases = alert_checkgpu.low_utilization(report.Files(self.base))
+        cases = sorted(cases)
+        assert [case[0] for case in cases] == ["u4", "u5"]
+        assert cases[0][1:3] == ["0", "0"]
+        assert all(int(case[1]) <= 10 and int(case[3]) >= 24 for case in cases)
+        os.remove(f"{self.base}/utilization.json")
+        err = io.StringIO()
+        with redirect_stderr(err):
+            assert alert_checkgpu.low_utilization(report.Files(self.base)) == []
+        assert "Data file not found" in err.getvalue()
+
+
+class TestPartitions(unittest.TestCase):
+    """A window read in parts by worker processes gives the same report."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        with open(f"{self.base}/cached_users.csv", "w") as f:
+            f.write("NETID,POSITION,DEPT,SPONSOR\nu1,Staff,CHEM,Sponsor 1\nu2,G1,CS,Sponsor 2\n")
+        self.now = int(time.time()) // 600 * 600
+        write_samples(f"{self.base}/utilization.json", self.now - 9 * 86400 + 300, self.now - 3000)
+        report.gethostname = lambda: "della-gpu"
+        report.time = lambda: self.now
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_partitions(self):
+        for begin, end, num in [(1000.5, 1000 + 30 * 86400, 8), (5000, 5000 + 5 * 3600, 4), (0, 100, 3)]:
+            ranges = report.partitions(begin, end, num)
+            assert 1 <= len(ranges) <= num and ranges[0][0] == begin and ranges[-1][1] == end
+            assert all(b + 1 == c for (_, b), (c, _) in zip(ranges, ranges[1:]))
+            assert all(a <= b for a, b in ranges)
+        assert all(b % 86400 == 86399 for _, b in report.partitions(0, 20 * 86400, 5)[:-1])
+
+    def test_workers(self):
+        for store in [False, True]:
+            if store:
+                utilization.convert(f"{self.base}/utilization.json", f"{self.base}/store")
+                rollup.update(f"{self.base}/store")
+            for argv in [["-d", "8"], ["-d", "8", "-s"], ["-d", "8", "-u", "u1"], ["-t", "5"]]:
+                one = report.make_report(argv, report.Files(self.base))
+                many = report.make_report(argv + ["--workers", "3"], report.Files(self.base))
+                assert many.table.equals(one.table)
+                assert (many.active, many.pct_idle, many.max_timestamp) == (one.active, one.pct_idle, one.max_timestamp)
+                if one.weeks is not None:
+                    assert many.weeks.equals(one.weeks)
+        with self.assertRaises(report.ReportError):
+            report.make_report(["--workers", "-1"], report.Files(self.base))
+
+    def test_store_tail(self):
+        utilization.convert(f"{self.base}/utilization.json", f"{self.base}/store")
+        rollup.update(f"{self.base}/store")
+        # appended by extract.py after make_store.py ran
+        write_samples(f"{self.base}/utilization.json", self.now - 2700, self.now)
+        json_only = report.Files(self.base)
+        json_only.storedir = f"{self.base}/no-store"
+        for argv in [["-t", "0.5"], ["-d", "8"], ["-d", "2", "-u", "u1"], ["-d", "8", "--workers", "3"]]:
+            store = report.make_report(argv, report.Files(self.base))
+            expected = report.make_report(argv, json_only)
+            assert store.max_timestamp == self.now - 300
+            assert store.table.equals(expected.table), argv
+            assert (store.active, store.pct_idle) == (expected.active, expected.pct_idle)
+
+
+class TestFormat(unittest.TestCase):
+    """The vectorized formatter prints what the row-by-row formatting did."""
+
+    def old_format(self, df):
+        df = df.copy()
+        for name in ["MEAN(%)", "STD(%)", "GPU-HOURS"]:
+            df[name] = df[name].apply(round).astype(str).apply(lambda x: x + '  ')
+        df["PROPORTION(%)"] = df["PROPORTION(%)"].apply(lambda x: str(round(x)) + '  ')
+        return df
+
+    def old_pipe(self, df):
+        df = df.copy()
+        df.POSITION = df.POSITION.fillna("--").astype('string').apply(lambda x: x.replace(" ", "_"))
+        df.SPONSOR = df.SPONSOR.fillna("--").astype('string').apply(lambda x: x.replace(" ", "_"))
+        return ['|'.join(line.split()) for line in df.fillna('--').to_string(index=False, header=True).split('\n')]
+
+    def test_format(self):
+        random.seed(5)
+        n = 500
+        # halves check that rounding is half to even as with round()
+        numbers = lambda: [random.choice([random.uniform(0, 100), random.randint(0, 100) + 0.5]) for _ in range(n)]
+        table = pd.DataFrame({"USER": [f"u{i}" for i in range(n)], "MEAN(%)": numbers(), "STD(%)": numbers(),
+                              "GPU-HOURS": [random.uniform(0, 5000) for _ in range(n)], "PROPORTION(%)": numbers(),
+                              "POSITION": [random.choice(["G1", "Postdoc", "Research Staff", None]) for _ in range(n)],
+                              "DEPT": [random.choice(["CS", None]) for _ in range(n)],
+                              "SPONSOR": [random.choice(["Sponsor 1", "A B C", None]) for _ in range(n)]})
+        new, old = report.format_table(table), self.old_format(table)
+        assert new.fillna('').to_string(index=False) == old.fillna('').to_string(index=False)
+        assert report.pipe_lines(new) == self.old_pipe(old)
+        assert report.format_table(table.iloc[:0]).fillna('').to_string(index=False).startswith("Empty DataFrame")
+
+    def test_rounded(self):
+        assert report.rounded(pd.Series([0.5, 1.5, 2.5, 62.4])).tolist() == [0, 2, 2, 62]
+        weeks = report.rounded(pd.Series([10.5, float("nan")]))
+        assert weeks.iloc[0] == 10 and weeks.isna().iloc[1]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import sys
+sys.path.append("../")
+import random
+import unittest
+import tempfile
+from utilization import convert
+from utilization import iter_store
+from rollup import update
+from rollup import plan
+from aggregate import Aggregate
+import samples
+
+
+def write_samples(path, begin, end, seed):
+    """Every 10 minutes (at 2 s past) one line per GPU of four hosts."""
+    samples.write_samples(path, begin, end, hosts=["della-i14g1", "della-i14g2", "della-l01g1", "della-l01g2"],
+                          seed=seed, na=0.05, offset=2)
+
+
+class TestRollup(unittest.TestCase):
+    """Reports made from the rollups plus raw samples must give exactly the
+       totals of reports made from the raw samples alone."""
+
+    def summary(self, totals):
+        return (totals.entries, totals.idle, totals.offline, totals.max_timestamp,
+                totals.users().to_dict("list"), totals.weeks().to_dict("list"))
+
+    def test_plan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            datafile = f"{tmp}/utilization.json"
+            storedir = f"{tmp}/store"
+            # 45 days starting on a Thursday added in three steps as by cron
+            start = 1675296000 - 3 * 86400 + 1800
+            for i, stop in enumerate([start + 20 * 86400 + 5000, start + 31 * 86400, start + 45 * 86400]):
+                write_samples(datafile, start if i == 0 else previous, stop, seed=i)
+                previous = stop
+                convert(datafile, storedir)
+                state = update(storedir)
+            assert state["daily"] == (start + 45 * 86400) // 86400 * 86400
+
+            random.seed(1)
+            windows = [(start - 86400, start + 50 * 86400), (start + 3600.5, start + 7200.25),
+                       (start + 86400 * 9.3, start + 86400 * 40.7)]
+            windows += [sorted(random.uniform(start, start + 46 * 86400) for _ in range(2)) for _ in range(20)]
+            for begin, end in windows:
+                raw = Aggregate("u2")
+                for chunk in iter_store(storedir, begin, end):
+                    raw.add(chunk[["timestamp", "username", "usage"]])
+                rows, ranges = plan(storedir, begin, end)
+                planned = Aggregate("u2")
+                planned.add_totals(rows)
+                for a, b in ranges:
+                    for chunk in iter_store(storedir, a, b):
+                        planned.add(chunk[["timestamp", "username", "usage"]])
+                assert self.summary(planned) == self.summary(raw)
+                # past the end of the samples the plan reads the (empty) store
+                if end - begin > 3 * 86400 and end < start + 44 * 86400:
+                    assert raw.entries > 0 and sum(b - a for a, b in ranges) < 2 * 86400
+
+    def test_no_rollups(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            assert plan(f"{tmp}/store", 0, 1) is None
+
+
+if __name__ == '__main__':
+    unittest.main()
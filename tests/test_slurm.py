@@ -0,0 +1,12 @@
+import sys
+sys.path.append("../")
+import unittest
+from slurm import parse_sshare
+
+
+class TestParseSshare(unittest.TestCase):
+
+    def test_parse_sshare(self):
+        text = "root||\n cs||\n  cs|aturing\n chem||\n  chem|aturing\n  chem|rcar\n"
+        assert parse_sshare(text) == {"aturing": "CS", "rcar": "CHEM"}
+        assert parse_sshare("") == {}
@@ -0,0 +1,229 @@
+import sys
+sys.path.append("../")
+import os
+import time
+import unittest
+import random
+import tempfile
+import numpy as np
+from glob import glob
+import tigergpu_usage
+from tigergpu_usage import collect_gpustat
+from tigergpu_usage import process_gpustat_output
+from tigergpu_usage import squeue_index
+from tigergpu_usage import squeue_gpus
+from tigergpu_usage import Snapshots
+from tigergpu_usage import cell_colors
+from tigergpu_usage import cell_texts
+from tigergpu_usage import text_colors
+from tigergpu_usage import text_paths
+from tigergpu_usage import process_snapshot
+from tigergpu_usage import process_all_files
+
+
+class TestCollectGpustat(unittest.TestCase):
+    """Collect from tests/bin/ssh which runs tests/bin/gpustat locally."""
+
+    def setUp(self):
+        self.path = os.environ["PATH"]
+        bindir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin")
+        os.environ["PATH"] = bindir + os.pathsep + self.path
+        self.outdir = tempfile.TemporaryDirectory()
+        self.nodes = ['tiger-i19g' + str(j + 1) for j in range(8)]
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        for name in ["FAKE_SSH_DELAY", "FAKE_SSH_DOWN", "FAKE_SSH_HANG"]:
+            os.environ.pop(name, None)
+        self.outdir.cleanup()
+
+    def test_collect(self):
+        status = collect_gpustat(self.nodes, "1600000000", self.outdir.name)
+        assert list(status) == self.nodes
+        assert all(reason is None for _, reason in status.values())
+        assert len(glob(f"{self.outdir.name}/*.1600000000.gpustat")) == len(self.nodes)
+
+        tigergpu_usage.snapshots = Snapshots(self.nodes)
+        tigergpu_usage.squeue_jobs = squeue_index(["aturing  R 4        1    gpu:4      tiger-i19g1"])
+        myfile = f"{self.outdir.name}/tiger-i19g1.1600000000.gpustat"
+        process_gpustat_output(myfile, 1600000000)
+        snapshots = tigergpu_usage.snapshots
+        assert snapshots.get("tiger-i19g1", 0, 1600000000) == (10, "aturing", True)
+        assert snapshots.get("tiger-i19g1", 2, 1600000000) == (30, "aturing", True)
+        # the idle gpu is filled in from squeue
+        assert snapshots.get("tiger-i19g1", 3, 1600000000) == (0, "aturing", False)
+        assert snapshots.get("tiger-i19g2", 0, 1600000000) is None
+
+    def test_parallel(self):
+        os.environ["FAKE_SSH_DELAY"] = "0.5"
+        start = time.time()
+        status = collect_gpustat(self.nodes, "1600000000", self.outdir.name, workers=8)
+        assert time.time() - start < 0.5 * len(self.nodes) / 2
+        assert all(seconds >= 0.5 for seconds, _ in status.values())
+
+    def test_failures(self):
+        os.environ["FAKE_SSH_DOWN"] = "tiger-i19g2"
+        os.environ["FAKE_SSH_HANG"] = "tiger-i19g3"
+        status = collect_gpustat(self.nodes, "1600000000", self.outdir.name, node_timeout=1)
+        assert status["tiger-i19g2"][1] == "exit 255: ssh: connect to host tiger-i19g2 port 22: Connection refused"
+        assert status["tiger-i19g3"][1] == "timeout"
+        assert status["tiger-i19g1"][1] is None
+        assert not os.path.exists(f"{self.outdir.name}/tiger-i19g3.1600000000.gpustat")
+
+    def test_deadline(self):
+        # one worker is held by the hung node until the deadline so the rest never start
+        os.environ["FAKE_SSH_HANG"] = "tiger-i19g1"
+        start = time.time()
+        status = collect_gpustat(self.nodes, "1600000000", self.outdir.name, workers=1, deadline=1)
+        assert time.time() - start < 3
+        assert status["tiger-i19g1"][1] == "timeout"
+        assert all(status[node] == (0.0, "deadline") for node in self.nodes[1:])
+
+    def test_missing_ssh(self):
+        status = collect_gpustat(self.nodes[:2], "1600000000", self.outdir.name, ssh="no-such-ssh")
+        assert all(reason.startswith("[Errno 2]") for _, reason in status.values())
+
+
+class TestSqueueIndex(unittest.TestCase):
+
+    def test_squeue_index(self):
+        squeue_lines = ["  sihuid  R      6 1    gpu:2      tiger-i23g13",
+                        "  smondal  R      8 2    gpu:1      tiger-i20g[15-16]",
+                        "  vcorbit  R      1 3    gpu:4      tiger-i21g1,tiger-i22g[2,4]",
+                        "  sihuid  R      1 1    gpu:1      tiger-i23g13",
+                        "  nogpu  R      1 1    N/A      tiger-i23g13"]
+        jobs = squeue_index(squeue_lines)
+        assert jobs == {"tiger-i23g13": [("sihuid", 2), ("sihuid", 1)],
+                        "tiger-i20g15": [("smondal", 1)],
+                        "tiger-i20g16": [("smondal", 1)],
+                        "tiger-i21g1": [("vcorbit", 4)],
+                        "tiger-i22g2": [("vcorbit", 4)],
+                        "tiger-i22g4": [("vcorbit", 4)]}
+        tigergpu_usage.squeue_jobs = jobs
+        assert squeue_gpus("tiger-i23g13") == ["sihuid"] * 3
+        assert squeue_gpus("tiger-i19g1") == []
+
+
+class TestWindow(unittest.TestCase):
+    """Runs that parse only the newest snapshot and keep the window on disk
+       must give the same snapshots as parsing every gpustat file."""
+
+    def setUp(self):
+        self.gpustat_dir = tempfile.TemporaryDirectory()
+        os.mkdir(f"{self.gpustat_dir.name}/dot_gpustat")
+        tigergpu_usage.gpustat_dir = self.gpustat_dir.name
+        tigergpu_usage.nodes = ['tiger-i19g' + str(j + 1) for j in range(6)]
+        tigergpu_usage.num_snapshots = 3
+        tigergpu_usage.debug = False
+        # tiger-i19g1 has four gpus allocated of which one has no process
+        tigergpu_usage.squeue_jobs = squeue_index(["aturing  R 4        1    gpu:4      tiger-i19g1"])
+
+    def tearDown(self):
+        self.gpustat_dir.cleanup()
+
+    def write_snapshot(self, timestamp):
+        for node in tigergpu_usage.nodes:
+            if random.random() < 0.2:
+                continue  # node did not answer
+            lines = [f"{node}  Mon Mar  2 12:22:58 2020\n"]
+            for i in range(4):
+                user = "" if random.random() < 0.3 and node != "tiger-i19g1" else " aturing(255M)"
+                if node == "tiger-i19g1" and i == 3: user = ""
+                usage = random.randint(0, 100) if user else 0
+                lines.append(f"[{i}] Tesla P100-PCIE-16GB | 41'C, {usage:3d} % |  1656 / 16280 MB |{user}\n")
+            with open(f"{self.gpustat_dir.name}/dot_gpustat/{node}.{timestamp}.gpustat", "w") as f:
+                f.writelines(lines)
+
+    def cells(self, snapshots):
+        return {(node, i, t): snapshots.get(node, i, t) for node in snapshots.nodes \
+                for i in range(4) for t in snapshots.times}
+
+    def test_incremental(self):
+        random.seed(42)
+        nodes = tigergpu_usage.nodes
+        window_file = f"{self.gpustat_dir.name}/window.npz"
+        for run in range(6):
+            timestamp = str(1600000000 + 600 * run)
+            self.write_snapshot(timestamp)
+            tigergpu_usage.snapshots = Snapshots.load(window_file, nodes)
+            if tigergpu_usage.snapshots:
+                process_snapshot(timestamp)
+            else:
+                process_all_files()
+            tigergpu_usage.snapshots.trim(3)
+            tigergpu_usage.snapshots.save(window_file)
+        incremental = tigergpu_usage.snapshots
+        assert incremental.times == [1600000000 + 600 * run for run in range(3, 6)]
+
+        tigergpu_usage.snapshots = Snapshots(nodes)
+        process_all_files()
+        tigergpu_usage.snapshots.trim(3)
+        assert self.cells(tigergpu_usage.snapshots) == self.cells(incremental)
+        assert self.cells(Snapshots.load(window_file, nodes)) == self.cells(incremental)
+        assert len(Snapshots.load(f"{self.gpustat_dir.name}/missing.npz", nodes)) == 0
+
+        # a node that was drained since the last run is dropped and a new one has no info
+        reloaded = Snapshots.load(window_file, nodes[1:] + ["tiger-i20g1"])
+        assert reloaded.nodes == nodes[1:] + ["tiger-i20g1"]
+        assert all(reloaded.get(node, i, t) == incremental.get(node, i, t) \
+                   for node in nodes[1:] for i in range(4) for t in incremental.times)
+        assert (reloaded.user[-1] == -1).all()
+
+
+def reference_color(username, usage, gpu_proc):
+    # the per-cell rules that cell_colors replaces
+    if (username == '' or username == 'NO INFO'):
+        return '#CCCCCC'
+    elif (usage == 0 and gpu_proc):
+        return "#000000"
+    elif (usage == 0 and not gpu_proc):
+        return "#000099"
+    elif (usage < 25):
+        return "#FF0000"
+    elif (usage < 50):
+        return "#FF8C00"
+    elif (usage < 75):
+        return "#F9E79F"
+    return "#FFFFFF"
+
+
+class TestCells(unittest.TestCase):
+
+    def test_cells(self):
+        snapshots = Snapshots(["tiger-i19g1", "tiger-i19g2"])
+        random.seed(7)
+        for t in [1600000000, 1600000600, 1600001200]:
+            for node in snapshots.nodes:
+                for i in range(4):
+                    if random.random() < 0.2: continue
+                    username = random.choice(["", "aturing", "rcar"])
+                    usage = random.choice([0, 1, 24, 25, 49, 50, 74, 75, 100])
+                    snapshots.set(node, i, t, usage, username, random.random() < 0.5)
+        util, user, proc = snapshots.util, snapshots.user, snapshots.proc
+        colors = cell_colors(util, user, proc)
+        texts = cell_texts(util, user, snapshots.names())
+        txtclrs = text_colors(util, user)
+        for (i, g, j), code in np.ndenumerate(user):
+            cell = snapshots.get(snapshots.nodes[i], g, snapshots.times[j])
+            usage, username, gpu_proc = cell if cell else (-1, 'NO INFO', False)
+            assert colors[i, g, j] == reference_color(username, usage, gpu_proc)
+            text = 'IDLE' if username == '' else username if username == 'NO INFO' else f"{username}:{usage}"
+            assert texts[i, g, j] == text
+            assert txtclrs[i, g, j] == ('w' if (usage < 25 or username == '') else 'k')
+
+    def test_text_paths(self):
+        from matplotlib.font_manager import FontProperties
+        paths = text_paths(["0", "IDLE", "aturing:100", "NO INFO"], FontProperties(size=10), (0.01, -0.02))
+        for text, path in paths.items():
+            box = path.get_extents()
+            # centered on the cell and scaled to data units
+            assert abs(box.x0 + box.x1) < 0.01, text
+            assert 0.01 * 5 * len(text) < box.width < 0.01 * 8 * len(text) and box.height < 0.02 * 12
+        # a digit is centered vertically (y grows downward) and capitals line up with it
+        box = paths["0"].get_extents()
+        assert abs(box.y0 + box.y1) < 0.01
+        assert {round(paths[text].get_extents().y0, 6) for text in ["0", "NO INFO"]} == {round(box.y0, 6)}
+
+
+if __name__ == '__main__':
+    unittest.main()
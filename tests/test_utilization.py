@@ -0,0 +1,145 @@
+import sys
+sys.path.append("../")
+import os
+import json
+import unittest
+import tempfile
+from utilization import line_timestamp
+from utilization import read_json
+from utilization import parse_chunk
+from utilization import parse_lines
+from utilization import iter_chunks
+from utilization import load_index
+from utilization import update_index
+from utilization import seek_offset
+from utilization import stop_offset
+from utilization import json_min_timestamp
+from utilization import convert
+from utilization import read_store
+from utilization import partition_days
+from utilization import store_min_timestamp
+
+
+def write_records(path, records):
+    with open(path, "a") as f:
+        for ts, host, index, user, util, jobid in records:
+            f.write(json.dumps({"timestamp": str(ts), "host": host, "index": str(index),
+                                "user": user, "util": util, "jobid": jobid}) + "\n")
+
+records = [(1675260602, "della-l01g1", 0, "root", "N/A", "0"),
+           (1675260602, "della-i14g15", 1, "OFFLINE", "N/A", "N/A"),
+           (1675260602, "della-i14g20", 0, "gdolsten", "40", "34792230"),
+           (1675310402, "della-i14g20", 0, "gdolsten", "55", "34792230"),
+           (1675310402, "della-i14g20", 1, "aturing", "0", "34792231"),
+           (1675353600, "della-i14g20", 0, "aturing", "100", "34792231")]
+
+
+class TestLineTimestamp(unittest.TestCase):
+
+    def test_line_timestamp(self):
+        line = b'{"timestamp": "1622344202", "host": "della-i14g20", "index": "1", "user": "root", "util": "0", "jobid": "0"}'
+        assert line_timestamp(line) == 1622344202
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.datafile = os.path.join(self.tmp.name, "utilization.json")
+        self.storedir = os.path.join(self.tmp.name, "store")
+        write_records(self.datafile, records)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_json(self):
+        df = read_json(self.datafile)
+        assert df.shape == (6, 6)
+        assert df.usage.isna().sum() == 2
+        assert list(df.jobid[:2]) == [0, -1]
+
+    def test_parse_chunk(self):
+        with open(self.datafile, "rb") as f:
+            chunk = f.read()
+        fast = parse_chunk(chunk)
+        slow = parse_lines(chunk)
+        assert fast.astype(str).equals(slow.astype(str))
+        assert fast.usage.isna().tolist() == [True, True, False, False, False, False]
+
+    def test_iter_chunks(self):
+        chunks = list(iter_chunks(self.datafile, chunk_bytes=150))
+        assert len(chunks) > 1
+        assert sum(df.shape[0] for df in chunks) == 6
+        chunks = list(iter_chunks(self.datafile, 1675310402, 1675310402, chunk_bytes=150))
+        assert sum(df.shape[0] for df in chunks) == 2
+
+    def test_read_json_window(self):
+        df = read_json(self.datafile, 1675310402, 1675310402)
+        assert df.username.astype(str).tolist() == ["gdolsten", "aturing"]
+        assert read_json(self.datafile, 1675353601).empty
+        assert json_min_timestamp(self.datafile) == 1675260602
+
+    def test_index(self):
+        entries = update_index(self.datafile, write=True)
+        assert entries[:, 0].tolist() == [1675260602, 1675310402, 1675353600]
+        assert load_index(self.datafile).tolist() == entries.tolist()
+        with open(self.datafile, "rb") as f:
+            f.seek(seek_offset(self.datafile, 1675310000))
+            assert b"55" in f.readline()
+            f.seek(stop_offset(self.datafile, 1675310402))
+            assert b"100" in f.readline()
+        assert stop_offset(self.datafile, 1675353600) is None
+        write_records(self.datafile, [(1675353600, "della-i14g20", 1, "root", "0", "0"),
+                                      (1675400000, "della-i14g20", 1, "root", "0", "0")])
+        entries = update_index(self.datafile, write=True)
+        assert entries[:, 0].tolist() == [1675260602, 1675310402, 1675353600, 1675400000]
+        assert load_index(self.datafile).tolist() == entries.tolist()
+
+    def test_damaged_index(self):
+        entries = update_index(self.datafile, write=True)
+        with open(self.datafile + ".idx", "ab") as f:
+            # two writers appending the same entries and half an entry left by a crash
+            entries.tofile(f)
+            f.write(entries[:1, :1].tobytes())
+        assert load_index(self.datafile).tolist() == entries.tolist()
+        assert update_index(self.datafile).tolist() == entries.tolist()
+        with open(self.datafile, "rb") as f:
+            f.seek(seek_offset(self.datafile, 1675310000))
+            assert b"55" in f.readline()
+        # the writer puts back a clean index
+        update_index(self.datafile, write=True)
+        assert os.path.getsize(self.datafile + ".idx") == entries.nbytes
+        # a truncated index is extended by scanning from its last entry
+        with open(self.datafile + ".idx", "r+b") as f:
+            f.truncate(entries.nbytes - 24)
+        assert load_index(self.datafile).tolist() == entries[:1].tolist()
+        assert update_index(self.datafile).tolist() == entries.tolist()
+        assert update_index(self.datafile, write=True).tolist() == load_index(self.datafile).tolist() == entries.tolist()
+
+    def test_readers_do_not_write(self):
+        update_index(self.datafile)
+        assert not os.path.exists(self.datafile + ".idx")
+
+    def test_round_trip(self):
+        assert convert(self.datafile, self.storedir) == 6
+        assert len(partition_days(self.storedir)) == 2
+        assert store_min_timestamp(self.storedir) == 1675260602
+        expected = read_json(self.datafile)
+        df = read_store(self.storedir, 0, 2e9)
+        assert df.timestamp.tolist() == expected.timestamp.tolist()
+        assert df.username.astype(str).tolist() == expected.username.astype(str).tolist()
+        assert df.host.astype(str).tolist() == expected.host.astype(str).tolist()
+        assert df.usage.fillna(-1).tolist() == expected.usage.fillna(-1).tolist()
+
+    def test_window(self):
+        convert(self.datafile, self.storedir)
+        df = read_store(self.storedir, 1675310402, 1675310402)
+        assert df.username.astype(str).tolist() == ["gdolsten", "aturing"]
+        assert read_store(self.storedir, 0, 1000).empty
+
+    def test_incremental(self):
+        convert(self.datafile, self.storedir)
+        write_records(self.datafile, [(1675353600, "della-i14g20", 1, "root", "0", "0")])
+        # only the last day is rewritten
+        assert convert(self.datafile, self.storedir) == 4
+        assert read_store(self.storedir, 0, 2e9).shape[0] == 7
@@ -3,11 +3,20 @@
    are used to make a visualization of GPU usage versus time.
    Files older than 1 hour are deleted."""
 
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from glob import glob
-from time import time
+from bisect import bisect
+from time import time, monotonic
 import re
+import sys
+import numpy as np
+import hostlist
+import profiling
+
+gpustat_dir = "/scratch/gpfs/jdh4/gpustat"
 
 #scontrol show hostname tiger-i14g[1-20]
 #nodeset -e tiger-i14g[1-20]
@@ -22,37 +31,24 @@ import re
 #smondal  R 1        8 1    gpu:1      tiger-i20g16
 #vcorbit  R 1        1 1    gpu:1      tiger-i23g15
 
-def extract_from_range(hosts):
-  # handles cases with ranges such as tiger-h26c2n[6-7]
-  base = hosts[:hosts.index("[")]
-  other = hosts[hosts.index("[") + 1:-1]
-  individs = []
-  for num in other.split(","):
-    if "-" in num:
-      start, end = map(int, num.split("-"))
-      individs.extend(map(lambda x: base + str(x), list(range(start, end + 1))))
-    else:
-      individs.append(base + num)
-  return individs
-
-def extract_nodes(hosts):
-  single_hosts = []
-  for host in hosts:
-    if host.startswith("iger"): host = "t" + host
-    if "[" in host:
-      single_hosts.extend(extract_from_range(host))
-    else:
-      single_hosts.append(host)
-  return single_hosts
+def squeue_index(squeue_lines):
+  """Parse the squeue lines once into node -> [(user, gpu_count)] where
+     jobs on several nodes are listed under each of their nodes."""
+  jobs = {}
+  for line in squeue_lines:
+    user, state, cores, num_nodes, gres, many_hosts = line.split()
+    try:
+      num_gpus = int(gres.split(":")[1])
+    except (IndexError, ValueError):
+      continue
+    for host in hostlist.expand(many_hosts):
+      jobs.setdefault(host, []).append((user, num_gpus))
+  return jobs
 
 def squeue_gpus(node):
   names = []
-  for line in singles:
-    user, state, cores, num_nodes, gres, host = line.split()
-    if node == host:
-      num_gpus = int(gres.split(":")[1])
-      for _ in range(num_gpus):
-        names.append(user)
+  for user, num_gpus in squeue_jobs.get(node, []):
+    names.extend([user] * num_gpus)
   return names
 
 #tiger-i19g1  Mon Mar  2 12:22:58 2020
@@ -94,7 +90,7 @@ def process_gpustat_output(myfile, max_stamp):
       percent_usage = int(fields[5])
       username, memory = ('', "42G") if len(fields) < 14 else extract_username(fields[13])
       gpu_proc = False if memory == "0J" else True
-      usage_user[(node, gpu_index, timestamp)] = (percent_usage, username, gpu_proc)
+      snapshots.set(node, gpu_index, timestamp, percent_usage, username, gpu_proc)
       if timestamp == max_stamp:
         ggpus[gpu_index] = username
         if username != '': ggpus_count += 1
@@ -113,7 +109,7 @@ def process_gpustat_output(myfile, max_stamp):
         ptr = 0
         for i in range(4):
           if ggpus[i] == '' and ptr < len(sgpus):
-            usage_user[(node, i, timestamp)] = (0, sgpus[ptr], False)
+            snapshots.set(node, i, timestamp, 0, sgpus[ptr], False)
             ggpus[i] = sgpus[ptr]
             ptr += 1
             changed_indices.append(i)
@@ -130,40 +126,186 @@ def process_gpustat_output(myfile, max_stamp):
     # failure here will cleanly result in "NO INFO" downstream
     pass
 
+def collect_gpustat(nodes, timestamp, outdir=None, ssh="ssh", workers=16, node_timeout=5, deadline=15):
+  """Run gpustat on the nodes over ssh with up to workers connections at a
+     time and write the output of each node to outdir. No new connection is
+     started after deadline seconds and no connection runs past it. Returns
+     node -> (seconds, reason) where reason is None on success."""
+  outdir = outdir if outdir else f"{gpustat_dir}/dot_gpustat"
+  stop = monotonic() + deadline
+
+  def run(node):
+    start = monotonic()
+    remaining = stop - start
+    if remaining <= 0:
+      return (0.0, "deadline")
+    gpustat_file = f"{outdir}/{node}.{timestamp}.gpustat"
+    cmd = [ssh, "-o", "ConnectTimeout=4", node, f"gpustat > {gpustat_file}"]
+    try:
+      output = subprocess.run(cmd, capture_output=True, timeout=min(node_timeout, remaining))
+    except subprocess.TimeoutExpired:
+      return (monotonic() - start, "timeout")
+    except OSError as e:
+      return (monotonic() - start, str(e))
+    if output.returncode != 0:
+      err = output.stderr.decode("utf-8", "replace").strip().split("\n")[-1]
+      return (monotonic() - start, f"exit {output.returncode}: {err}")
+    return (monotonic() - start, None)
+
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    return dict(zip(nodes, pool.map(run, nodes)))
+
 def process_all_files():
-  gpufiles = glob('/scratch/gpfs/jdh4/gpustat/dot_gpustat/*.gpustat')
+  gpufiles = glob(f'{gpustat_dir}/dot_gpustat/*.gpustat')
   max_stamp = max(map(lambda x: int(x.split(".")[1]), gpufiles))
   for gpufile in gpufiles:
     if debug: print(gpufile)
     process_gpustat_output(gpufile, max_stamp)
 
-def cell_color(username, usage, gpu_proc):
-  # set cell color
-  if (username == '' or username == 'NO INFO'):
-     fcolor = '#CCCCCC'
-  elif (usage == 0 and gpu_proc):
-     fcolor = "#000000"
-  elif (usage == 0 and not gpu_proc):
-     fcolor = "#000099"
-  elif (usage < 25):
-     fcolor = "#FF0000"
-  elif (usage < 50):
-     fcolor = "#FF8C00"
-  elif (usage < 75):
-     fcolor = "#F9E79F"
-  else:
-     fcolor = "#FFFFFF"
-  return fcolor
-
-def celltext(node, j, username, usage):
+def process_snapshot(timestamp):
+  """Parse only the gpustat files of the newest snapshot."""
+  for gpufile in glob(f'{gpustat_dir}/dot_gpustat/*.{timestamp}.gpustat'):
+    process_gpustat_output(gpufile, int(timestamp))
+
+class Snapshots:
+  """Utilization, user and gpu process flag of every gpu (node x gpu index)
+     at each timestamp held in dense arrays. Users are stored as codes
+     into the users table where code 0 is an idle gpu ('') and -1 means
+     that there is no info."""
+
+  def __init__(self, nodes, gpus_per_node=4):
+    self.nodes = list(nodes)
+    self.rows = {node: i for i, node in enumerate(self.nodes)}
+    self.gpus_per_node = gpus_per_node
+    self.times = []
+    self.columns = {}
+    shape = (len(self.nodes), gpus_per_node, 0)
+    self.util = np.full(shape, -1, dtype=np.int16)
+    self.user = np.full(shape, -1, dtype=np.int32)
+    self.proc = np.zeros(shape, dtype=bool)
+    self.users = ['']
+    self.codes = {'': 0}
+
+  def __len__(self):
+    # number of cells with info
+    return int((self.user >= 0).sum())
+
+  def intern(self, username):
+    code = self.codes.get(username)
+    if code is None:
+      code = self.codes[username] = len(self.users)
+      self.users.append(username)
+    return code
+
+  def column(self, t):
+    """Return the column of timestamp t which is added if new."""
+    j = self.columns.get(t)
+    if j is None:
+      j = bisect(self.times, t)
+      self.times.insert(j, t)
+      self.columns = {t: j for j, t in enumerate(self.times)}
+      self.util = np.insert(self.util, j, -1, axis=2)
+      self.user = np.insert(self.user, j, -1, axis=2)
+      self.proc = np.insert(self.proc, j, False, axis=2)
+    return j
+
+  def set(self, node, gpu_index, t, usage, username, gpu_proc):
+    i = self.rows.get(node)
+    if i is None: return
+    j = self.column(t)
+    self.util[i, gpu_index, j] = usage
+    self.user[i, gpu_index, j] = self.intern(username)
+    self.proc[i, gpu_index, j] = gpu_proc
+
+  def get(self, node, gpu_index, t):
+    """Return (usage, username, gpu_proc) or None if there is no info."""
+    i, j = self.rows.get(node), self.columns.get(t)
+    if i is None or j is None or self.user[i, gpu_index, j] < 0: return None
+    return (int(self.util[i, gpu_index, j]), self.users[self.user[i, gpu_index, j]], \
+            bool(self.proc[i, gpu_index, j]))
+
+  def names(self):
+    # indexing with code -1 gives the last entry
+    return np.array(self.users + ['NO INFO'], dtype=object)
+
+  def trim(self, num_snapshots):
+    """Keep the newest num_snapshots timestamps and the users found there."""
+    self.times = self.times[-num_snapshots:]
+    self.columns = {t: j for j, t in enumerate(self.times)}
+    self.util = self.util[:, :, -len(self.times):] if self.times else self.util[:, :, :0]
+    self.user = self.user[:, :, -len(self.times):] if self.times else self.user[:, :, :0]
+    self.proc = self.proc[:, :, -len(self.times):] if self.times else self.proc[:, :, :0]
+    used = np.union1d([0], self.user[self.user > 0])
+    remap = np.full(len(self.users) + 1, -1, dtype=np.int32)
+    remap[used] = np.arange(len(used))
+    self.user = remap[self.user]
+    self.users = [self.users[code] for code in used]
+    self.codes = {username: code for code, username in enumerate(self.users)}
+
+  def save(self, path):
+    with open(path + ".tmp", "wb") as f:
+      np.savez(f, nodes=np.array(self.nodes), times=np.array(self.times, dtype=np.int64), \
+               util=self.util, user=self.user, proc=self.proc, users=np.array(self.users))
+    os.replace(path + ".tmp", path)
+
+  @classmethod
+  def load(cls, path, nodes, gpus_per_node=4):
+    """Read the snapshots saved by a previous run keeping only the rows of
+       nodes. Empty snapshots are returned if the file is missing or bad."""
+    snapshots = cls(nodes, gpus_per_node)
+    try:
+      with np.load(path) as saved:
+        saved_nodes = list(saved["nodes"])
+        times = [int(t) for t in saved["times"]]
+        util, user, proc = saved["util"], saved["user"], saved["proc"]
+        users = [str(username) for username in saved["users"]]
+    except (OSError, ValueError, KeyError):
+      return snapshots
+    if util.shape != (len(saved_nodes), gpus_per_node, len(times)) or not users or users[0] != '':
+      return snapshots
+    shape = (len(snapshots.nodes), gpus_per_node, len(times))
+    snapshots.util = np.full(shape, -1, dtype=np.int16)
+    snapshots.user = np.full(shape, -1, dtype=np.int32)
+    snapshots.proc = np.zeros(shape, dtype=bool)
+    rows = {node: i for i, node in enumerate(saved_nodes)}
+    new = [i for i, node in enumerate(snapshots.nodes) if node in rows]
+    old = [rows[snapshots.nodes[i]] for i in new]
+    snapshots.util[new] = util[old]
+    snapshots.user[new] = user[old]
+    snapshots.proc[new] = proc[old]
+    snapshots.times = times
+    snapshots.columns = {t: j for j, t in enumerate(times)}
+    snapshots.users = users
+    snapshots.codes = {username: code for code, username in enumerate(users)}
+    return snapshots
+
+def cell_colors(util, user, proc):
+  # set cell colors (user code 0 is idle and -1 is no info)
+  return np.select([user <= 0, (util == 0) & proc, util == 0, util < 25, util < 50, util < 75], \
+                   ['#CCCCCC', '#000000', '#000099', '#FF0000', '#FF8C00', '#F9E79F'], '#FFFFFF')
+
+def cell_texts(util, user, names):
   # text for each cell
-  if (username == ''):
-    ctext = 'IDLE'
-  elif (username == 'NO INFO'):
-    ctext = username
-  else:
-    ctext = username + ":" + str(usage)
-  return ctext
+  text = names[user] + ':' + util.astype(str).astype(object)
+  return np.where(user > 0, text, np.where(user == 0, 'IDLE', names[user]))
+
+def text_colors(util, user):
+  return np.where((util < 25) | (user == 0), 'w', 'k')
+
+def text_paths(texts, font, scale):
+  """Return the outline of each text centered on the origin as
+     ax.text(..., ha='center', va='center') would draw it in units of
+     scale, i.e., (x, y) data units per point."""
+  from matplotlib.textpath import TextPath, text_to_path
+  from matplotlib.transforms import Affine2D
+  # the same vertical position for all of the texts
+  middle = text_to_path.get_text_width_height_descent('0', font, ismath=False)[1] / 2
+  paths = {}
+  for text in texts:
+    # the width from the font metrics (Path.get_extents is slow on curves)
+    width = text_to_path.get_text_width_height_descent(text, font, ismath=False)[0]
+    paths[text] = TextPath((0, 0), text, prop=font).transformed(Affine2D().translate(-width / 2, -middle).scale(*scale))
+  return paths
 
 def gpu_labels(gpu_index, node):
   # set labels for gpu ids and node names
@@ -175,59 +317,71 @@ def gpu_labels(gpu_index, node):
   return lbl
 
 def create_image():
-  import matplotlib
-  matplotlib.use('Agg')
-  import matplotlib.pyplot as plt
-  _, _, timestamps = zip(*usage_user.keys())
-  times = sorted(set(timestamps))
-  times = times[-num_snapshots:]
-  # next line prevents IndexError in ax[idx, j] when script runs for first time
-  if len(times) == 1: times = 2 * times
-  fig, ax = plt.subplots(nrows=num_gpus, ncols=len(times), figsize=(10, 80))
+  """Draw the dashboard on a single axes with one collection of cells
+     and one of their texts instead of one set of axes per cell."""
+  from matplotlib.figure import Figure
+  from matplotlib.backends.backend_agg import FigureCanvasAgg
+  from matplotlib.collections import PolyCollection, PathCollection
+  from matplotlib.font_manager import FontProperties
+  from matplotlib.path import Path
+  cols = list(range(len(snapshots.times)))[-num_snapshots:]
+  # keep the layout of two columns when the script runs for the first time
+  if len(cols) == 1: cols = 2 * cols
+  times = [snapshots.times[j] for j in cols]
+  # rows are node-major, i.e., row gpus_per_node * i + gpu_index
+  util = snapshots.util[:, :, cols].reshape(num_gpus, len(cols))
+  user = snapshots.user[:, :, cols].reshape(num_gpus, len(cols))
+  proc = snapshots.proc[:, :, cols].reshape(num_gpus, len(cols))
+  names = snapshots.names()
+  stamps = [datetime.fromtimestamp(t).strftime('%-I:%M %p') for t in times]
   # write to file
-  f = open("dashboard.csv", "w")
-  for i, node in enumerate(nodes):
-      for gpu_index in range(gpus_per_node):
-        idx = gpus_per_node * i + gpu_index
-        for j, t in enumerate(times):
-          mykey = (node, gpu_index, t)
-          if (mykey in usage_user):
-            usage, username, gpu_proc = usage_user[mykey]
-          else:
-            usage, username = (-1, 'NO INFO')
-          ax[idx, j].set_facecolor(cell_color(username, usage, gpu_proc))
-          # remove spines and ticks
-          for side in ['top', 'right', 'bottom', 'left']:
-            ax[idx, j].spines[side].set_visible(False)
-          ax[idx, j].get_xaxis().set_ticks([])
-          ax[idx, j].get_yaxis().set_ticks([])
-          # set cell and labels text
-          txtclr = 'w' if (usage < 25 or username == '') else 'k'
-          to_write = ','.join([datetime.fromtimestamp(t).strftime('%-I:%M %p'), node, str(gpu_index), username, str(usage)])
-          f.write(to_write + "\n")
-          ax[idx, j].text(0.5, 0.5, celltext(node, j, username, usage), fontsize=10, color=txtclr, \
-                          ha='center', va='center', transform=ax[idx, j].transAxes)
-          # node and gpu index labels
-          if (j == 0): ax[idx, j].set_ylabel(gpu_labels(gpu_index, node), fontsize=12, \
-                                             rotation=0, ha='right', va='center')
-          dt = datetime.fromtimestamp(t)
-          # -I removes zero padding (linux only)
-          stamp = dt.strftime('%-I:%M %p')
-          if (idx == 0):
-            ax[idx, j].xaxis.set_label_position('top')
-            ax[idx, j].set_xlabel(stamp, fontsize=12, rotation=0, ha='center', va='bottom')
-  f.close()
+  with open("dashboard.csv", "w") as f:
+    for idx, (node, gpu_index) in enumerate((node, g) for node in nodes for g in range(gpus_per_node)):
+      for j, stamp in enumerate(stamps):
+        f.write(','.join([stamp, node, str(gpu_index), names[user[idx, j]], str(util[idx, j])]) + "\n")
+  fig = Figure(figsize=(10, 80))
+  FigureCanvasAgg(fig)
+  # fixed margins for the labels since tight_layout would draw every text once more
+  fig.subplots_adjust(left=0.13, right=0.995, bottom=0.001, top=0.988)
+  ax = fig.add_subplot(1, 1, 1)
+  # one collection of rectangles for all of the cells
+  rows, columns = np.mgrid[0:num_gpus, 0:len(cols)]
+  corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+  cells = np.stack([columns.ravel(), rows.ravel()], axis=1)[:, None, :] + corners
+  colors = cell_colors(util, user, proc)
+  ax.add_collection(PolyCollection(cells, facecolors=list(colors.ravel()), linewidths=0, antialiased=False))
+  # set cell text: one collection of the outlines of all of the texts
+  # instead of one text per cell (the axes are fixed so a point is a
+  # fixed number of data units; y grows downward)
+  box = ax.get_position()
+  scale = (len(cols) / (72 * box.width * fig.get_figwidth()), -num_gpus / (72 * box.height * fig.get_figheight()))
+  texts = cell_texts(util, user, names).ravel()
+  paths = text_paths(set(texts), FontProperties(size=10), scale)
+  outlines = [Path(paths[text].vertices + (x, y), paths[text].codes)
+              for text, x, y in zip(texts, columns.ravel() + 0.5, rows.ravel() + 0.5)]
+  ax.add_collection(PathCollection(outlines, facecolors=list(text_colors(util, user).ravel()), linewidths=0))
+  ax.set_xlim(0, len(cols))
+  ax.set_ylim(num_gpus, 0)
+  # node and gpu index labels
+  ax.set_yticks(np.arange(num_gpus) + 0.5)
+  ax.set_yticklabels([gpu_labels(g, node) for node in nodes for g in range(gpus_per_node)], fontsize=12)
+  # -I removes zero padding (linux only)
+  ax.xaxis.tick_top()
+  ax.set_xticks(np.arange(len(cols)) + 0.5)
+  ax.set_xticklabels(stamps, fontsize=12)
+  ax.tick_params(which='both', length=0)
+  for side in ['top', 'right', 'bottom', 'left']:
+    ax.spines[side].set_visible(False)
+  dt = datetime.fromtimestamp(times[-1])
   # -d and -I remove zero padding (linux only)
   fig.suptitle('TigerGPU Utilization (' + str(dt.strftime("%a %b %-d")) + ')', \
                y=0.997, ha='center', fontsize=18)
-  fig.tight_layout(pad=0, w_pad=0, h_pad=0, rect=(0, 0, 1, 0.99))
-  if not debug: plt.savefig('tigergpu_utilization.png')
+  if not debug: fig.savefig('tigergpu_utilization.png')
 
 def remove_old_files():
   """Remove gpustat files that are more than an hour old if there
      are more than the minimum needed files."""
-  import os
-  gpufiles = glob('/scratch/gpfs/jdh4/gpustat/dot_gpustat/*.gpustat')
+  gpufiles = glob(f'{gpustat_dir}/dot_gpustat/*.gpustat')
   if (len(gpufiles) > len(nodes) * num_snapshots):
     for gpufile in gpufiles:
       timestamp = int(gpufile.split('.')[1])
@@ -236,91 +390,105 @@ def remove_old_files():
         os.remove(gpufile)
 
 def write_data():
-  _, _, timestamps = zip(*usage_user.keys())
-  tmax = max(timestamps)
+  tmax = snapshots.times[-1]
+  util, user = snapshots.util[:, :, -1], snapshots.user[:, :, -1]
   with open('utilization.csv', 'a') as f:
-    for node in nodes:
+    for i, node in enumerate(snapshots.nodes):
       for gpu_index in range(gpus_per_node):
-        mykey = (node, gpu_index, tmax)
-        if (mykey in usage_user):
-          usage, username, gpu_proc = usage_user[mykey]
-          f.write('%d,%s,%d,%s,%d\n' % (int(tmax), node, gpu_index, username, usage))
+        if (user[i, gpu_index] >= 0):
+          username = snapshots.users[user[i, gpu_index]]
+          f.write('%d,%s,%d,%s,%d\n' % (int(tmax), node, gpu_index, username, util[i, gpu_index]))
 
 ###############################
 ## if __name__ == "__main__" ##
 ###############################
 
-# generate the node names
-nodes = ['tiger-i' + str(i) + 'g' + str(j+1) for i in range(19, 24) for j in range(16)]
-cryoem = []
-squeue_lines = []
-
-# remove down and drained nodes while finding idle nodes
-#cmd = "timeout 3 sinfo -p gpu --Node -h | grep -E 'drain|down|boot|drng'"
-cmd = "timeout 3 sinfo -p gpu --Node -h | grep -E 'drain|down'"
-try:
-  output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
-  lines = output.stdout.decode("utf-8").split('\n')
-  for line in lines:
-    #if any([term in line for term in ["drain", "down", "boot", "drng"]]):
-    if "drain" in line or "down" in line:
-      bad_node = line.split()[0]
-      if re.match('tiger-i[12][01239]g[0-9]{1,2}', bad_node):
-        nodes.remove(bad_node)
-except:
-  pass
-
-with open("/scratch/gpfs/jdh4/gpustat/nodes.log", "w") as f:
-  for node in nodes:
-    f.write(node + "\n")
-
-# store the running jobs with username, node and number of gpus
-cmd = "timeout 3 squeue -p gpu -t R -h -o '%.8u %.2t %.6C %4D %10b %R'"
-try:
-  output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
-  squeue_lines = output.stdout.decode("utf-8").split('\n')
-except:
-  pass
-
-squeue_lines = list(filter(lambda x: len(x) > 0, squeue_lines))
-# make each item in squeue_lines have only one node in singles
-singles = []
-for line in squeue_lines:
-  user, state, cores, num_nodes, gres, many_hosts = line.split()
-  if num_nodes == "1":
-    singles.append(line)
-  else:
-    for host in extract_nodes(many_hosts.split(",t")):
-      singles.append(" ".join([user, state, cores, num_nodes, gres, host]))
-
-# debug flag
-debug = False
-
-# total expected gpus (equal to number of rows)
-gpus_per_node = 4
-num_gpus = gpus_per_node * len(nodes)
-
-# display up to this number of snapshots (equal to number of columns)
-num_snapshots = 7
-
-usage_user = {}
-timestamp = str(int(time()))
-if not debug:
-  for node in nodes:
-    gpustat_file = node + "." + timestamp + ".gpustat"
-    cmd = "timeout 5 ssh -o ConnectTimeout=4 " + node + " \"gpustat > /scratch/gpfs/jdh4/gpustat/dot_gpustat/" + \
-           gpustat_file + "\" > /dev/null 2>&1"
+if __name__ == "__main__":
+
+  # time each stage with --profile (to stderr) or $GPUS_PROFILE (to a file)
+  profiling.start("tigergpu_usage", "-" if "--profile" in sys.argv[1:] else None)
+  start = monotonic()
+
+  # generate the node names
+  nodes = hostlist.expand("tiger-i[19-23]g[1-16]")
+  cryoem = []
+  squeue_lines = []
+
+  # remove down and drained nodes while finding idle nodes
+  #cmd = "timeout 3 sinfo -p gpu --Node -h | grep -E 'drain|down|boot|drng'"
+  cmd = "timeout 3 sinfo -p gpu --Node -h | grep -E 'drain|down'"
+  with profiling.stage("sinfo"):
+    try:
+      output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
+      lines = output.stdout.decode("utf-8").split('\n')
+      for line in lines:
+        #if any([term in line for term in ["drain", "down", "boot", "drng"]]):
+        if "drain" in line or "down" in line:
+          bad_node = line.split()[0]
+          if re.match('tiger-i[12][01239]g[0-9]{1,2}', bad_node):
+            nodes.remove(bad_node)
+    except:
+      pass
+
+  with open(f"{gpustat_dir}/nodes.log", "w") as f:
+    for node in nodes:
+      f.write(node + "\n")
+
+  # store the running jobs with username, node and number of gpus
+  cmd = "timeout 3 squeue -p gpu -t R -h -o '%.8u %.2t %.6C %4D %10b %R'"
+  with profiling.stage("squeue") as timed:
     try:
-       # run the command via ssh on the compute nodes
-       _ = subprocess.run(cmd, shell=True, timeout=6)
+      output = subprocess.run(cmd, capture_output=True, shell=True, timeout=3)
+      squeue_lines = output.stdout.decode("utf-8").split('\n')
     except:
-      # failure here will cleanly result in "NO INFO" downstream
       pass
 
-process_all_files()
-if debug:
- for u,v in zip(usage_user.keys(), usage_user.values()):
-    print(u,v)
-if usage_user and not debug: create_image()
-if usage_user and not debug: write_data()
-if not debug: remove_old_files()
+    squeue_lines = list(filter(lambda x: len(x) > 0, squeue_lines))
+    # running gpus per node
+    squeue_jobs = squeue_index(squeue_lines)
+    timed.rows = len(squeue_lines)
+
+  # debug flag
+  debug = False
+
+  # total expected gpus (equal to number of rows)
+  gpus_per_node = 4
+  num_gpus = gpus_per_node * len(nodes)
+
+  # display up to this number of snapshots (equal to number of columns)
+  num_snapshots = 7
+
+  timestamp = str(int(time()))
+  if not debug:
+    # failures here will cleanly result in "NO INFO" downstream
+    with profiling.stage("collect gpustat", len(nodes)) as timed:
+      status = collect_gpustat(nodes, timestamp)
+      timed.fields["failed"] = sum(reason is not None for _, reason in status.values())
+    with open(f"{gpustat_dir}/collect.log", "w") as f:
+      for node, (seconds, reason) in status.items():
+        f.write(f"{node},{seconds:.2f},{reason if reason else 'OK'}\n")
+
+  # the last num_snapshots columns are kept on disk so that only the
+  # files of the newest snapshot are parsed
+  window_file = f"{gpustat_dir}/window.npz"
+  if debug:
+    snapshots = Snapshots(nodes, gpus_per_node)
+  else:
+    snapshots = Snapshots.load(window_file, nodes, gpus_per_node)
+  with profiling.stage("parse gpustat", len(nodes)):
+    if snapshots:
+      process_snapshot(timestamp)
+    else:
+      process_all_files()
+  if snapshots: snapshots.trim(num_snapshots)
+  if snapshots and not debug: snapshots.save(window_file)
+  if debug:
+    for node in nodes:
+      for gpu_index in range(gpus_per_node):
+        for t in snapshots.times:
+          print((node, gpu_index, t), snapshots.get(node, gpu_index, t))
+  with profiling.stage("render", num_gpus):
+    if snapshots and not debug: create_image()
+  if snapshots and not debug: write_data()
+  if not debug: remove_old_files()
+  profiling.write("total", monotonic() - start, num_gpus)
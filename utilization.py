@@ -0,0 +1,388 @@
+"""Read and write the GPU utilization data used by checkgpu.
+
+   The raw data is utilization.json which is written by extract.py
+   (https://github.com/jdh4/gpudash). One line is appended per GPU every
+   10 minutes in timestamp order:
+
+   {"timestamp": "1622344202", "host": "della-i14g20", "index": "0", "user": "gdolsten", "util": "40", "jobid": "34792230"}
+
+   A sidecar index (utilization.json.idx) maps each timestamp to the byte
+   offset of its first line so that a report can seek to the start of its
+   window instead of decoding the entire file.
+
+   The store is a directory with one compressed NumPy archive per UTC day
+   (e.g., 20230201.npz). Each archive holds int64 timestamps, int8 GPU
+   indices and utilization (-1 for N/A), int64 jobids (-1 for N/A) and
+   the host and user columns as codes into per-day tables of names. A
+   report only has to open the days that overlap its window.
+"""
+
+import os
+import json
+import fcntl
+from glob import glob
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+columns = ['timestamp', 'host', 'index', 'username', 'usage', 'jobid']
+seconds_per_day = 86400
+
+def line_timestamp(line: bytes) -> int:
+    """Return the timestamp of a line of utilization.json without decoding
+       the entire line. The timestamp is always the first field."""
+    return int(line.split(b'"', 4)[3])
+
+# bytes read from utilization.json at a time (about 300,000 lines)
+chunk_bytes = 1 << 25
+
+def to_int(value: str) -> int:
+    """Convert a field such as util or jobid to an int where N/A is -1."""
+    return int(value) if value.isdigit() else -1
+
+def encode(names) -> tuple:
+    """Return the sorted table of distinct names and the code of each name."""
+    table, codes = np.unique(np.asarray(names), return_inverse=True)
+    if table.dtype.kind == 'S':
+        table = np.char.decode(table, 'utf-8')
+    dtype = np.int16 if len(table) < np.iinfo(np.int16).max else np.int32
+    return table, codes.astype(dtype)
+
+def to_ints(values: list) -> np.ndarray:
+    """Convert a column of byte strings to ints where N/A is -1."""
+    values = np.array(values)
+    return np.where(np.char.isdigit(values), values, b'-1').astype(np.int64)
+
+def categorical(names) -> pd.Categorical:
+    if len(names) == 0:
+        return pd.Categorical([])
+    table, codes = encode(names)
+    return pd.Categorical.from_codes(codes, categories=table)
+
+def frame(timestamp, host, index, username, usage, jobid) -> pd.DataFrame:
+    """Make the DataFrame that checkgpu works with from column arrays where
+       usage is -1 for N/A."""
+    usage = pd.Series(np.asarray(usage, dtype=np.int16), dtype='Int16')
+    return pd.DataFrame({'timestamp': np.asarray(timestamp, dtype=np.int64),
+                         'host': categorical(host),
+                         'index': np.asarray(index, dtype=np.int8),
+                         'username': categorical(username),
+                         'usage': usage.mask(usage < 0),
+                         'jobid': np.asarray(jobid, dtype=np.int64)})
+
+def parse_lines(chunk: bytes) -> pd.DataFrame:
+    """Parse complete lines of utilization.json one line at a time."""
+    rows = []
+    for line in chunk.splitlines():
+        x = json.loads(line)
+        rows.append((int(x['timestamp']), x['host'], int(x['index']), x['user'],
+                     to_int(x['util']), to_int(x['jobid'])))
+    if not rows:
+        return frame(*[[] for _ in columns])
+    return frame(*zip(*rows))
+
+def parse_chunk(chunk: bytes) -> pd.DataFrame:
+    """Parse complete lines of utilization.json in bulk. Every line has the
+       same six quoted fields in the same order so after splitting the chunk
+       on quotes field j of line k is at position 24 * k + 4 * j + 3. Falls
+       back to json.loads if a line does not have this form."""
+    parts = chunk.split(b'"')
+    num_lines = chunk.count(b'\n')
+    if len(parts) != 24 * num_lines + 1 or set(parts[21::24]) != {b'jobid'}:
+        return parse_lines(chunk)
+    return frame(np.array(parts[3::24]).astype(np.int64),
+                 parts[7::24],
+                 np.array(parts[11::24]).astype(np.int8),
+                 parts[15::24],
+                 to_ints(parts[19::24]),
+                 to_ints(parts[23::24]))
+
+def iter_chunks(datafile: str, begin: float=None, end: float=None, chunk_bytes: int=chunk_bytes):
+    """Yield DataFrames of the rows with begin <= timestamp <= end reading
+       chunk_bytes of the file at a time. The time index is used to seek to
+       the first row of the window and to read no further than its last
+       row (a window of a few hours reads only those lines). A final line
+       without a newline (still being written) is ignored."""
+    entries = update_index(datafile) if begin is not None or end is not None else None
+    stop = stop_offset(datafile, end, entries) if end is not None else None
+    with open(datafile, 'rb') as fp:
+        if begin is not None:
+            fp.seek(seek_offset(datafile, begin, entries))
+        tail = b''
+        while True:
+            chunk = fp.read(chunk_bytes if stop is None else max(0, min(chunk_bytes, stop - fp.tell())))
+            if not chunk:
+                break
+            chunk = tail + chunk
+            cut = chunk.rfind(b'\n') + 1
+            chunk, tail = chunk[:cut], chunk[cut:]
+            if not chunk:
+                continue
+            df = parse_chunk(chunk)
+            keep = np.ones(df.shape[0], dtype=bool)
+            if begin is not None:
+                keep &= (df.timestamp >= begin).values
+            if end is not None:
+                keep &= (df.timestamp <= end).values
+            if keep.any():
+                yield df[keep].reset_index(drop=True)
+            if end is not None and df.timestamp.iloc[-1] > end:
+                break
+
+def concat(frames: list) -> pd.DataFrame:
+    """Concatenate chunks while keeping host and username categorical."""
+    if not frames:
+        return frame(*[[] for _ in columns])
+    cats = {name: union_categoricals([f[name] for f in frames]) for name in ('host', 'username')}
+    df = pd.concat([f.drop(columns=list(cats)) for f in frames], ignore_index=True)
+    for name, cat in cats.items():
+        df.insert(columns.index(name), name, cat)
+    return df
+
+def read_json(datafile: str, begin: float=None, end: float=None) -> pd.DataFrame:
+    """Read the rows of the JSON-lines file with begin <= timestamp <= end."""
+    return concat(list(iter_chunks(datafile, begin, end)))
+
+def json_min_timestamp(datafile: str) -> int:
+    """Return the earliest timestamp in the JSON-lines file."""
+    with open(datafile, 'rb') as fp:
+        return line_timestamp(fp.readline())
+
+################
+## time index ##
+################
+
+# The index is a sidecar file (utilization.json.idx) of int64 pairs
+# (timestamp, byte offset) giving the offset of the first line of each
+# timestamp. Since extract.py appends in timestamp order, every line before
+# that offset has a smaller timestamp. Only make_store.py (cron) writes the
+# index, holding a lock; checkgpu scans the lines appended since then in
+# memory. A reader trusts the index only up to the first entry that does
+# not increase (e.g., left by a crash while writing).
+
+def index_path(datafile: str) -> str:
+    return datafile + '.idx'
+
+def valid_entries(entries: np.ndarray) -> np.ndarray:
+    """Return the leading entries of the index whose timestamps and offsets
+       both increase."""
+    increasing = (np.diff(entries[:, 0]) > 0) & (np.diff(entries[:, 1]) > 0)
+    bad = np.flatnonzero(~increasing)
+    return entries if len(bad) == 0 else entries[:bad[0] + 1]
+
+def read_index(datafile: str) -> tuple:
+    """Return the valid entries of the index file and whether the file
+       holds anything else."""
+    try:
+        raw = np.fromfile(index_path(datafile), dtype=np.int64)
+    except (FileNotFoundError, ValueError):
+        raw = np.array([], dtype=np.int64)
+    # ignore a partially written final entry
+    entries = valid_entries(raw[:len(raw) - len(raw) % 2].reshape(-1, 2))
+    return entries, 2 * len(entries) != len(raw)
+
+def load_index(datafile: str) -> np.ndarray:
+    """Return the index as an array with one (timestamp, offset) per row."""
+    return read_index(datafile)[0]
+
+def scan_index(datafile: str, entries: np.ndarray) -> tuple:
+    """Return the index entries of the complete lines after the last entry
+       (all lines if there are none) and the entries that still hold."""
+    if len(entries) and entries[-1, 1] > os.path.getsize(datafile):
+        # data file was truncated or replaced
+        entries = entries[:0]
+    start = entries[-1] if len(entries) else (-1, 0)
+    new = []
+    last_ts, offset = int(start[0]), int(start[1])
+    with open(datafile, 'rb') as fp:
+        fp.seek(offset)
+        for line in fp:
+            if not line.endswith(b'\n'):
+                # line still being written
+                break
+            ts = line_timestamp(line)
+            if ts > last_ts:
+                new.append((ts, offset))
+                last_ts = ts
+            offset += len(line)
+    return np.array(new, dtype=np.int64).reshape(-1, 2), entries
+
+def update_index(datafile: str, write: bool=False) -> np.ndarray:
+    """Return the index including the lines appended since it was written.
+       Only the lines from the last indexed timestamp onward are scanned.
+       With write (make_store.py) the new entries are also written to the
+       index file under a lock so that two writers cannot interleave. A
+       damaged index file is written again from its valid entries."""
+    if not write:
+        new, entries = scan_index(datafile, load_index(datafile))
+        return np.concatenate([entries, new])
+    with open(index_path(datafile) + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        loaded, damaged = read_index(datafile)
+        new, entries = scan_index(datafile, loaded)
+        if damaged or len(entries) < len(loaded):
+            tmp = index_path(datafile) + '.tmp'
+            np.concatenate([entries, new]).tofile(tmp)
+            os.replace(tmp, index_path(datafile))
+        elif len(new):
+            with open(index_path(datafile), 'ab') as f:
+                new.tofile(f)
+    return np.concatenate([entries, new])
+
+def seek_offset(datafile: str, begin: float, entries: np.ndarray=None) -> int:
+    """Return the byte offset of the first line with timestamp >= begin.
+       The index is updated unless entries (from update_index) are given."""
+    entries = update_index(datafile) if entries is None else entries
+    i = np.searchsorted(entries[:, 0], begin, side='left')
+    if i == len(entries):
+        return os.path.getsize(datafile)
+    return int(entries[i, 1])
+
+def stop_offset(datafile: str, end: float, entries: np.ndarray=None):
+    """Return the byte offset of the first line with timestamp > end or
+       None if the lines of end run to the end of the file."""
+    entries = update_index(datafile) if entries is None else entries
+    i = np.searchsorted(entries[:, 0], end, side='right')
+    return None if i == len(entries) else int(entries[i, 1])
+
+####################
+## columnar store ##
+####################
+
+def day_of(timestamp: int) -> int:
+    return int(timestamp) // seconds_per_day
+
+def partition_path(storedir: str, day: int) -> str:
+    date = datetime.fromtimestamp(day * seconds_per_day, tz=timezone.utc)
+    return os.path.join(storedir, date.strftime('%Y%m%d') + '.npz')
+
+def partition_days(storedir: str) -> list:
+    """Return the sorted list of days (days since the epoch) in the store."""
+    days = []
+    for path in glob(os.path.join(storedir, '*.npz')):
+        name = os.path.basename(path)[:-len('.npz')]
+        try:
+            date = datetime.strptime(name, '%Y%m%d').replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        days.append(day_of(date.timestamp()))
+    return sorted(days)
+
+def has_store(storedir: str) -> bool:
+    return os.path.isdir(storedir) and partition_days(storedir) != []
+
+def write_partition(storedir: str, day: int, df: pd.DataFrame) -> None:
+    """Write the rows of one day. The file is replaced atomically so that
+       checkgpu never sees a partial partition."""
+    hosts = df.host.cat.remove_unused_categories()
+    users = df.username.cat.remove_unused_categories()
+    path = partition_path(storedir, day)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f,
+                            timestamp=df.timestamp.values.astype(np.int64),
+                            hosts=np.asarray(hosts.cat.categories, dtype=str),
+                            host=hosts.cat.codes.values,
+                            index=df['index'].values.astype(np.int8),
+                            users=np.asarray(users.cat.categories, dtype=str),
+                            user=users.cat.codes.values,
+                            util=df.usage.fillna(-1).values.astype(np.int8),
+                            jobid=df.jobid.values.astype(np.int64))
+    os.replace(path + '.tmp', path)
+
+def convert(datafile: str, storedir: str) -> int:
+    """Convert utilization.json to the store. Only the last day already in
+       the store and the days after it are (re)written so the conversion can
+       run after each append by extract.py. A day is written as soon as a
+       later day is seen. Returns the number of rows written."""
+    os.makedirs(storedir, exist_ok=True)
+    days = partition_days(storedir)
+    first_day = days[-1] if days else 0
+    pending = {}
+    num_rows = 0
+    for df in iter_chunks(datafile, first_day * seconds_per_day):
+        day = df.timestamp.values // seconds_per_day
+        for d in np.unique(day):
+            pending.setdefault(int(d), []).append(df[day == d])
+        for d in sorted(pending):
+            if d < day[-1]:
+                part = concat(pending.pop(d))
+                write_partition(storedir, d, part)
+                num_rows += part.shape[0]
+    for d, frames in pending.items():
+        part = concat(frames)
+        write_partition(storedir, d, part)
+        num_rows += part.shape[0]
+    return num_rows
+
+def store_min_timestamp(storedir: str) -> int:
+    """Return the earliest timestamp in the store."""
+    days = partition_days(storedir)
+    with np.load(partition_path(storedir, days[0])) as part:
+        return int(part['timestamp'].min())
+
+def store_max_timestamp(storedir: str) -> int:
+    """Return the latest timestamp in the store."""
+    days = partition_days(storedir)
+    with np.load(partition_path(storedir, days[-1])) as part:
+        return int(part['timestamp'].max())
+
+def iter_tail(datafile: str, after: int, begin: float, end: float):
+    """Yield the rows of utilization.json with begin <= timestamp <= end
+       that are later than after (the last timestamp in the store), i.e.,
+       the lines that extract.py appended since make_store.py last ran."""
+    if end <= after or not os.path.isfile(datafile):
+        return
+    yield from iter_chunks(datafile, max(begin, after + 1), end)
+
+def decode(tables: list, codes: list) -> pd.Categorical:
+    """Merge per-partition name tables and codes into one categorical."""
+    names = np.unique(np.concatenate(tables))
+    merged = [np.searchsorted(names, table)[code] for table, code in zip(tables, codes)]
+    return pd.Categorical.from_codes(np.concatenate(merged), categories=names)
+
+def read_store(storedir: str, begin: float, end: float) -> pd.DataFrame:
+    """Return the rows with begin <= timestamp <= end reading only the
+       partitions that overlap the window."""
+    days = [day for day in partition_days(storedir) if day_of(begin) <= day <= day_of(end)]
+    if not days:
+        return frame(*[[] for _ in columns])
+    parts = {name: [] for name in ['timestamp', 'hosts', 'host', 'index', 'users', 'user', 'util', 'jobid']}
+    for day in days:
+        with np.load(partition_path(storedir, day)) as part:
+            ts = part['timestamp']
+            keep = (ts >= begin) & (ts <= end)
+            for name in parts:
+                parts[name].append(part[name] if name in ('hosts', 'users') else part[name][keep])
+    usage = pd.Series(np.concatenate(parts['util']), dtype='Int16')
+    return pd.DataFrame({'timestamp': np.concatenate(parts['timestamp']),
+                         'host': decode(parts['hosts'], parts['host']),
+                         'index': np.concatenate(parts['index']),
+                         'username': decode(parts['users'], parts['user']),
+                         'usage': usage.mask(usage < 0),
+                         'jobid': np.concatenate(parts['jobid'])})
+
+def iter_store(storedir: str, begin: float, end: float):
+    """Yield a DataFrame of the rows with begin <= timestamp <= end for each
+       partition that overlaps the window so that only one day is held in
+       memory at a time."""
+    for day in partition_days(storedir):
+        if not day_of(begin) <= day <= day_of(end):
+            continue
+        with np.load(partition_path(storedir, day)) as part:
+            ts = part['timestamp']
+            keep = (ts >= begin) & (ts <= end)
+            if keep.any():
+                yield partition_frame(part, keep)
+
+def partition_frame(part, keep) -> pd.DataFrame:
+    """Return the rows of an open partition selected by keep (a boolean
+       array or slice)."""
+    usage = pd.Series(part['util'][keep], dtype='Int16')
+    return pd.DataFrame({'timestamp': part['timestamp'][keep],
+                         'host': decode([part['hosts']], [part['host'][keep]]),
+                         'index': part['index'][keep],
+                         'username': decode([part['users']], [part['user'][keep]]),
+                         'usage': usage.mask(usage < 0),
+                         'jobid': part['jobid'][keep]})
@@ -0,0 +1,168 @@
+"""The data of checkgpu reports kept in memory by the daemon (checkgpud.py).
+
+   Files of the store, the rollups and cached_users.csv are read once and
+   read again only when they change (make_store.py rewrites the partition
+   of the current day and the rollups every 10 minutes) and the lines of
+   utilization.json appended since then are read at each report. Without a store
+   the last days of utilization.json are held in memory and extended with
+   the lines that extract.py appended since the last refresh. A report made
+   from this data is the same as one made by reading the files.
+"""
+
+import os
+import threading
+from time import time
+from functools import wraps
+from itertools import chain
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import utilization
+import rollup
+import slurm
+from report import Files, base
+
+def locked(method):
+    """Run the method holding the lock of the Warm object since the daemon
+       answers reports in threads."""
+    @wraps(method)
+    def run(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return run
+
+class Warm(Files):
+    """The data of a report from memory. At most max_files files (day
+       partitions and rollups) are cached and the tail of utilization.json
+       covers the last tail_days days."""
+
+    def __init__(self, base: str=base, max_files: int=256, tail_days: float=31):
+        super().__init__(base)
+        self.max_files = max_files
+        self.tail_days = tail_days
+        # path -> (modification time, contents) with the least recently used first
+        self.files = OrderedDict()
+        # rows of utilization.json with timestamp >= tail_begin
+        self.tail = None
+        self.tail_begin = None
+        self.offset = 0
+        self.json_min_timestamp = None
+        self.sshare = {}
+        # held while the caches above change (see locked)
+        self.lock = threading.RLock()
+
+    @locked
+    def cached(self, path: str, load):
+        """Return load(path) unless it is cached and the file is unchanged."""
+        mtime = os.stat(path).st_mtime_ns
+        hit = self.files.get(path)
+        if hit is not None and hit[0] == mtime:
+            self.files.move_to_end(path)
+            return hit[1]
+        value = load(path)
+        self.files[path] = (mtime, value)
+        self.files.move_to_end(path)
+        while len(self.files) > self.max_files:
+            self.files.popitem(last=False)
+        return value
+
+    def partition(self, day: int) -> pd.DataFrame:
+        def load(path):
+            with np.load(path) as part:
+                df = utilization.partition_frame(part, slice(None))
+            return df[['timestamp', 'host', 'username', 'usage']]
+        return self.cached(utilization.partition_path(self.storedir, day), load)
+
+    def read_rollup(self, path: str, begin: int, stop: int) -> pd.DataFrame:
+        rows = self.cached(path, lambda path: rollup.read_rollup(path, 0, np.iinfo(np.int64).max))
+        return rows[((rows.start >= begin) & (rows.start < stop)).values]
+
+    def iter_store(self, days: list, begin: float, end: float):
+        for day in days:
+            if not utilization.day_of(begin) <= day <= utilization.day_of(end):
+                continue
+            df = self.partition(day)
+            keep = ((df.timestamp >= begin) & (df.timestamp <= end)).values
+            if keep.any():
+                yield df[keep]
+
+    @locked
+    def follow(self) -> int:
+        """Add the complete lines appended to utilization.json since the last
+           call and drop the rows older than tail_days. Returns the number
+           of rows added."""
+        size = os.path.getsize(self.datafile)
+        if self.tail is None or size < self.offset:
+            # first call or the file was replaced
+            self.tail_begin = time() - self.tail_days * utilization.seconds_per_day
+            self.offset = utilization.seek_offset(self.datafile, self.tail_begin)
+            self.tail = utilization.frame(*[[] for _ in utilization.columns])
+            self.json_min_timestamp = utilization.json_min_timestamp(self.datafile)
+        frames = [self.tail]
+        with open(self.datafile, 'rb') as fp:
+            fp.seek(self.offset)
+            while True:
+                chunk = fp.read(utilization.chunk_bytes)
+                cut = chunk.rfind(b'\n') + 1
+                if cut == 0:
+                    break
+                frames.append(utilization.parse_chunk(chunk[:cut]))
+                self.offset += cut
+                fp.seek(self.offset)
+        added = sum(f.shape[0] for f in frames[1:])
+        cutoff = time() - self.tail_days * utilization.seconds_per_day
+        if added or cutoff - self.tail_begin > utilization.seconds_per_day:
+            tail = utilization.concat([f for f in frames if f.shape[0]])
+            # every row at or after the cutoff is kept
+            first = np.searchsorted(tail.timestamp.values, cutoff, side='left')
+            self.tail = tail.iloc[first:].reset_index(drop=True)
+            self.tail_begin = max(self.tail_begin, cutoff)
+        return added
+
+    def window(self, begin: float, end: float):
+        days = utilization.partition_days(self.storedir) if os.path.isdir(self.storedir) else []
+        if days:
+            planned = rollup.plan(self.storedir, begin, end, read=self.read_rollup)
+            rollups, ranges = planned if planned else (None, [(begin, end)])
+            chunks = (chunk for a, b in ranges for chunk in self.iter_store(days, a, b))
+            # the lines appended since make_store.py last ran are read from
+            # the file (a few minutes of samples)
+            tail = utilization.iter_tail(self.datafile, int(self.partition(days[-1]).timestamp.max()), begin, end)
+            return rollups, chain(chunks, tail), int(self.partition(days[0]).timestamp.min())
+        if not os.path.isfile(self.datafile):
+            return None
+        with self.lock:
+            self.follow()
+            tail, tail_begin = self.tail, self.tail_begin
+        if begin < tail_begin:
+            # older than the tail so read the file
+            return super().window(begin, end)
+        ts = tail.timestamp.values
+        chunk = tail.iloc[np.searchsorted(ts, begin, side='left'):np.searchsorted(ts, end, side='right')]
+        return None, [chunk] if chunk.shape[0] else [], self.json_min_timestamp
+
+    def users(self) -> pd.DataFrame:
+        return self.cached(self.userfile, lambda path: pd.read_csv(path, header=0))
+
+    @locked
+    def accounts(self, cluster: str) -> dict:
+        fetched, accounts = self.sshare.get(cluster, (0, {}))
+        if time() - fetched >= slurm.sshare_ttl:
+            accounts = slurm.sshare_accounts(cluster)
+            self.sshare[cluster] = (time(), accounts)
+        return accounts
+
+    @locked
+    def refresh(self) -> None:
+        """Read what changed since the last refresh so that the next report
+           does not have to."""
+        days = utilization.partition_days(self.storedir) if os.path.isdir(self.storedir) else []
+        if days:
+            self.partition(days[0])
+            self.partition(days[-1])
+        elif os.path.isfile(self.datafile):
+            self.follow()
+        if os.path.isfile(self.userfile):
+            self.users()